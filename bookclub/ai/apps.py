@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AiConfig(AppConfig):
     name = 'ai'
+
+    def ready(self):
+        import ai.signals
+
+        # Opt-in: this runs for every process, management commands included.
+        if settings.EMBEDDING_WARM_UP == "ready":
+            from ai.services.embeddings import warm_up
+
+            warm_up()
@@ -0,0 +1,199 @@
+from pathlib import Path
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import time
+from datetime import datetime, UTC
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai.models import BookSummary
+
+
+BACKENDS = ["sentence_transformers", "onnx", "onnx_int8"]
+
+# Each backend is compared with the PyTorch vectors of the same texts.
+REFERENCE_BACKEND = "sentence_transformers"
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare startup time, RSS, throughput and cosine parity of the "
+        "embedding backends. Each backend runs in its own process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            choices=BACKENDS,
+            default=BACKENDS,
+        )
+
+        parser.add_argument(
+            "--texts",
+            type=int,
+            default=256,
+            help="Number of book summaries to encode.",
+        )
+
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.99,
+            help="Minimum cosine similarity to the PyTorch vectors.",
+        )
+
+        # Internal: run one backend and report on stdout.
+        parser.add_argument("--child", help="Run as a measurement child.")
+        parser.add_argument("--workdir", help="Directory shared with children.")
+
+    def handle(self, *args, **options):
+        if options["child"]:
+            self._run_child(options["child"], Path(options["workdir"]))
+            return
+
+        texts = list(
+            BookSummary.objects.exclude(content=None)
+            .exclude(content="")
+            .order_by("id")
+            .values_list("content", flat=True)[:options["texts"]]
+        )
+
+        if not texts:
+            raise CommandError("No book summaries to encode.")
+
+        backends = options["backends"]
+
+        if REFERENCE_BACKEND not in backends:
+            backends = [REFERENCE_BACKEND, *backends]
+
+        with tempfile.TemporaryDirectory() as workdir:
+            workdir = Path(workdir)
+
+            with (workdir / "texts.json").open("w", encoding="utf-8") as file:
+                json.dump(texts, file)
+
+            reports = {
+                backend: self._spawn(backend, workdir)
+                for backend in backends
+            }
+
+            reference = np.load(workdir / f"{REFERENCE_BACKEND}.npy")
+
+            for backend, report in reports.items():
+                vectors = np.load(workdir / f"{backend}.npy")
+                cosines = np.sum(vectors * reference, axis=1)
+
+                report["min_cosine"] = float(cosines.min())
+                report["mean_cosine"] = float(cosines.mean())
+                report["parity"] = bool(cosines.min() >= options["tolerance"])
+
+        for backend, report in reports.items():
+            line = (
+                f"{backend:22} startup={report['startup_seconds']:6.2f}s "
+                f"rss={report['rss_mb']:7.1f}MB "
+                f"throughput={report['texts_per_second']:7.1f}/s "
+                f"min_cos={report['min_cosine']:.5f}"
+            )
+
+            if report["parity"]:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f"{line} (below tolerance)"))
+
+        self._save_results(len(texts), options["tolerance"], reports)
+
+    def _spawn(self, backend, workdir):
+        self.stdout.write(f"Measuring {backend}...")
+
+        result = subprocess.run(
+            [
+                sys.executable,
+                str(Path(settings.BASE_DIR) / "manage.py"),
+                "benchmark_embedding_backends",
+                "--child",
+                backend,
+                "--workdir",
+                str(workdir),
+            ],
+            env={**os.environ, "EMBEDDING_BACKEND": backend},
+            capture_output=True,
+            text=True,
+        )
+
+        if result.returncode != 0:
+            raise CommandError(f"{backend} failed:\n{result.stderr}")
+
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def _run_child(self, backend, workdir):
+        start = time.perf_counter()
+
+        from ai.services.embeddings import EmbeddingService
+
+        service = EmbeddingService()
+        service.embed_document("warm up")
+
+        startup = time.perf_counter() - start
+
+        with (workdir / "texts.json").open("r", encoding="utf-8") as file:
+            texts = json.load(file)
+
+        start = time.perf_counter()
+        vectors = np.asarray(service.embed_documents(texts), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+
+        np.save(workdir / f"{backend}.npy", vectors)
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "startup_seconds": startup,
+                    "rss_mb": max_rss_mb(),
+                    "texts_per_second": len(texts) / elapsed,
+                }
+            )
+        )
+
+    def _save_results(self, text_count, tolerance, reports):
+        created_at = datetime.now(UTC)
+
+        output = {
+            "model": settings.EMBEDDING_MODEL_NAME,
+            "created_at": created_at.isoformat(),
+            "text_count": text_count,
+            "tolerance": tolerance,
+            "backends": reports,
+        }
+
+        timestamp = created_at.strftime("%Y%m%d_%H%M%S")
+
+        output_path = (
+            Path(__file__).resolve().parents[2]
+            / "benchmark"
+            / "embedding_backend"
+            / "results"
+            / f"{timestamp}.json"
+        )
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with output_path.open("w", encoding="utf-8") as file:
+            json.dump(output, file, indent=4)
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(f"Benchmark results saved to {output_path}")
+        )
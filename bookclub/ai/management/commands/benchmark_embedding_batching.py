@@ -0,0 +1,151 @@
+from pathlib import Path
+import json
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from datetime import datetime, UTC
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai.services.embedding_batcher import EmbeddingBatcher
+from ai.services.embeddings import EmbeddingService
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test query embedding throughput and latency for several "
+        "micro-batching windows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=16,
+            help="Number of threads issuing queries at once.",
+        )
+
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Number of queries per run.",
+        )
+
+        parser.add_argument(
+            "--windows",
+            type=float,
+            nargs="+",
+            default=[0, 1, 2, 5, 10, 20],
+            help="Batch windows in milliseconds; 0 encodes each query alone.",
+        )
+
+        parser.add_argument(
+            "--max-batch",
+            type=int,
+            default=settings.EMBEDDING_BATCH_MAX_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        model = EmbeddingService().model
+
+        def encode(texts):
+            return model.encode(
+                texts,
+                batch_size=len(texts),
+                convert_to_numpy=True,
+            )
+
+        # Distinct texts, so nothing is served from a cache.
+        queries = [
+            f"{EmbeddingService.QUERY_PREFIX}books like number {index} "
+            f"with a slow-burning mystery"
+            for index in range(options["requests"])
+        ]
+
+        encode(queries[:8])
+
+        runs = []
+
+        self.stdout.write(
+            f"{options['requests']} queries, "
+            f"concurrency {options['concurrency']}"
+        )
+
+        for window in options["windows"]:
+            if window > 0:
+                batcher = EmbeddingBatcher(
+                    encode,
+                    max_wait=window / 1000,
+                    max_batch=options["max_batch"],
+                )
+                embed = batcher.submit
+            else:
+                def embed(text):
+                    return encode([text])[0]
+
+            run = self._run(embed, queries, options["concurrency"])
+            run["window_ms"] = window
+            runs.append(run)
+
+            self.stdout.write(
+                f"window={window:5.1f}ms "
+                f"throughput={run['queries_per_second']:7.1f}/s "
+                f"p50={run['p50_ms']:7.1f}ms p99={run['p99_ms']:7.1f}ms"
+            )
+
+        self._save_results(options, runs)
+
+    def _run(self, embed, queries, concurrency):
+        def timed(text):
+            start = time.perf_counter()
+            embed(text)
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, queries))
+
+        elapsed = time.perf_counter() - start
+        percentiles = quantiles(latencies, n=100)
+
+        return {
+            "queries_per_second": len(queries) / elapsed,
+            "p50_ms": percentiles[49],
+            "p99_ms": percentiles[98],
+        }
+
+    def _save_results(self, options, runs):
+        created_at = datetime.now(UTC)
+
+        output = {
+            "model": settings.EMBEDDING_MODEL_NAME,
+            "created_at": created_at.isoformat(),
+            "concurrency": options["concurrency"],
+            "requests": options["requests"],
+            "max_batch": options["max_batch"],
+            "runs": runs,
+        }
+
+        timestamp = created_at.strftime("%Y%m%d_%H%M%S")
+
+        output_path = (
+            Path(__file__).resolve().parents[2]
+            / "benchmark"
+            / "embedding_batching"
+            / "results"
+            / f"{timestamp}.json"
+        )
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with output_path.open("w", encoding="utf-8") as file:
+            json.dump(output, file, indent=4)
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(f"Benchmark results saved to {output_path}")
+        )
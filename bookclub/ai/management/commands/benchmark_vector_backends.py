@@ -0,0 +1,143 @@
+from pathlib import Path
+import json
+
+import time
+from statistics import mean, quantiles
+from datetime import datetime, UTC
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ai.models import BookEmbedding
+from ai.services.vectors.factory import get_vector_backend
+
+
+BACKENDS = ["pgvector", "numpy"]
+
+
+class Command(BaseCommand):
+    help = "Compare latency and overlap of the vector search backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            dest="embedding_type",
+            choices=BookEmbedding.EmbeddingType.values,
+            default=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+        )
+
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=100,
+            help="Number of stored embeddings used as queries.",
+        )
+
+        parser.add_argument(
+            "--k",
+            type=int,
+            default=100,
+            help="Number of neighbours retrieved per query.",
+        )
+
+    def handle(self, *args, **options):
+        embedding_type = options["embedding_type"]
+        k = options["k"]
+
+        queries = list(
+            BookEmbedding.objects.filter(embedding_type=embedding_type)
+            .order_by("?")
+            .values_list("embedding", flat=True)[:options["queries"]]
+        )
+
+        if not queries:
+            raise CommandError(f"No {embedding_type} embeddings found.")
+
+        self.stdout.write(
+            f"Benchmarking {len(queries)} queries, k={k}, "
+            f"type={embedding_type}..."
+        )
+
+        runs = {}
+        results = {}
+
+        for name in BACKENDS:
+            backend = get_vector_backend(name)
+
+            # Load outside the timings; the numpy backend loads lazily.
+            start = time.perf_counter()
+            backend.nearest(queries[0], embedding_type=embedding_type, limit=k)
+            warm_up = time.perf_counter() - start
+
+            ids = []
+            durations = []
+
+            for query in queries:
+                start = time.perf_counter()
+                matches = backend.nearest(
+                    query,
+                    embedding_type=embedding_type,
+                    limit=k,
+                )
+                durations.append((time.perf_counter() - start) * 1000)
+
+                ids.append([match.book_id for match in matches])
+
+            results[name] = ids
+            runs[name] = {
+                "warm_up_seconds": warm_up,
+                "mean_ms": mean(durations),
+                "p95_ms": (
+                    quantiles(durations, n=20)[-1]
+                    if len(durations) > 1
+                    else durations[0]
+                ),
+            }
+
+            self.stdout.write(
+                f"{name:10} warm-up={warm_up:6.2f}s "
+                f"mean={runs[name]['mean_ms']:7.2f}ms "
+                f"p95={runs[name]['p95_ms']:7.2f}ms"
+            )
+
+        # numpy is exact, so this is the recall of the pgvector index.
+        overlap = mean(
+            len(set(approximate) & set(exact)) / len(exact)
+            for approximate, exact in zip(results["pgvector"], results["numpy"])
+            if exact
+        )
+
+        self.stdout.write(f"Overlap@{k}: {overlap:.3f}")
+
+        self._save_results(embedding_type, len(queries), k, runs, overlap)
+
+    def _save_results(self, embedding_type, query_count, k, runs, overlap):
+        created_at = datetime.now(UTC)
+
+        output = {
+            "embedding_type": embedding_type,
+            "created_at": created_at.isoformat(),
+            "query_count": query_count,
+            "k": k,
+            "overlap": overlap,
+            "backends": runs,
+        }
+
+        timestamp = created_at.strftime("%Y%m%d_%H%M%S")
+
+        output_path = (
+            Path(__file__).resolve().parents[2]
+            / "benchmark"
+            / "vector_backend"
+            / "results"
+            / f"{embedding_type}_{timestamp}.json"
+        )
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with output_path.open("w", encoding="utf-8") as file:
+            json.dump(output, file, indent=4)
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(f"Benchmark results saved to {output_path}")
+        )
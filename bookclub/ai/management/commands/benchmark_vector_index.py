@@ -0,0 +1,190 @@
+from pathlib import Path
+import json
+
+import time
+from statistics import mean, quantiles
+from datetime import datetime, UTC
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from pgvector.django import CosineDistance
+
+from ai.models import BookEmbedding
+from ai.services.vector_index import hnsw_ef_search
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure recall and latency of the HNSW embedding index against "
+        "an exact scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            dest="embedding_type",
+            choices=BookEmbedding.EmbeddingType.values,
+            default=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+        )
+
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=100,
+            help="Number of stored embeddings used as queries.",
+        )
+
+        parser.add_argument(
+            "--k",
+            type=int,
+            default=10,
+            help="Number of neighbours retrieved per query.",
+        )
+
+        parser.add_argument(
+            "--ef-search",
+            type=int,
+            nargs="+",
+            default=[10, 20, 40, 80, 100, 200],
+        )
+
+    def handle(self, *args, **options):
+        embedding_type = options["embedding_type"]
+        k = options["k"]
+
+        queries = list(
+            BookEmbedding.objects.filter(embedding_type=embedding_type)
+            .order_by("?")
+            .values_list("embedding", flat=True)[:options["queries"]]
+        )
+
+        if not queries:
+            raise CommandError(f"No {embedding_type} embeddings found.")
+
+        self.stdout.write(
+            f"Benchmarking {len(queries)} queries, k={k}, "
+            f"type={embedding_type}..."
+        )
+
+        exact_ids, exact_durations = self._run_exact(
+            embedding_type,
+            queries,
+            k,
+        )
+
+        runs = [self._summarize("exact", exact_durations, recall=1.0)]
+
+        for ef_search in options["ef_search"]:
+            ids, durations = self._run_index(
+                embedding_type,
+                queries,
+                k,
+                ef_search,
+            )
+
+            recall = mean(
+                len(set(found) & set(expected)) / len(expected)
+                for found, expected in zip(ids, exact_ids)
+                if expected
+            )
+
+            runs.append(
+                self._summarize(
+                    f"ef_search={ef_search}",
+                    durations,
+                    recall=recall,
+                    ef_search=ef_search,
+                )
+            )
+
+        self._save_results(embedding_type, len(queries), k, runs)
+
+    def _nearest(self, embedding_type, query, k):
+        return list(
+            BookEmbedding.objects.filter(embedding_type=embedding_type)
+            .order_by(CosineDistance("embedding", query))
+            .values_list("book_id", flat=True)[:k]
+        )
+
+    def _run_exact(self, embedding_type, queries, k):
+        ids = []
+        durations = []
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_indexscan = off")
+
+            for query in queries:
+                start = time.perf_counter()
+                ids.append(self._nearest(embedding_type, query, k))
+                durations.append(time.perf_counter() - start)
+
+        return ids, durations
+
+    def _run_index(self, embedding_type, queries, k, ef_search):
+        ids = []
+        durations = []
+
+        # Exactly ef_search, even when below k, to show the whole curve.
+        with hnsw_ef_search(ef_search):
+            for query in queries:
+                start = time.perf_counter()
+                ids.append(self._nearest(embedding_type, query, k))
+                durations.append(time.perf_counter() - start)
+
+        return ids, durations
+
+    def _summarize(self, name, durations, *, recall, ef_search=None):
+        milliseconds = [duration * 1000 for duration in durations]
+        p95 = (
+            quantiles(milliseconds, n=20)[-1]
+            if len(milliseconds) > 1
+            else milliseconds[0]
+        )
+
+        self.stdout.write(
+            f"{name:16} recall={recall:6.3f} "
+            f"mean={mean(milliseconds):7.2f}ms p95={p95:7.2f}ms"
+        )
+
+        return {
+            "name": name,
+            "ef_search": ef_search,
+            "recall": recall,
+            "mean_ms": mean(milliseconds),
+            "p95_ms": p95,
+        }
+
+    def _save_results(self, embedding_type, query_count, k, runs):
+        created_at = datetime.now(UTC)
+
+        output = {
+            "embedding_type": embedding_type,
+            "created_at": created_at.isoformat(),
+            "embedding_count": BookEmbedding.objects.filter(
+                embedding_type=embedding_type,
+            ).count(),
+            "query_count": query_count,
+            "k": k,
+            "runs": runs,
+        }
+
+        timestamp = created_at.strftime("%Y%m%d_%H%M%S")
+
+        output_path = (
+            Path(__file__).resolve().parents[2]
+            / "benchmark"
+            / "vector_index"
+            / "results"
+            / f"{embedding_type}_{timestamp}.json"
+        )
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with output_path.open("w", encoding="utf-8") as file:
+            json.dump(output, file, indent=4)
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(f"Benchmark results saved to {output_path}")
+        )
@@ -0,0 +1,112 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ai.models import BookEmbedding
+
+
+class Command(BaseCommand):
+    help = (
+        "Build or rebuild the HNSW embedding indexes without blocking "
+        "writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            dest="embedding_types",
+            action="append",
+            choices=BookEmbedding.EmbeddingType.values,
+            help="Embedding type to index. Defaults to all types.",
+        )
+
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Rebuild indexes that already exist.",
+        )
+
+        parser.add_argument(
+            "--maintenance-work-mem",
+            default="512MB",
+            help="maintenance_work_mem for the build; HNSW builds are much "
+            "faster when the graph fits in it.",
+        )
+
+    def handle(self, *args, **options):
+        embedding_types = options["embedding_types"]
+
+        indexes = [
+            index
+            for index in BookEmbedding._meta.indexes
+            if embedding_types is None
+            or dict(index.condition.children)["embedding_type"]
+            in embedding_types
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('maintenance_work_mem', %s, false)",
+                [options["maintenance_work_mem"]],
+            )
+
+        for index in indexes:
+            start = time.perf_counter()
+
+            match self._index_state(index.name):
+                case None:
+                    self.stdout.write(f"Building {index.name}...")
+                    self._create(index)
+
+                case False:
+                    # Left behind by an interrupted concurrent build.
+                    self.stdout.write(f"Replacing invalid {index.name}...")
+                    self._drop(index)
+                    self._create(index)
+
+                case True if options["rebuild"]:
+                    self.stdout.write(f"Rebuilding {index.name}...")
+                    self._reindex(index)
+
+                case True:
+                    self.stdout.write(f"{index.name} already exists.")
+                    continue
+
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                self.style.SUCCESS(f"{index.name} ready ({elapsed:.1f}s).")
+            )
+
+    def _index_state(self, name: str) -> bool | None:
+        """
+        Return whether the index is valid, or None if it does not exist.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT pg_index.indisvalid
+                FROM pg_index
+                JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+                WHERE pg_class.relname = %s
+                """,
+                [name],
+            )
+            row = cursor.fetchone()
+
+        return None if row is None else row[0]
+
+    def _create(self, index):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            schema_editor.add_index(BookEmbedding, index, concurrently=True)
+
+    def _drop(self, index):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            schema_editor.remove_index(BookEmbedding, index, concurrently=True)
+
+    def _reindex(self, index):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"REINDEX INDEX CONCURRENTLY {connection.ops.quote_name(index.name)}"
+            )
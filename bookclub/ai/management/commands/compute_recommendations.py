@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ai.models import BookEmbedding, BookRecommendation
+from ai.services.recommendations import CANDIDATE_LIMIT, RecommendationService
+from ai.services.vectors.factory import get_vector_backend
+from library.models import Book
+
+
+EMBEDDING_TYPE = BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE
+
+
+class Command(BaseCommand):
+    help = "Precompute book recommendations into the BookRecommendation table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help=(
+                "Only recompute books whose embeddings changed since their "
+                "recommendations were stored, and the books near them."
+            ),
+        )
+
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.RECOMMENDATIONS_PRECOMPUTED_LIMIT,
+            help="Recommendations stored per book.",
+        )
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+        )
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        batch_size = options["batch_size"]
+
+        if options["incremental"]:
+            book_ids = self._changed_book_ids()
+        else:
+            book_ids = list(
+                BookEmbedding.objects
+                .filter(embedding_type=EMBEDDING_TYPE)
+                .order_by("book_id")
+                .values_list("book_id", flat=True)
+            )
+
+        total = len(book_ids)
+
+        if total == 0:
+            self.stdout.write(
+                self.style.SUCCESS("Recommendations are up to date.")
+            )
+            return
+
+        self.stdout.write(f"Computing recommendations for {total:,} books...")
+
+        service = RecommendationService()
+        processed = 0
+
+        for start in range(0, total, batch_size):
+            batch_ids = book_ids[start:start + batch_size]
+
+            books = (
+                Book.objects
+                .filter(id__in=batch_ids)
+                .select_related("author")
+                .prefetch_related("genres")
+            )
+
+            rows = [
+                BookRecommendation(
+                    book=book,
+                    rank=rank,
+                    recommended=candidate.book,
+                    score=candidate.score,
+                )
+                for book in books
+                for rank, candidate in enumerate(
+                    service.compute(book, limit=limit),
+                    start=1,
+                )
+            ]
+
+            with transaction.atomic():
+                BookRecommendation.objects.filter(book_id__in=batch_ids).delete()
+                BookRecommendation.objects.bulk_create(rows)
+
+                # Marks books with no recommendations too, so incremental
+                # runs do not pick them up again.
+                BookEmbedding.objects.filter(
+                    embedding_type=EMBEDDING_TYPE,
+                    book_id__in=batch_ids,
+                ).update(recommendations_computed_at=timezone.now())
+
+            processed += len(batch_ids)
+
+            self.stdout.write(f"Processed {processed:,}/{total:,}...")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored recommendations for {processed:,} books."
+            )
+        )
+
+    def _changed_book_ids(self) -> list[int]:
+        """
+        Return books whose embedding changed since their recommendations
+        were last computed (or that were never computed), plus the books
+        that may now rank them: those listing them today and their
+        nearest neighbours.
+        """
+        changed_ids = set(
+            BookEmbedding.objects
+            .filter(embedding_type=EMBEDDING_TYPE)
+            .filter(
+                Q(recommendations_computed_at__isnull=True)
+                | Q(updated_at__gt=F("recommendations_computed_at"))
+            )
+            .values_list("book_id", flat=True)
+        )
+
+        # Lists of books whose embedding no longer exists are dropped.
+        BookRecommendation.objects.exclude(
+            book__embeddings__embedding_type=EMBEDDING_TYPE,
+        ).delete()
+
+        if not changed_ids:
+            return []
+
+        affected_ids = set(changed_ids)
+
+        affected_ids.update(
+            BookRecommendation.objects
+            .filter(recommended_id__in=changed_ids)
+            .values_list("book_id", flat=True)
+        )
+
+        backend = get_vector_backend()
+
+        for embedding in (
+            BookEmbedding.objects
+            .filter(embedding_type=EMBEDDING_TYPE, book_id__in=changed_ids)
+            .values_list("embedding", flat=True)
+        ):
+            affected_ids.update(
+                match.book_id
+                for match in backend.nearest(
+                    embedding,
+                    embedding_type=EMBEDDING_TYPE,
+                    limit=CANDIDATE_LIMIT,
+                )
+            )
+
+        return sorted(affected_ids)
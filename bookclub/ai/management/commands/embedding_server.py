@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai.services.embedding_server import EmbeddingServer
+from ai.services.embeddings import EmbeddingService
+
+
+class Command(BaseCommand):
+    help = "Serve embeddings to local workers over a Unix domain socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=settings.EMBEDDING_SERVER_SOCKET,
+            help="Socket path. Defaults to EMBEDDING_SERVER_SOCKET.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["socket"]
+
+        if not path:
+            raise CommandError(
+                "Pass --socket or set EMBEDDING_SERVER_SOCKET."
+            )
+
+        self.stdout.write("Loading embedding model...")
+
+        service = EmbeddingService(use_server=False)
+        service.embed_document("warm up")
+
+        server = EmbeddingServer(path, service)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Serving embeddings on {path}.")
+        )
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.unlink(path)
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from ai.models import RecommendationExplanation
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the hit rate and stored tokens of the recommendation "
+        "explanation store, per model and prompt version."
+    )
+
+    def handle(self, *args, **options):
+        rows = (
+            RecommendationExplanation.objects
+            .values("model_name", "prompt_version")
+            .annotate(
+                explanations=Count("id"),
+                hits=Sum("hit_count"),
+                generations=Sum("generation_count"),
+                input_tokens=Sum("input_tokens"),
+                output_tokens=Sum("output_tokens"),
+                total_tokens=Sum("total_tokens"),
+            )
+            .order_by("model_name", "prompt_version")
+        )
+
+        if not rows:
+            self.stdout.write("No stored explanations.")
+            return
+
+        for row in rows:
+            requests = row["hits"] + row["generations"]
+            hit_rate = row["hits"] / requests if requests else 0.0
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{row['model_name']} / prompt {row['prompt_version']}"
+                )
+            )
+            self.stdout.write(f"  Explanations: {row['explanations']}")
+            self.stdout.write(f"  Hits: {row['hits']}")
+            self.stdout.write(f"  Provider calls: {row['generations']}")
+            self.stdout.write(f"  Hit rate: {hit_rate:.1%}")
+            self.stdout.write(
+                f"  Stored tokens: {row['total_tokens']} "
+                f"({row['input_tokens']} input, {row['output_tokens']} output)"
+            )
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai.models import BookEmbedding
+from ai.services.vectors.snapshots import (
+    export_lock,
+    export_snapshot,
+    prune_snapshots,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export book embeddings to memory-mappable snapshots in "
+        "VECTOR_SNAPSHOT_DIR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            dest="embedding_types",
+            action="append",
+            choices=BookEmbedding.EmbeddingType.values,
+            help="Embedding type to export. Defaults to summary_no_title.",
+        )
+
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=settings.VECTOR_SNAPSHOT_KEEP,
+            help="Number of snapshots to keep per type.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.VECTOR_SNAPSHOT_DIR:
+            raise CommandError("VECTOR_SNAPSHOT_DIR is not configured.")
+
+        embedding_types = options["embedding_types"] or [
+            BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+        ]
+
+        for embedding_type in embedding_types:
+            self.stdout.write(f"Exporting {embedding_type} embeddings...")
+
+            # Workers export under the same lock when they find a stale
+            # snapshot, so the two never write or prune at once.
+            with export_lock(embedding_type, blocking=True):
+                snapshot = export_snapshot(embedding_type)
+
+                removed = prune_snapshots(embedding_type, keep=options["keep"])
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Snapshot {snapshot.id}: "
+                    f"{snapshot.manifest['rows']:,} rows "
+                    f"({snapshot.vectors.nbytes / 1024 / 1024:.1f} MB), "
+                    f"{len(removed)} old snapshot(s) removed."
+                )
+            )
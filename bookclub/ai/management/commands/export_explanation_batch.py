@@ -0,0 +1,258 @@
+from pathlib import Path
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import prefetch_related_objects
+
+from library.models import Book
+
+from ai.management.commands.export_summary_batch import (
+    MAX_ENQUEUED_TOKENS,
+    MAX_REQUESTS,
+)
+from ai.models import BookRecommendation, RecommendationExplanation
+from ai.prompts.recommendation import PROMPT_VERSION
+from ai.services.explanation_batch import ExplanationBatchService, build_custom_id
+from ai.services.explanations import explanation_input_hash
+from ai.services.recommendations import RecommendationService
+from ai.services.summary.providers.openai import DEFAULT_MODEL
+
+
+class Command(BaseCommand):
+    help = (
+        "Export explanation requests for the top recommendations of "
+        "selected books as OpenAI Batch API JSONL files."
+    )
+
+    def add_arguments(self, parser):
+        selection = parser.add_mutually_exclusive_group(required=True)
+        selection.add_argument(
+            "--top",
+            type=int,
+            help="Export the books with the most ratings, this many.",
+        )
+        selection.add_argument(
+            "--book-ids",
+            type=int,
+            nargs="+",
+            help="Export these books.",
+        )
+        parser.add_argument(
+            "--per-book",
+            type=int,
+            default=8,
+            help="Recommendations explained per book.",
+        )
+        parser.add_argument(
+            "--live",
+            action="store_true",
+            help="Compute recommendations instead of reading the precomputed ones.",
+        )
+
+    def handle(self, *args, **options):
+        per_book = options["per_book"]
+
+        if per_book <= 0:
+            raise CommandError("--per-book must be greater than zero.")
+
+        books = Book.objects.order_by("-num_ratings", "id")
+
+        if options["book_ids"]:
+            books = books.filter(id__in=options["book_ids"])
+        else:
+            books = books[:options["top"]]
+
+        pairs = self._collect_pairs(list(books), per_book, live=options["live"])
+        pairs = self._drop_stored(pairs)
+
+        if not pairs:
+            self.stdout.write("Every selected explanation is already stored.")
+            return
+
+        service = ExplanationBatchService(model=DEFAULT_MODEL)
+        export_dir = self._build_output_directory()
+
+        exported, batch_count = self._export_pairs(
+            pairs=pairs,
+            service=service,
+            export_dir=export_dir,
+        )
+
+        # The importer reads the model and prompt version from here.
+        with (export_dir / "manifest.json").open("w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "model_name": DEFAULT_MODEL,
+                    "prompt_version": PROMPT_VERSION,
+                    "requests": exported,
+                },
+                file,
+                indent=4,
+            )
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported {exported:,} explanations into {batch_count} batch file(s)."
+            )
+        )
+
+    def _collect_pairs(self, books, per_book, *, live):
+        """
+        Return (source, recommended, input_hash) for the top `per_book`
+        recommendations of each book.
+        """
+        pairs = []
+
+        if live:
+            service = RecommendationService()
+
+            for book in books:
+                pairs.extend(
+                    (book, candidate.book)
+                    for candidate in service.compute(book, limit=per_book)
+                )
+        else:
+            pairs.extend(
+                (recommendation.book, recommendation.recommended)
+                for recommendation in (
+                    BookRecommendation.objects
+                    .filter(book__in=books, rank__lte=per_book)
+                    .select_related("book__author", "recommended__author")
+                    .order_by("book_id", "rank")
+                )
+            )
+
+        prefetch_related_objects(
+            [book for pair in pairs for book in pair],
+            "genres",
+        )
+
+        return [
+            (
+                source,
+                recommended,
+                explanation_input_hash(source, recommended, model=DEFAULT_MODEL),
+            )
+            for source, recommended in pairs
+        ]
+
+    def _drop_stored(self, pairs):
+        stored = {
+            (source_id, recommended_id, input_hash)
+            for source_id, recommended_id, input_hash in (
+                RecommendationExplanation.objects
+                .filter(
+                    model_name=DEFAULT_MODEL,
+                    prompt_version=PROMPT_VERSION,
+                    source_id__in={source.id for source, _, _ in pairs},
+                )
+                .values_list("source_id", "recommended_id", "input_hash")
+            )
+        }
+
+        return [
+            (source, recommended, input_hash)
+            for source, recommended, input_hash in pairs
+            if (source.id, recommended.id, input_hash) not in stored
+        ]
+
+    def _export_pairs(
+        self,
+        *,
+        pairs,
+        service,
+        export_dir: Path,
+    ):
+        exported = 0
+        batch_number = 1
+
+        current_requests = []
+        current_tokens = 0
+
+        for source, recommended, input_hash in pairs:
+            user_prompt = service.build_user_prompt(source, recommended)
+            estimated_tokens = service.estimate_tokens(user_prompt)
+
+            if (
+                current_requests
+                and (
+                    len(current_requests) >= MAX_REQUESTS
+                    or current_tokens + estimated_tokens > MAX_ENQUEUED_TOKENS
+                )
+            ):
+                self._write_batch(
+                    requests=current_requests,
+                    export_dir=export_dir,
+                    batch_number=batch_number,
+                    estimated_tokens=current_tokens,
+                )
+
+                exported += len(current_requests)
+
+                batch_number += 1
+                current_requests = []
+                current_tokens = 0
+
+            current_requests.append(
+                service.build_request(
+                    custom_id=build_custom_id(source.id, recommended.id, input_hash),
+                    user_prompt=user_prompt,
+                )
+            )
+            current_tokens += estimated_tokens
+
+        if current_requests:
+            self._write_batch(
+                requests=current_requests,
+                export_dir=export_dir,
+                batch_number=batch_number,
+                estimated_tokens=current_tokens,
+            )
+
+            exported += len(current_requests)
+
+        return exported, batch_number
+
+    def _build_output_directory(self) -> Path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        export_dir = (
+            Path(__file__).resolve().parents[2]
+            / "batch"
+            / "explanation"
+            / f"explanation_batch_{PROMPT_VERSION}_{DEFAULT_MODEL.replace(':', '_')}_{timestamp}"
+        )
+
+        export_dir.mkdir(
+            parents=True,
+            exist_ok=True,
+        )
+
+        return export_dir
+
+    def _write_batch(
+        self,
+        *,
+        requests,
+        export_dir: Path,
+        batch_number: int,
+        estimated_tokens: int,
+    ):
+        output_path = export_dir / f"part{batch_number:03}.jsonl"
+
+        with output_path.open("w", encoding="utf-8") as file:
+            for request in requests:
+                json.dump(request, file, ensure_ascii=False)
+                file.write("\n")
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {output_path.relative_to(export_dir.parent)}"
+            )
+        )
+        self.stdout.write(f"  Requests: {len(requests):,}")
+        self.stdout.write(f"  Estimated prompt tokens: {estimated_tokens:,}")
+        self.stdout.write("")
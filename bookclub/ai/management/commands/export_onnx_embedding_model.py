@@ -0,0 +1,103 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai.services.onnx_encoder import MODEL_FILE, QUANTIZED_MODEL_FILE
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the embedding model to ONNX, with an int8 dynamically "
+        "quantised copy, for EMBEDDING_BACKEND=onnx / onnx_int8."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            default=settings.EMBEDDING_ONNX_DIR,
+        )
+
+        parser.add_argument(
+            "--opset",
+            type=int,
+            default=17,
+        )
+
+        parser.add_argument(
+            "--skip-quantize",
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        output_dir = Path(options["output_dir"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        self.stdout.write(f"Loading {settings.EMBEDDING_MODEL_NAME}...")
+
+        model = SentenceTransformer(settings.EMBEDDING_MODEL_NAME, device="cpu")
+        tokenizer = model.tokenizer
+        transformer = model[0].auto_model.eval()
+
+        class LastHiddenState(torch.nn.Module):
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.transformer(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    token_type_ids=token_type_ids,
+                ).last_hidden_state
+
+        sample = tokenizer(
+            ["An example sentence to trace the graph."],
+            return_tensors="pt",
+        )
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+
+        model_path = output_dir / MODEL_FILE
+
+        self.stdout.write(f"Exporting to {model_path}...")
+
+        with torch.no_grad():
+            torch.onnx.export(
+                LastHiddenState(transformer),
+                tuple(sample[name] for name in input_names),
+                str(model_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=options["opset"],
+                dynamo=False,
+            )
+
+        # Writes tokenizer.json, read by the tokenizers library at runtime.
+        tokenizer.save_pretrained(output_dir)
+
+        if not options["skip_quantize"]:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantized_path = output_dir / QUANTIZED_MODEL_FILE
+
+            self.stdout.write(f"Quantising to {quantized_path}...")
+
+            quantize_dynamic(
+                str(model_path),
+                str(quantized_path),
+                weight_type=QuantType.QInt8,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"ONNX model exported to {output_dir}. "
+                "Check parity with `manage.py benchmark_embedding_backends`."
+            )
+        )
@@ -5,6 +5,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 from ai.models import BookEmbedding, BookSummary
+from ai.services.vectors.versions import embeddings_changed
 from ai.services.embeddings import (
     EmbeddingService,
     build_description_embedding_text,
@@ -154,6 +155,9 @@ class Command(BaseCommand):
 
             processed += len(batch)
 
+            # Let in-process vector backends pick up the new rows.
+            embeddings_changed(embedding_type)
+
             self.stdout.write(
                 f"Processed {processed:,}/{total:,}..."
             )
@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ai.models import RecommendationExplanation
+from ai.services.explanation_batch import ExplanationBatchImporter
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = "Import OpenAI Batch API recommendation explanations into the explanation store."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "directory",
+            type=Path,
+            help="Export directory containing manifest.json and the Batch API output files.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+
+        if not directory.exists():
+            raise CommandError(f"Directory not found: {directory}")
+
+        manifest_path = directory / "manifest.json"
+
+        if not manifest_path.exists():
+            raise CommandError(f"Manifest not found: {manifest_path}")
+
+        with manifest_path.open("r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        importer = ExplanationBatchImporter()
+        explanations = importer.import_directory(directory)
+
+        if importer.failures:
+            self.stdout.write(
+                self.style.WARNING(f"Skipped {len(importer.failures):,} failed requests:")
+            )
+
+            for failure in importer.failures:
+                self.stdout.write(f"  {failure.custom_id}: {failure.reason}")
+
+        # Books deleted since the export are skipped.
+        existing_ids = set(
+            Book.objects.filter(
+                id__in={
+                    book_id
+                    for explanation in explanations
+                    for book_id in (explanation.source_id, explanation.recommended_id)
+                }
+            ).values_list("id", flat=True)
+        )
+
+        models = [
+            RecommendationExplanation(
+                source_id=explanation.source_id,
+                recommended_id=explanation.recommended_id,
+                model_name=manifest["model_name"],
+                prompt_version=manifest["prompt_version"],
+                input_hash=explanation.input_hash,
+                content=explanation.content,
+                input_tokens=explanation.input_tokens,
+                output_tokens=explanation.output_tokens,
+                total_tokens=explanation.total_tokens,
+                generation_count=1,
+            )
+            for explanation in explanations
+            if explanation.source_id in existing_ids
+            and explanation.recommended_id in existing_ids
+        ]
+
+        self.stdout.write(f"Saving {len(models):,} explanations...")
+
+        with transaction.atomic():
+            RecommendationExplanation.objects.bulk_create(
+                models,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=[
+                    "source",
+                    "recommended",
+                    "model_name",
+                    "prompt_version",
+                ],
+                update_fields=[
+                    "input_hash",
+                    "content",
+                    "input_tokens",
+                    "output_tokens",
+                    "total_tokens",
+                    "updated_at",
+                ],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(models):,} explanations."))
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:40
+
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Building HNSW indexes takes a while; don't block embedding writes.
+    atomic = False
+
+    dependencies = [
+        ('ai', '0004_alter_bookembedding_embedding_type'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='bookembedding',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('embedding_type', 'description')), ef_construction=64, fields=['embedding'], m=16, name='book_emb_description_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='bookembedding',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('embedding_type', 'summary')), ef_construction=64, fields=['embedding'], m=16, name='book_emb_summary_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='bookembedding',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('embedding_type', 'summary_no_title')), ef_construction=64, fields=['embedding'], m=16, name='book_emb_summary_no_title_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='bookembedding',
+            index=pgvector.django.indexes.HnswIndex(condition=models.Q(('embedding_type', 'enriched')), ef_construction=64, fields=['embedding'], m=16, name='book_emb_enriched_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0008_recommendationexplanation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookembedding',
+            name='recommendations_computed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        # Books that already have stored recommendations were processed
+        # when those were written.
+        migrations.RunSQL(
+            sql="""
+                UPDATE ai_bookembedding AS embedding
+                SET recommendations_computed_at = stored.computed_at
+                FROM (
+                    SELECT book_id, MIN(computed_at) AS computed_at
+                    FROM ai_bookrecommendation
+                    GROUP BY book_id
+                ) AS stored
+                WHERE embedding.book_id = stored.book_id
+                  AND embedding.embedding_type = 'summary_no_title';
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
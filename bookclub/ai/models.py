@@ -1,5 +1,23 @@
+from django.conf import settings
 from django.db import models
-from pgvector.django import VectorField
+from pgvector.django import HnswIndex, VectorField
+
+
+def hnsw_index(embedding_type: str) -> HnswIndex:
+    """
+    Return the HNSW cosine index over the embeddings of one type.
+
+    Every query filters on a single embedding type, so each type gets a
+    partial index of its own instead of one index over all rows.
+    """
+    return HnswIndex(
+        fields=["embedding"],
+        opclasses=["vector_cosine_ops"],
+        condition=models.Q(embedding_type=embedding_type),
+        name=f"book_emb_{embedding_type}_hnsw",
+        m=16,
+        ef_construction=64,
+    )
 
 
 class BookSummary(models.Model):
@@ -97,6 +115,15 @@ class BookEmbedding(models.Model):
         auto_now=True,
     )
 
+    # When compute_recommendations last processed the book, set even if
+    # it found nothing to store. Written with update(), so it does not
+    # touch updated_at.
+    recommendations_computed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -104,3 +131,160 @@ class BookEmbedding(models.Model):
                 name="uniq_book_embedding_type",
             )
         ]
+
+        indexes = [
+            hnsw_index("description"),
+            hnsw_index("summary"),
+            hnsw_index("summary_no_title"),
+            hnsw_index("enriched"),
+        ]
+
+
+class BookRecommendation(models.Model):
+    """
+    Precomputed recommendations for a book, written by
+    `manage.py compute_recommendations`.
+    """
+
+    book = models.ForeignKey(
+        "library.Book",
+        on_delete=models.CASCADE,
+        related_name="recommendations",
+    )
+
+    rank = models.PositiveSmallIntegerField()
+
+    recommended = models.ForeignKey(
+        "library.Book",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+
+    score = models.FloatField()
+
+    computed_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ["book", "rank"]
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "rank"],
+                name="uniq_book_recommendation_rank",
+            )
+        ]
+
+
+class RecommendationExplanation(models.Model):
+    """
+    Stored LLM explanation of why `recommended` suits readers of
+    `source`, reused until the inputs of the prompt change.
+    """
+
+    source = models.ForeignKey(
+        "library.Book",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+
+    recommended = models.ForeignKey(
+        "library.Book",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+
+    model_name = models.CharField(
+        max_length=100,
+    )
+
+    prompt_version = models.CharField(
+        max_length=20,
+    )
+
+    # Hash of the book fields the prompt is built from; a mismatch means
+    # a description or the genres changed and the text is regenerated.
+    input_hash = models.CharField(
+        max_length=64,
+    )
+
+    content = models.TextField()
+
+    input_tokens = models.PositiveIntegerField(
+        default=0,
+    )
+
+    output_tokens = models.PositiveIntegerField(
+        default=0,
+    )
+
+    total_tokens = models.PositiveIntegerField(
+        default=0,
+    )
+
+    # Requests served from this row, and provider calls made for it.
+    hit_count = models.PositiveIntegerField(
+        default=0,
+    )
+
+    generation_count = models.PositiveIntegerField(
+        default=0,
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    def __str__(self):
+        return f"Explanation for {self.source_id} -> {self.recommended_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "source",
+                    "recommended",
+                    "model_name",
+                    "prompt_version",
+                ],
+                name="uniq_recommendation_explanation",
+            )
+        ]
+
+
+class UserTasteProfile(models.Model):
+    """
+    A user's taste vector: the weighted sum of the embeddings of the
+    books they reviewed or listed. Maintained by ai.services.taste_profiles.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="taste_profile",
+    )
+
+    embedding = VectorField(
+        dimensions=384,
+    )
+
+    # Weight each book contributes to `embedding`, by book id.
+    weights = models.JSONField(
+        default=dict,
+    )
+
+    # Embeddings version the profile was built from; a profile built
+    # from older embeddings is rebuilt on its next use.
+    embeddings_version = models.BigIntegerField()
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
+
+    def __str__(self):
+        return f"Taste profile for {self.user}"
@@ -1,3 +1,5 @@
+PROMPT_VERSION = "v1"
+
 RECOMMENDATION_SYSTEM_PROMPT = """
 You are an expert literary recommendation assistant.
 
@@ -23,6 +25,13 @@ def truncate_description(text: str) -> str:
 
     return text[:MAX_DESCRIPTION_LENGTH] + "..."
 
+def genre_names(book) -> str:
+    # Ordered by id so the prompt, and the input hash built from it, is
+    # the same on every call.
+    genres = sorted(book.genres.all(), key=lambda genre: genre.id)
+
+    return ", ".join(genre.name for genre in genres[:MAX_GENRES])
+
 def build_recommendation_user_prompt(book, recommendation):
     return f"""
 Original Book
@@ -32,7 +41,7 @@ Title:
 Author: 
 {book.author.name}
 Genres: 
-{", ".join(g.name for g in book.genres.all()[:MAX_GENRES])}
+{genre_names(book)}
 Description:
 {truncate_description(book.description)}
 
@@ -43,7 +52,7 @@ Title:
 Author: 
 {recommendation.author.name}
 Genres: 
-{", ".join(g.name for g in recommendation.genres.all()[:MAX_GENRES])}
+{genre_names(recommendation)}
 Description:
 {truncate_description(recommendation.description)}
 
@@ -0,0 +1,56 @@
+"""
+Maximal marginal relevance (MMR) re-ranking.
+
+Candidates are picked one at a time, each maximising
+
+    lambda * relevance - (1 - lambda) * max similarity to those picked,
+
+so a slightly less relevant book from an unrepresented corner of the
+neighbourhood can beat another near-copy of what is already listed.
+A lambda of 1 keeps the relevance order.
+"""
+
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    embeddings,
+    relevance,
+    *,
+    limit: int,
+    lambda_: float,
+) -> list[int]:
+    """
+    Return the indexes of up to `limit` candidates in MMR order. All
+    pairwise cosine similarities come from one matrix product.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    count = len(relevance)
+
+    if count == 0 or limit <= 0:
+        return []
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    similarities = vectors @ vectors.T
+
+    # Similarity of each candidate to its closest pick so far; dissimilar
+    # candidates are not rewarded, only similar ones penalised.
+    redundancy = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    selected = []
+
+    for _ in range(min(limit, count)):
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+
+        best = int(np.argmax(scores))
+
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarities[best], out=redundancy)
+
+    return selected
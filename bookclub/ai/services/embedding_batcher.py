@@ -0,0 +1,105 @@
+"""
+Micro-batching of embedding requests made concurrently by request threads.
+
+Callers block in `submit` while a dispatcher thread gathers texts for up
+to `max_wait` seconds or `max_batch` texts, encodes them with one call
+and hands each caller its row. Encoding a batch costs little more than
+encoding a single text on CPU, so throughput scales with concurrency.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        *,
+        max_wait: float,
+        max_batch: int,
+    ):
+        self.encode = encode
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def submit(self, text: str) -> np.ndarray:
+        """
+        Return the embedding of `text`, encoded together with any other
+        texts submitted within the batch window.
+        """
+        self._ensure_dispatcher()
+
+        future: Future = Future()
+        self._queue.put((text, future))
+
+        return future.result()
+
+    def _ensure_dispatcher(self) -> None:
+        # Threads do not survive fork, so a forked worker starts its own.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+
+            self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="embedding-batcher",
+                daemon=True,
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _collect(self) -> list[tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Window closed; still take whatever is already queued.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+
+            try:
+                embeddings = self.encode([text for text, _ in batch])
+            except Exception as exc:
+                logger.exception("Embedding batch of %d failed.", len(batch))
+
+                for _, future in batch:
+                    future.set_exception(exc)
+
+                continue
+
+            logger.debug("Encoded embedding batch of %d.", len(batch))
+
+            for (_, future), embedding in zip(batch, embeddings, strict=True):
+                future.set_result(embedding)
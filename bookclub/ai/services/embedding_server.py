@@ -0,0 +1,199 @@
+"""
+Standalone embedding server on a Unix domain socket.
+
+One process (`manage.py embedding_server`) holds the model and serves
+every gunicorn worker on the host, which then need no model of their
+own. Each connection carries one request and one response:
+
+    request   !BI   kind (0 = queries, 1 = documents), text count
+              then per text: !I byte length, UTF-8 bytes
+    response  !BII  status (0 = ok, 1 = error), rows, dimensions
+              then rows * dimensions little-endian float32,
+              or on error: the UTF-8 message (rows holds its length)
+
+Query texts are encoded through the micro-batcher so concurrent requests
+from different workers share a model call.
+"""
+
+import logging
+import os
+import socket
+import socketserver
+import struct
+import time
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+QUERIES = 0
+DOCUMENTS = 1
+
+OK = 0
+ERROR = 1
+
+REQUEST_HEADER = struct.Struct("!BI")
+RESPONSE_HEADER = struct.Struct("!BII")
+LENGTH = struct.Struct("!I")
+
+# Upper bound on one request, to refuse garbage rather than allocate it.
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+class EmbeddingServerError(Exception):
+    """The embedding server rejected a request."""
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+
+        if not chunk:
+            raise ConnectionError("Connection closed mid-message.")
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b"".join(chunks)
+
+
+class EmbeddingClient:
+    """
+    Client for the embedding server. After a connection failure the
+    server is treated as down for `retry_after` seconds so callers fall back to
+    in-process inference without paying a connection timeout each time.
+    """
+
+    def __init__(self, path: str, *, timeout: float, retry_after: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def encode(self, texts: list[str], *, kind: int) -> np.ndarray:
+        try:
+            return self._request(texts, kind)
+        except OSError:
+            self._down_until = time.monotonic() + self.retry_after
+            raise
+
+    def _request(self, texts: list[str], kind: int) -> np.ndarray:
+        payload = [REQUEST_HEADER.pack(kind, len(texts))]
+
+        for text in texts:
+            data = text.encode("utf-8")
+            payload.append(LENGTH.pack(len(data)))
+            payload.append(data)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(b"".join(payload))
+
+            status, rows, dimensions = RESPONSE_HEADER.unpack(
+                _read_exactly(sock, RESPONSE_HEADER.size)
+            )
+
+            if status != OK:
+                message = _read_exactly(sock, rows).decode("utf-8")
+                raise EmbeddingServerError(message)
+
+            data = _read_exactly(sock, rows * dimensions * 4)
+
+        return np.frombuffer(data, dtype="<f4").reshape(rows, dimensions)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            kind, texts = self._read_request()
+            embeddings = self.server.encode(kind, texts)
+        except Exception as exc:
+            logger.exception("Embedding request failed.")
+            message = str(exc).encode("utf-8")
+            self.request.sendall(
+                RESPONSE_HEADER.pack(ERROR, len(message), 0) + message
+            )
+            return
+
+        embeddings = np.ascontiguousarray(embeddings, dtype="<f4")
+        rows, dimensions = embeddings.shape
+
+        self.request.sendall(
+            RESPONSE_HEADER.pack(OK, rows, dimensions) + embeddings.tobytes()
+        )
+
+    def _read_request(self) -> tuple[int, list[str]]:
+        kind, count = REQUEST_HEADER.unpack(
+            _read_exactly(self.request, REQUEST_HEADER.size)
+        )
+
+        if kind not in (QUERIES, DOCUMENTS):
+            raise ValueError(f"Unknown request kind: {kind}")
+
+        texts = []
+        total = 0
+
+        for _ in range(count):
+            (length,) = LENGTH.unpack(_read_exactly(self.request, LENGTH.size))
+            total += length
+
+            if total > MAX_REQUEST_BYTES:
+                raise ValueError("Request too large.")
+
+            texts.append(_read_exactly(self.request, length).decode("utf-8"))
+
+        return kind, texts
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, service):
+        self.service = service
+
+        # A stale socket file from a previous run would make bind fail.
+        if os.path.exists(path):
+            os.unlink(path)
+
+        super().__init__(path, _Handler)
+
+        os.chmod(path, 0o660)
+
+    def encode(self, kind: int, texts: list[str]) -> np.ndarray:
+        if not texts:
+            raise ValueError("Cannot generate embeddings from an empty list.")
+
+        if kind == QUERIES and len(texts) == 1:
+            return self.service.encode_query_text(texts[0])[None, :]
+
+        return self.service.encode_texts(texts)
+
+
+_client: EmbeddingClient | None = None
+
+
+def get_client() -> EmbeddingClient | None:
+    """
+    Return the process-wide client for EMBEDDING_SERVER_SOCKET, or None
+    when no server is configured.
+    """
+    global _client
+
+    if not settings.EMBEDDING_SERVER_SOCKET:
+        return None
+
+    if _client is None:
+        _client = EmbeddingClient(
+            settings.EMBEDDING_SERVER_SOCKET,
+            timeout=settings.EMBEDDING_SERVER_TIMEOUT,
+        )
+
+    return _client
@@ -5,11 +5,22 @@ Utilities for generating text embeddings.
 from __future__ import annotations
 
 import logging
+import threading
+import time
 
 from django.conf import settings
-from sentence_transformers import SentenceTransformer
+
+import numpy as np
 
 from ai.models import BookSummary
+from ai.services.embedding_batcher import EmbeddingBatcher
+from ai.services.embedding_server import (
+    DOCUMENTS,
+    QUERIES,
+    EmbeddingServerError,
+    get_client,
+)
+from ai.services.query_cache import get_query_cache
 from library.models import Book
 
 logger = logging.getLogger(__name__)
@@ -106,31 +117,129 @@ def _build_embedding_text(
 
 
 
+def load_model():
+    """
+    Load the embedding model for the configured EMBEDDING_BACKEND.
+
+    Every backend exposes the SentenceTransformer `encode` call. The
+    backend libraries are imported here, on first use, so processes that
+    never embed do not pay for importing torch.
+    """
+    start = time.perf_counter()
+
+    match settings.EMBEDDING_BACKEND:
+        case "sentence_transformers":
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            imported = time.perf_counter()
+
+            if settings.EMBEDDING_INTRA_OP_THREADS:
+                torch.set_num_threads(settings.EMBEDDING_INTRA_OP_THREADS)
+
+            model = SentenceTransformer(
+                settings.EMBEDDING_MODEL_NAME,
+                device=settings.EMBEDDING_DEVICE,
+            )
+
+        case "onnx" | "onnx_int8":
+            from .onnx_encoder import OnnxEncoder
+
+            imported = time.perf_counter()
+
+            model = OnnxEncoder(
+                settings.EMBEDDING_ONNX_DIR,
+                quantized=settings.EMBEDDING_BACKEND == "onnx_int8",
+                threads=settings.EMBEDDING_INTRA_OP_THREADS,
+            )
+
+        case other:
+            raise ValueError(f"Unknown embedding backend: {other}")
+
+    logger.info(
+        "Embedding backend %s imported in %.2fs, model loaded in %.2fs.",
+        settings.EMBEDDING_BACKEND,
+        imported - start,
+        time.perf_counter() - imported,
+    )
+
+    return model
+
+
+def warm_up(*, encode: bool = True) -> None:
+    """
+    Load the embedding model now instead of on the first request and,
+    with `encode`, run one dummy query through it.
+    """
+    start = time.perf_counter()
+
+    service = EmbeddingService()
+
+    if encode:
+        service.embed_document("warm up")
+
+    logger.info(
+        "Embedding model warmed up in %.2fs.",
+        time.perf_counter() - start,
+    )
+
+
 class EmbeddingService:
     """Service responsible for generating text embeddings."""
 
     _model = None
+    _batcher = None
+    # Gunicorn threads share the class attributes, so the first load is
+    # guarded to avoid loading the model or starting a batcher twice.
+    _model_lock = threading.Lock()
+    _batcher_lock = threading.Lock()
 
     QUERY_PREFIX = "Represent this sentence for searching relevant passages: "
     
 
-    def __init__(self):
-        if self.__class__._model is None:
-            logger.info(
-                "Loading embedding model: %s",
-                settings.EMBEDDING_MODEL_NAME,
-            )
+    def __init__(
+        self,
+        *,
+        use_server: bool = True,
+    ):
+        # With an embedding server configured, the model is only loaded
+        # here if the server turns out to be unavailable.
+        self.client = get_client() if use_server else None
+
+        if self.client is None:
+            self._load_model()
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        """
+        Return whether queries can be encoded without loading the model
+        first.
+        """
+        return bool(settings.EMBEDDING_SERVER_SOCKET) or cls._model is not None
+
+    @property
+    def model(self):
+        return self._load_model()
+
+    def _load_model(self):
+        if self.__class__._model is not None:
+            return self.__class__._model
+
+        with self._model_lock:
+            if self.__class__._model is None:
+                logger.info(
+                    "Loading embedding model: %s (%s)",
+                    settings.EMBEDDING_MODEL_NAME,
+                    settings.EMBEDDING_BACKEND,
+                )
 
-            self.__class__._model = SentenceTransformer(
-                settings.EMBEDDING_MODEL_NAME,
-                device=settings.EMBEDDING_DEVICE,
-            )
+                self.__class__._model = load_model()
 
-            logger.info(
-                "Embedding model loaded successfully."
-            )
+                logger.info(
+                    "Embedding model loaded successfully."
+                )
 
-        self.model = self.__class__._model
+        return self.__class__._model
 
     def _embed(
         self,
@@ -158,12 +267,63 @@ class EmbeddingService:
 
         logger.debug("Generating embeddings.")
 
-        embeddings = self.model.encode(
-            texts,
-            convert_to_numpy=True,
+        if isinstance(texts, str):
+            return self._encode([texts], kind=DOCUMENTS)[0].tolist()
+
+        return self._encode(texts, kind=DOCUMENTS).tolist()
+
+    def _encode(
+        self,
+        texts: list[str],
+        *,
+        kind: int,
+    ) -> np.ndarray:
+        """
+        Encode texts on the embedding server when one is configured and
+        reachable, in-process otherwise.
+        """
+        if self.client is not None and self.client.available:
+            try:
+                return self.client.encode(texts, kind=kind)
+            except (OSError, EmbeddingServerError):
+                logger.warning(
+                    "Embedding server unavailable; encoding in-process.",
+                    exc_info=True,
+                )
+
+        if kind == QUERIES and len(texts) == 1:
+            return self.encode_query_text(texts[0])[None, :]
+
+        return self.encode_texts(texts)
+
+    def encode_texts(
+        self,
+        texts: list[str],
+    ) -> np.ndarray:
+        """
+        Encode texts with the in-process model.
+        """
+        return np.asarray(
+            self.model.encode(
+                texts,
+                convert_to_numpy=True,
+            ),
+            dtype=np.float32,
         )
 
-        return embeddings.tolist()
+    def encode_query_text(
+        self,
+        text: str,
+    ) -> np.ndarray:
+        """
+        Encode one prefixed query with the in-process model, batched with
+        queries from concurrent requests unless EMBEDDING_BATCH_MAX_SIZE
+        is 1.
+        """
+        if settings.EMBEDDING_BATCH_MAX_SIZE <= 1:
+            return self.encode_texts([text])[0]
+
+        return self._get_batcher().submit(text)
 
     def embed_document(
         self,
@@ -189,11 +349,60 @@ class EmbeddingService:
     ) -> list[float]:
         """
         Generate an embedding for a search query.
+
+        Embeddings of repeated queries are served from the query cache.
         """
-        return self._embed(
-            self.QUERY_PREFIX + query,
+        query_cache = get_query_cache()
+        key = query_cache.make_key(
+            query,
+            backend=settings.EMBEDDING_BACKEND,
+            model_name=settings.EMBEDDING_MODEL_NAME,
         )
 
+        embedding = query_cache.get(key)
+
+        if embedding is None:
+            embedding = query_cache.put(
+                key,
+                self._encode_query(query),
+            )
+
+        return embedding.tolist()
+
+    def _encode_query(
+        self,
+        query: str,
+    ) -> np.ndarray:
+        if not query.strip():
+            raise ValueError(
+                "Cannot generate embedding from empty text."
+            )
+
+        return self._encode(
+            [self.QUERY_PREFIX + query],
+            kind=QUERIES,
+        )[0]
+
+    def _get_batcher(self) -> EmbeddingBatcher:
+        if self.__class__._batcher is not None:
+            return self.__class__._batcher
+
+        with self._batcher_lock:
+            if self.__class__._batcher is None:
+                model = self.model
+
+                self.__class__._batcher = EmbeddingBatcher(
+                    lambda texts: model.encode(
+                        texts,
+                        batch_size=len(texts),
+                        convert_to_numpy=True,
+                    ),
+                    max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+                    max_batch=settings.EMBEDDING_BATCH_MAX_SIZE,
+                )
+
+        return self.__class__._batcher
+
     def embed_queries(
         self,
         queries: list[str],
@@ -0,0 +1,188 @@
+"""
+OpenAI Batch API requests for recommendation explanations, and parsing
+of their results for the explanation store.
+
+Each request's custom_id carries the book pair and the input hash the
+prompt was built from, so imported explanations go stale exactly like
+generated ones when a description or the genres change afterwards.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+import tiktoken
+
+from ai.prompts.recommendation import (
+    RECOMMENDATION_SYSTEM_PROMPT,
+    build_recommendation_user_prompt,
+)
+
+CUSTOM_ID_PATTERN = re.compile(r"explanation-(\d+)-(\d+)-([0-9a-f]{64})")
+
+
+def build_custom_id(source_id: int, recommended_id: int, input_hash: str) -> str:
+    return f"explanation-{source_id}-{recommended_id}-{input_hash}"
+
+
+class ExplanationBatchService:
+    """Build OpenAI Batch API requests for recommendation explanations."""
+
+    def __init__(
+        self,
+        *,
+        model: str,
+    ) -> None:
+        self.model = model
+        self.encoding = tiktoken.encoding_for_model(model)
+
+    def build_user_prompt(self, source_book, recommended_book) -> str:
+        return build_recommendation_user_prompt(source_book, recommended_book)
+
+    def estimate_tokens(self, user_prompt: str) -> int:
+        return len(
+            self.encoding.encode(RECOMMENDATION_SYSTEM_PROMPT + "\n" + user_prompt)
+        )
+
+    def build_request(
+        self,
+        *,
+        custom_id: str,
+        user_prompt: str,
+    ) -> dict:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": {
+                "model": self.model,
+                "input": [
+                    {
+                        "role": "system",
+                        "content": RECOMMENDATION_SYSTEM_PROMPT,
+                    },
+                    {
+                        "role": "user",
+                        "content": user_prompt,
+                    },
+                ],
+            },
+        }
+
+
+@dataclass(slots=True)
+class ImportedExplanation:
+    source_id: int
+    recommended_id: int
+    input_hash: str
+    content: str
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+
+
+@dataclass(slots=True)
+class FailedRequest:
+    custom_id: str
+    reason: str
+
+
+class ExplanationBatchImporter:
+    """
+    Parse OpenAI Batch API output files into ImportedExplanation objects.
+
+    Requests that failed in the batch are skipped and collected in
+    `failures`, so one bad row does not abort the import.
+    """
+
+    def __init__(self) -> None:
+        self.failures: list[FailedRequest] = []
+
+    def import_directory(
+        self,
+        directory: Path,
+    ) -> list[ImportedExplanation]:
+        explanations = []
+
+        for output_file in sorted(directory.glob("*.output.jsonl")):
+            explanations.extend(self.import_file(output_file))
+
+        return explanations
+
+    def import_file(
+        self,
+        file_path: Path,
+    ) -> list[ImportedExplanation]:
+        explanations = []
+
+        with file_path.open("r", encoding="utf-8") as file:
+            for line in file:
+                explanation = self._parse_response(json.loads(line))
+
+                if explanation is not None:
+                    explanations.append(explanation)
+
+        return explanations
+
+    def _parse_response(self, response: dict) -> ImportedExplanation | None:
+        custom_id = response["custom_id"]
+        match = CUSTOM_ID_PATTERN.fullmatch(custom_id)
+
+        if match is None:
+            raise ValueError(f"Invalid custom_id: {custom_id}")
+
+        reason = self._failure_reason(response)
+
+        if reason is not None:
+            return self._skip(custom_id, reason)
+
+        body = response["response"]["body"]
+        text = _message_text(body)
+
+        if text is None:
+            return self._skip(custom_id, "no message in the response output")
+
+        return ImportedExplanation(
+            source_id=int(match.group(1)),
+            recommended_id=int(match.group(2)),
+            input_hash=match.group(3),
+            content=text.strip(),
+            input_tokens=body["usage"]["input_tokens"],
+            output_tokens=body["usage"]["output_tokens"],
+            total_tokens=body["usage"]["total_tokens"],
+        )
+
+    def _skip(self, custom_id: str, reason: str) -> None:
+        self.failures.append(FailedRequest(custom_id=custom_id, reason=reason))
+
+    def _failure_reason(self, response: dict) -> str | None:
+        # A request the batch could not run has only "error"; one the API
+        # rejected has a non-200 response with an error body.
+        if response.get("error"):
+            return response["error"].get("message", "batch error")
+
+        result = response.get("response") or {}
+        error = (result.get("body") or {}).get("error")
+
+        if result.get("status_code") != 200 or error:
+            message = (error or {}).get("message", "request failed")
+            return f"HTTP {result.get('status_code')}: {message}"
+
+        return None
+
+
+def _message_text(body: dict) -> str | None:
+    """
+    Return the text of the message item in a response body. Reasoning
+    models emit other output items before it.
+    """
+    for item in body.get("output") or []:
+        if item.get("type") != "message":
+            continue
+
+        for part in item.get("content") or []:
+            if part.get("type") == "output_text":
+                return part["text"]
+
+    return None
@@ -1,12 +1,71 @@
+import hashlib
+import logging
+import time
+from collections.abc import Iterator
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from django.db.models import F
+
+from ..models import RecommendationExplanation
 from ..prompts.recommendation import (
+    PROMPT_VERSION,
     RECOMMENDATION_SYSTEM_PROMPT,
     build_recommendation_user_prompt,
 )
 
+from .single_flight import SingleFlight
 from .summary.providers.base import SummaryProvider
+from .summary.result import SummaryResult
+
+logger = logging.getLogger(__name__)
+
+# Generation locks must be seen by every worker.
+cache = ConnectionProxy(caches, "shared")
+
+
+def explanation_input_hash(source_book, recommended_book, *, model: str) -> str:
+    """
+    Hash everything the model is given: the model name, the prompt
+    version and the prompts exactly as sent. A stored explanation is
+    regenerated once any book field the prompt shows changes, such as a
+    description, an author's name or a genre name.
+    """
+    digest = hashlib.sha256()
+
+    for part in (
+        model,
+        PROMPT_VERSION,
+        RECOMMENDATION_SYSTEM_PROMPT,
+        build_recommendation_user_prompt(source_book, recommended_book),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+# How often a worker waiting on another worker's explanation polls the
+# store for it.
+POLL_INTERVAL = 0.1
+
+_single_flight = SingleFlight()
 
 
 class ExplanationService:
+    """
+    Explains recommendations with the provider's LLM. Explanations are
+    stored per book pair, model and prompt version, and the provider is
+    only called when none is stored or the stored one is stale.
+
+    Concurrent requests for the same missing explanation share one
+    provider call: within a worker through SingleFlight, across workers
+    through a cache lock whose holder's result the others read from the
+    store. Waiters give up after EXPLANATION_LOCK_TIMEOUT seconds, which
+    outlasts LLM_REQUEST_TIMEOUT, and call the provider themselves.
+    """
+
     def __init__(self, provider: SummaryProvider):
         self.provider = provider
 
@@ -14,6 +73,172 @@ class ExplanationService:
         self,
         source_book,
         recommended_book,
+    ) -> str:
+        input_hash = explanation_input_hash(
+            source_book,
+            recommended_book,
+            model=self.provider.model,
+        )
+
+        stored = self._get_stored(source_book, recommended_book, input_hash)
+
+        if stored is not None:
+            return stored
+
+        key = self._key(source_book, recommended_book, input_hash)
+
+        return _single_flight.do(
+            key,
+            lambda: self._generate_once(
+                key,
+                source_book,
+                recommended_book,
+                input_hash,
+            ),
+            timeout=settings.EXPLANATION_LOCK_TIMEOUT,
+        )
+
+    def _get_stored(
+        self,
+        source_book,
+        recommended_book,
+        input_hash: str,
+    ) -> str | None:
+        """
+        Return the stored explanation if it is current, counting the hit.
+        """
+        stored = RecommendationExplanation.objects.filter(
+            source=source_book,
+            recommended=recommended_book,
+            model_name=self.provider.model,
+            prompt_version=PROMPT_VERSION,
+            input_hash=input_hash,
+        ).first()
+
+        if stored is None:
+            return None
+
+        RecommendationExplanation.objects.filter(pk=stored.pk).update(
+            hit_count=F("hit_count") + 1,
+        )
+
+        return stored.content
+
+    def _generate_once(
+        self,
+        key: str,
+        source_book,
+        recommended_book,
+        input_hash: str,
+    ) -> str:
+        lock_key = f"{key}:lock"
+        lock_timeout = settings.EXPLANATION_LOCK_TIMEOUT
+
+        if cache.add(lock_key, 1, timeout=lock_timeout):
+            try:
+                return self._generate(source_book, recommended_book, input_hash)
+            finally:
+                cache.delete(lock_key)
+
+        deadline = time.monotonic() + lock_timeout
+
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+
+            stored = self._get_stored(source_book, recommended_book, input_hash)
+
+            if stored is not None:
+                return stored
+
+            if cache.get(lock_key) is None:
+                # The generating worker failed without storing a result.
+                break
+        else:
+            logger.warning("Timed out waiting for explanation %s.", key)
+
+        return self._generate(source_book, recommended_book, input_hash)
+
+    def stream_book_recommendation(
+        self,
+        source_book,
+        recommended_book,
+    ) -> Iterator[str]:
+        """
+        Yield the explanation in chunks as the provider generates it. A
+        stored explanation, or one another request is already
+        generating, is yielded whole.
+        """
+        input_hash = explanation_input_hash(
+            source_book,
+            recommended_book,
+            model=self.provider.model,
+        )
+
+        stored = self._get_stored(source_book, recommended_book, input_hash)
+
+        if stored is not None:
+            yield stored
+            return
+
+        key = self._key(source_book, recommended_book, input_hash)
+        lock_key = f"{key}:lock"
+
+        if not cache.add(lock_key, 1, timeout=settings.EXPLANATION_LOCK_TIMEOUT):
+            yield self._generate_once(key, source_book, recommended_book, input_hash)
+            return
+
+        stream = self.provider.stream(
+            system_prompt=RECOMMENDATION_SYSTEM_PROMPT,
+            user_prompt=build_recommendation_user_prompt(
+                source_book,
+                recommended_book,
+            ),
+        )
+
+        # Give up before the lock can expire, so no other request starts
+        # a second generation of the same explanation.
+        deadline = time.monotonic() + settings.LLM_REQUEST_TIMEOUT
+
+        try:
+            while True:
+                try:
+                    delta = next(stream)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Explanation {key} took too long.")
+
+                yield delta
+
+            self._store(source_book, recommended_book, input_hash, result)
+        finally:
+            stream.close()
+            cache.delete(lock_key)
+
+    def _key(
+        self,
+        source_book,
+        recommended_book,
+        input_hash: str,
+    ) -> str:
+        return ":".join(
+            [
+                "explanation",
+                self.provider.model,
+                PROMPT_VERSION,
+                str(source_book.id),
+                str(recommended_book.id),
+                input_hash,
+            ]
+        )
+
+    def _generate(
+        self,
+        source_book,
+        recommended_book,
+        input_hash: str,
     ) -> str:
         prompt = build_recommendation_user_prompt(
             source_book,
@@ -25,4 +250,43 @@ class ExplanationService:
             user_prompt=prompt,
         )
 
-        return result.summary
\ No newline at end of file
+        self._store(source_book, recommended_book, input_hash, result)
+
+        return result.summary
+
+    def _store(
+        self,
+        source_book,
+        recommended_book,
+        input_hash: str,
+        result: SummaryResult,
+    ) -> None:
+        _, created = RecommendationExplanation.objects.update_or_create(
+            source=source_book,
+            recommended=recommended_book,
+            model_name=self.provider.model,
+            prompt_version=PROMPT_VERSION,
+            defaults={
+                "input_hash": input_hash,
+                "content": result.summary,
+                "input_tokens": result.prompt_tokens or 0,
+                "output_tokens": result.completion_tokens or 0,
+                "total_tokens": result.total_tokens or 0,
+                "generation_count": F("generation_count") + 1,
+            },
+            create_defaults={
+                "input_hash": input_hash,
+                "content": result.summary,
+                "input_tokens": result.prompt_tokens or 0,
+                "output_tokens": result.completion_tokens or 0,
+                "total_tokens": result.total_tokens or 0,
+                "generation_count": 1,
+            },
+        )
+
+        logger.info(
+            "%s explanation for books %d -> %d.",
+            "Generated" if created else "Regenerated stale",
+            source_book.id,
+            recommended_book.id,
+        )
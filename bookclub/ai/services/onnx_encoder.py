@@ -0,0 +1,105 @@
+"""
+ONNX Runtime inference for the BGE embedding model.
+
+A drop-in replacement for the SentenceTransformer `encode` call used by
+EmbeddingService, without importing PyTorch. The graph and tokenizer are
+produced by `manage.py export_onnx_embedding_model`.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+MAX_SEQUENCE_LENGTH = 512
+
+
+class OnnxEncoder:
+    """
+    Encode texts with an exported BGE graph: CLS pooling followed by L2
+    normalisation, matching the model's sentence-transformers modules.
+    `threads` sizes ONNX Runtime's intra-op pool; 0 or None uses every
+    core.
+    """
+
+    def __init__(
+        self,
+        model_dir: str | Path,
+        *,
+        quantized: bool = False,
+        threads: int | None = None,
+    ):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / (QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(MAX_SEQUENCE_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+
+        self.session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+    def encode(
+        self,
+        texts: str | list[str],
+        *,
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        **kwargs,
+    ) -> np.ndarray:
+        single = isinstance(texts, str)
+
+        if single:
+            texts = [texts]
+
+        embeddings = np.concatenate(
+            [
+                self._encode_batch(texts[start:start + batch_size])
+                for start in range(0, len(texts), batch_size)
+            ]
+        ) if texts else np.empty((0, 0), dtype=np.float32)
+
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+
+        inputs = {
+            "input_ids": np.array(
+                [encoding.ids for encoding in encodings],
+                dtype=np.int64,
+            ),
+            "attention_mask": np.array(
+                [encoding.attention_mask for encoding in encodings],
+                dtype=np.int64,
+            ),
+            "token_type_ids": np.array(
+                [encoding.type_ids for encoding in encodings],
+                dtype=np.int64,
+            ),
+        }
+
+        hidden_states = self.session.run(
+            None,
+            {name: value for name, value in inputs.items() if name in self.input_names},
+        )[0]
+
+        cls = hidden_states[:, 0].astype(np.float32)
+
+        return cls / np.linalg.norm(cls, axis=1, keepdims=True)
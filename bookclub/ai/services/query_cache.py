@@ -0,0 +1,190 @@
+"""
+Cache of search query embeddings.
+
+A per-process LRU bounded in bytes sits in front of an optional second
+tier in the shared Django cache, so workers can reuse each other's
+embeddings of common queries.
+"""
+
+import hashlib
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+logger = logging.getLogger(__name__)
+
+# Backs the shared tier.
+cache = ConnectionProxy(caches, "shared")
+
+# Statistics are logged every this many lookups.
+LOG_EVERY = 1000
+
+
+def normalize_query(query: str) -> str:
+    # The BGE tokenizer is uncased, so case does not change the embedding.
+    return " ".join(query.split()).lower()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of float32 query embeddings, bounded in bytes."""
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int,
+        shared: bool = False,
+        shared_timeout: int | None = None,
+    ):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.shared_timeout = shared_timeout
+
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, query: str, *, backend: str, model_name: str) -> str:
+        # Backends of one model (such as int8 ONNX) give slightly
+        # different vectors, so they must not share entries.
+        return f"{backend}:{model_name}:{normalize_query(query)}"
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            embedding = self._entries.get(key)
+
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._maybe_log()
+                return embedding
+
+        if self.shared:
+            data = cache.get(self._shared_key(key))
+
+            if data is not None:
+                embedding = np.frombuffer(data, dtype=np.float32)
+                self._store(key, embedding)
+
+                with self._lock:
+                    self.shared_hits += 1
+                    self._maybe_log()
+
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+            self._maybe_log()
+
+        return None
+
+    def put(self, key: str, embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+
+        self._store(key, embedding)
+
+        if self.shared:
+            cache.set(
+                self._shared_key(key),
+                embedding.tobytes(),
+                timeout=self.shared_timeout,
+            )
+
+        return embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (
+                    (self.hits + self.shared_hits) / lookups
+                    if lookups
+                    else 0.0
+                ),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _store(self, key: str, embedding: np.ndarray) -> None:
+        size = self._entry_size(key, embedding)
+
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+
+            if previous is not None:
+                self.nbytes -= self._entry_size(key, previous)
+
+            self._entries[key] = embedding
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes:
+                old_key, old_embedding = self._entries.popitem(last=False)
+                self.nbytes -= self._entry_size(old_key, old_embedding)
+                self.evictions += 1
+
+    def _entry_size(self, key: str, embedding: np.ndarray) -> int:
+        return sys.getsizeof(key) + embedding.nbytes
+
+    def _shared_key(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+        return f"query-embedding:{digest}"
+
+    def _maybe_log(self) -> None:
+        lookups = self.hits + self.shared_hits + self.misses
+
+        if lookups % LOG_EVERY == 0:
+            logger.info(
+                "Query embedding cache: %d entries, %.1f KB, "
+                "%d hits, %d shared hits, %d misses, %d evictions.",
+                len(self._entries),
+                self.nbytes / 1024,
+                self.hits,
+                self.shared_hits,
+                self.misses,
+                self.evictions,
+            )
+
+
+_query_cache: QueryEmbeddingCache | None = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    global _query_cache
+
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryEmbeddingCache(
+                    max_bytes=settings.QUERY_EMBEDDING_CACHE_MAX_BYTES,
+                    shared=settings.QUERY_EMBEDDING_CACHE_SHARED,
+                    shared_timeout=settings.QUERY_EMBEDDING_CACHE_TIMEOUT,
+                )
+
+    return _query_cache
@@ -9,4 +9,12 @@ class RecommendationCandidate:
     distance: float
     similarity: float
     score: float
-    debug: dict[str, float] = field(default_factory=dict)
\ No newline at end of file
+    genre_ids: set[int] = field(default_factory=set)
+    debug: dict[str, float] = field(default_factory=dict)
+
+@dataclass(slots=True)
+class BulkRecommendations:
+    # Recommendations for each source book, keyed by its id.
+    by_source: dict[int, list[RecommendationCandidate]]
+    # Every list merged, scored by the sum of a book's scores over sources.
+    combined: list[RecommendationCandidate]
@@ -5,15 +5,32 @@ Utilities for book recommendations using pgvector.
 from __future__ import annotations
 
 import logging
+from collections import defaultdict
+from collections.abc import Collection
 
-from pgvector.django import CosineDistance
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
 
 from library.models import Book
-from ai.models import BookEmbedding
-from ai.services.recommendation_candidate import RecommendationCandidate
+from ai.models import BookEmbedding, BookRecommendation
+from ai.services.diversity import maximal_marginal_relevance
+from ai.services.taste_profiles import get_taste_profile, not_owned_filter
+from ai.services.recommendation_candidate import (
+    BulkRecommendations,
+    RecommendationCandidate,
+)
+from ai.services.vectors.base import VectorMatch
+from ai.services.vectors.factory import get_vector_backend
 
 logger = logging.getLogger(__name__)
 
+# Nearest neighbours fetched before de-duplicating by author and series,
+# and the most fetched when widening for books whose neighbourhood is
+# dominated by a few authors or series.
+CANDIDATE_LIMIT = 100
+MAX_CANDIDATE_LIMIT = 800
+
 
 class RecommendationService:
     """Service responsible for book recommendations."""
@@ -26,6 +43,42 @@ class RecommendationService:
         """
         Return books that are semantically similar
         to the given book.
+
+        Served from the precomputed BookRecommendation rows when the
+        book has them and the job stored at least `limit` per book,
+        computed live otherwise.
+        """
+        if limit <= 0:
+            raise ValueError("Limit must be greater than zero.")
+
+        stored = list(
+            BookRecommendation.objects
+            .filter(book=book)
+            .select_related("recommended__author")
+            .order_by("rank")[:limit]
+        )
+
+        if stored and (
+            len(stored) == limit
+            or limit <= settings.RECOMMENDATIONS_PRECOMPUTED_LIMIT
+        ):
+            return [
+                recommendation.recommended
+                for recommendation in stored
+            ]
+
+        return [
+            candidate.book
+            for candidate in self.compute(book, limit=limit)
+        ]
+
+    def compute(
+        self,
+        book: Book,
+        limit: int = 8,
+    ) -> list[RecommendationCandidate]:
+        """
+        Compute recommendations for a book from its embedding.
         """
         if limit <= 0:
             raise ValueError("Limit must be greater than zero.")
@@ -46,17 +99,12 @@ class RecommendationService:
         candidates = self._retrieve_candidates(
             book,
             book_embedding.embedding,
-        )
-
-        logger.info(
-            "Retrieved %d candidates.",
-            len(candidates),
+            limit=limit,
         )
 
         recommendations = self._process_candidates(
-            book=book,
             candidates=candidates,
-            limit=limit,
+            source_genres=self._genre_ids([book.id]).get(book.id, set()),
         )
 
         logger.info(
@@ -65,161 +113,501 @@ class RecommendationService:
         )
 
         for candidate in recommendations:
-            print(
-                f"{candidate.book.title[:40]:40}"
-                f"{candidate.debug.get('similarity', 0):8.3f}"
-                f"{candidate.debug.get('shared_genres', 0):8}"
-                f"{candidate.debug.get('genre_bonus', 0):8.3f}"
-                f"{candidate.score:8.3f}"
+            logger.debug(
+                "%-40s %8.3f %8d %8.3f %8.3f",
+                candidate.book.title[:40],
+                candidate.debug.get("similarity", 0),
+                candidate.debug.get("shared_genres", 0),
+                candidate.debug.get("genre_bonus", 0),
+                candidate.score,
             )
 
-        return [
-            candidate.book
-            for candidate in recommendations
-        ]
+        return recommendations
+
+    def recommend_many(
+        self,
+        books: list[Book],
+        limit: int = 8,
+        exclude_book_ids: Collection[int] = (),
+    ) -> BulkRecommendations:
+        """
+        Compute recommendations for several books at once.
+
+        The source embeddings are loaded in one query and matched with one
+        vector backend call per source language, so the language filter
+        runs inside the vector query. The source books and
+        `exclude_book_ids`, such as the rest of a list, are never
+        recommended. Unlike `compute`, the neighbourhood is not widened,
+        so a list can still come up short on distinct authors and series.
+        """
+        if limit <= 0:
+            raise ValueError("Limit must be greater than zero.")
+
+        embedding_type = BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE
+
+        embeddings = dict(
+            BookEmbedding.objects
+            .filter(book__in=books, embedding_type=embedding_type)
+            .values_list("book_id", "embedding")
+        )
+
+        sources = [book for book in books if book.id in embeddings]
+
+        by_source: dict[int, list[RecommendationCandidate]] = {
+            book.id: []
+            for book in books
+        }
+
+        if not sources:
+            return BulkRecommendations(by_source=by_source, combined=[])
+
+        logger.info(
+            "Finding recommendations for %d books.",
+            len(sources),
+        )
+
+        sources_by_language: dict[str, list[Book]] = defaultdict(list)
+
+        for book in sources:
+            sources_by_language[book.language].append(book)
+
+        backend = get_vector_backend()
+        rankings: dict[int, list[VectorMatch]] = {}
+
+        for language_sources in sources_by_language.values():
+            rankings.update(
+                zip(
+                    [book.id for book in language_sources],
+                    backend.nearest_many(
+                        [embeddings[book.id] for book in language_sources],
+                        embedding_type=embedding_type,
+                        limit=max(CANDIDATE_LIMIT, limit),
+                        exclude_book_ids={*by_source, *exclude_book_ids},
+                        book_filter=self._candidate_filter(language_sources[0]),
+                        with_embeddings=True,
+                    ),
+                    strict=True,
+                )
+            )
+
+        authors_and_series = {
+            book_id: (author_id, series_id)
+            for book_id, author_id, series_id in (
+                Book.objects
+                .filter(
+                    id__in={
+                        match.book_id
+                        for matches in rankings.values()
+                        for match in matches
+                    }
+                )
+                .values_list("id", "author_id", "series_id")
+            )
+        }
+
+        survivors_by_source: dict[int, list[VectorMatch]] = {}
+
+        for source in sources:
+            seen_series, seen_authors = self._seen_sets(source)
+            survivors: list[VectorMatch] = []
+
+            self._select_distinct(
+                rankings[source.id],
+                authors_and_series,
+                survivors,
+                seen_series=seen_series,
+                seen_authors=seen_authors,
+            )
+
+            survivors_by_source[source.id] = self._diversify(survivors, limit)
+
+        book_ids = {
+            match.book_id
+            for survivors in survivors_by_source.values()
+            for match in survivors
+        }
+
+        books_by_id = Book.objects.select_related("author").in_bulk(book_ids)
+        genres_by_book = self._genre_ids([*book_ids, *by_source])
+
+        combined: dict[int, RecommendationCandidate] = {}
+
+        for source in sources:
+            candidates = self._process_candidates(
+                candidates=self._build_candidates(
+                    survivors_by_source[source.id],
+                    books_by_id,
+                    genres_by_book,
+                ),
+                source_genres=genres_by_book.get(source.id, set()),
+            )
+
+            by_source[source.id] = candidates
+
+            for candidate in candidates:
+                merged = combined.get(candidate.book.id)
+
+                if merged is None:
+                    combined[candidate.book.id] = RecommendationCandidate(
+                        book=candidate.book,
+                        distance=candidate.distance,
+                        similarity=candidate.similarity,
+                        score=candidate.score,
+                        genre_ids=candidate.genre_ids,
+                    )
+                    continue
+
+                merged.distance = min(merged.distance, candidate.distance)
+                merged.similarity = max(merged.similarity, candidate.similarity)
+                merged.score += candidate.score
+
+        return BulkRecommendations(
+            by_source=by_source,
+            combined=self._distinct_combined(
+                sorted(
+                    combined.values(),
+                    key=lambda candidate: candidate.score,
+                    reverse=True,
+                ),
+                limit=limit,
+            ),
+        )
+
+    def recommend_for_user(
+        self,
+        user_id: int,
+        limit: int = 8,
+    ) -> list[RecommendationCandidate]:
+        """
+        Recommend books matching a user's taste profile, leaving out every
+        book they already reviewed or listed. Neighbours are retrieved in
+        a single vector query.
+        """
+        if limit <= 0:
+            raise ValueError("Limit must be greater than zero.")
+
+        profile = get_taste_profile(user_id)
+        embedding = np.asarray(profile.embedding)
+
+        if not profile.weights or not np.any(embedding):
+            return []
+
+        matches = get_vector_backend().nearest(
+            embedding,
+            embedding_type=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+            limit=max(CANDIDATE_LIMIT, limit),
+            book_filter=Q(book__is_collection=False) & not_owned_filter(user_id),
+            with_embeddings=True,
+        )
+
+        authors_and_series = {
+            book_id: (author_id, series_id)
+            for book_id, author_id, series_id in (
+                Book.objects
+                .filter(id__in=[match.book_id for match in matches])
+                .values_list("id", "author_id", "series_id")
+            )
+        }
+
+        survivors: list[VectorMatch] = []
+
+        self._select_distinct(
+            matches,
+            authors_and_series,
+            survivors,
+            seen_series=set(),
+            seen_authors=set(),
+        )
+
+        survivors = self._diversify(survivors, limit)
+        book_ids = [match.book_id for match in survivors]
+
+        return self._build_candidates(
+            survivors,
+            Book.objects.select_related("author").in_bulk(book_ids),
+            self._genre_ids(book_ids),
+        )
+
+    def _distinct_combined(
+        self,
+        candidates: list[RecommendationCandidate],
+        limit: int,
+    ) -> list[RecommendationCandidate]:
+        """
+        Return the best `limit` candidates, at most one per author and
+        series.
+        """
+        seen_series: set[int] = set()
+        seen_authors: set[int] = set()
+        distinct = []
 
+        for candidate in candidates:
+            if self._same_series(candidate.book.series_id, seen_series):
+                continue
+
+            if self._has_seen_author(candidate.book.author_id, seen_authors):
+                continue
+
+            distinct.append(candidate)
+
+            if candidate.book.series_id is not None:
+                seen_series.add(candidate.book.series_id)
+
+            if candidate.book.author_id is not None:
+                seen_authors.add(candidate.book.author_id)
+
+            if len(distinct) == limit:
+                break
+
+        return distinct
 
     def _retrieve_candidates(
         self,
         book: Book,
         embedding: list[float],
-        candidate_limit: int = 100,
+        limit: int,
     ) -> list[RecommendationCandidate]:
         """
-        Retrieve the most semantically similar books.
+        Retrieve the most semantically similar books, at most one per
+        author and series.
+
+        Language and collection filters run in the vector query. When
+        too few neighbours survive the author and series de-duplication,
+        the neighbourhood is widened up to MAX_CANDIDATE_LIMIT. The
+        survivors are re-ranked for diversity and only the picked books
+        are loaded.
         """
-        embeddings = list(
-            BookEmbedding.objects
-            .filter(
+        backend = get_vector_backend()
+        book_filter = self._candidate_filter(book)
+        candidate_limit = max(CANDIDATE_LIMIT, limit)
+
+        seen_series, seen_authors = self._seen_sets(book)
+
+        checked: set[int] = set()
+        survivors: list[VectorMatch] = []
+
+        while True:
+            matches = backend.nearest(
+                embedding,
                 embedding_type=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+                limit=candidate_limit,
+                exclude_book_ids=[book.id],
+                book_filter=book_filter,
+                with_embeddings=True,
             )
-            .exclude(
-                book=book,
-            )
-            .select_related("book")
-            .annotate(
-                distance=CosineDistance(
-                    "embedding",
-                    embedding,
+
+            unchecked = [
+                match
+                for match in matches
+                if match.book_id not in checked
+            ]
+
+            authors_and_series = {
+                book_id: (author_id, series_id)
+                for book_id, author_id, series_id in (
+                    Book.objects
+                    .filter(id__in=[match.book_id for match in unchecked])
+                    .values_list("id", "author_id", "series_id")
                 )
+            }
+
+            checked.update(match.book_id for match in unchecked)
+
+            self._select_distinct(
+                unchecked,
+                authors_and_series,
+                survivors,
+                seen_series=seen_series,
+                seen_authors=seen_authors,
             )
-            .order_by("distance")[:candidate_limit]
-        )
-        candidates = []
 
-        for item in embeddings:
-            similarity = 1 - item.distance
+            logger.info(
+                "Retrieved %d candidates, %d kept.",
+                len(matches),
+                len(survivors),
+            )
 
-            candidate = RecommendationCandidate(
-                    book=item.book,
-                    distance=item.distance,
-                    similarity=similarity,
-                    score=similarity,
-                )
-            candidate.debug["similarity"] = similarity
-            candidates.append(candidate)
+            # A short result does not mean the neighbourhood is exhausted:
+            # on pgvector the filters run after the index scan, so a
+            # selective one can drop most of a window the index could
+            # still extend. Widening only stops at MAX_CANDIDATE_LIMIT.
+            if len(survivors) >= limit or candidate_limit >= MAX_CANDIDATE_LIMIT:
+                break
 
-        return candidates
+            candidate_limit = min(candidate_limit * 2, MAX_CANDIDATE_LIMIT)
 
-    def _process_candidates(
+        survivors = self._diversify(survivors, limit)
+        book_ids = [match.book_id for match in survivors]
+
+        books_by_id = Book.objects.select_related("author").in_bulk(book_ids)
+        genres_by_book = self._genre_ids(book_ids)
+
+        return self._build_candidates(survivors, books_by_id, genres_by_book)
+
+    def _diversify(
         self,
-        book: Book,
-        candidates: list[RecommendationCandidate],
+        matches: list[VectorMatch],
         limit: int,
-    ) -> list[RecommendationCandidate]:
+    ) -> list[VectorMatch]:
         """
-        Filter and rank recommendation candidates.
+        Pick `limit` matches by maximal marginal relevance, trading
+        similarity to the source for dissimilarity to earlier picks as
+        set by RECOMMENDATIONS_MMR_LAMBDA. Uses the embeddings returned
+        with the matches, so it costs no queries.
         """
-        recommendations: list[RecommendationCandidate] = []
+        lambda_ = settings.RECOMMENDATIONS_MMR_LAMBDA
+
+        if lambda_ >= 1 or len(matches) <= 1:
+            return matches[:limit]
+
+        order = maximal_marginal_relevance(
+            [match.embedding for match in matches],
+            [1 - match.distance for match in matches],
+            limit=limit,
+            lambda_=lambda_,
+        )
+
+        return [matches[index] for index in order]
 
+    def _seen_sets(
+        self,
+        book: Book,
+    ) -> tuple[set[int], set[int]]:
+        """
+        Return the series and authors a book's recommendations must not
+        repeat: its own.
+        """
         seen_series: set[int] = set()
         seen_authors: set[int] = set()
 
         if book.series_id is not None:
             seen_series.add(book.series_id)
-        if book.author.id is not None:
+        if book.author_id is not None:
             seen_authors.add(book.author_id)
 
-        source_genres = {
-            genre.id
-            for genre in book.genres.all()
-        }
+        return seen_series, seen_authors
 
-        for candidate in candidates:
-            if not self._same_language(book, candidate):
+    def _select_distinct(
+        self,
+        matches: list[VectorMatch],
+        authors_and_series: dict[int, tuple[int | None, int | None]],
+        survivors: list[VectorMatch],
+        *,
+        seen_series: set[int],
+        seen_authors: set[int],
+    ) -> None:
+        """
+        Append matches to `survivors` in order, skipping series and
+        authors already seen.
+        """
+        for match in matches:
+            if match.book_id not in authors_and_series:
                 continue
 
-            if self._is_collection(candidate.book):
-                continue
+            author_id, series_id = authors_and_series[match.book_id]
 
-            if self._same_series(candidate, seen_series):
+            if self._same_series(series_id, seen_series):
                 continue
 
-            if self._has_seen_author(candidate, seen_authors):
+            if self._has_seen_author(author_id, seen_authors):
                 continue
-            
-            recommendations.append(candidate)
 
-            if candidate.book.series_id is not None:
-                seen_series.add(candidate.book.series_id)
+            survivors.append(match)
 
-            if candidate.book.author_id is not None:
-                seen_authors.add(candidate.book.author_id)
+            if series_id is not None:
+                seen_series.add(series_id)
 
-            self._apply_genre_bonus(
-                source_genres,
-                candidate,
-            )
+            if author_id is not None:
+                seen_authors.add(author_id)
 
-            if len(recommendations) == limit:
-                break
+    def _build_candidates(
+        self,
+        matches: list[VectorMatch],
+        books_by_id: dict[int, Book],
+        genres_by_book: dict[int, set[int]],
+    ) -> list[RecommendationCandidate]:
+        candidates = []
 
+        for match in matches:
+            candidate_book = books_by_id.get(match.book_id)
 
-        return recommendations
-    
-    def _is_collection(
+            if candidate_book is None:
+                continue
+
+            similarity = 1 - match.distance
+
+            candidate = RecommendationCandidate(
+                    book=candidate_book,
+                    distance=match.distance,
+                    similarity=similarity,
+                    score=similarity,
+                    genre_ids=genres_by_book.get(match.book_id, set()),
+                )
+            candidate.debug["similarity"] = similarity
+            candidates.append(candidate)
+
+        return candidates
+
+    def _candidate_filter(
         self,
         book: Book,
-    ) -> bool:
+    ) -> Q:
         """
-        Return whether the book appears to be a collection,
-        omnibus, or boxed set.
+        Return the condition on BookEmbedding that candidates must meet:
+        not a collection, and in the source book's language when both
+        languages are known.
         """
-        title = book.title.lower()
+        book_filter = Q(book__is_collection=False)
 
-        keywords = (
-            "collection",
-            "boxed set",
-            "box set",
-            "omnibus",
-        )
+        if book.language:
+            book_filter &= Q(book__language=book.language) | Q(book__language="")
 
-        return any(keyword in title for keyword in keywords)
+        return book_filter
 
-    def _same_language(
-            self,
-            source: Book,
-            candidate: RecommendationCandidate,
-    ) -> bool:
+    def _genre_ids(
+        self,
+        book_ids: list[int],
+    ) -> dict[int, set[int]]:
         """
-        Return whether the candidate is written in the same language as the source book.
+        Return the genre ids of each book, read from the through table
+        in one query.
         """
-        if not source.language or not candidate.book.language:
-            return True
+        genres_by_book: dict[int, set[int]] = {}
+
+        for book_id, genre_id in (
+            Book.genres.through.objects
+            .filter(book_id__in=book_ids)
+            .values_list("book_id", "genre_id")
+        ):
+            genres_by_book.setdefault(book_id, set()).add(genre_id)
 
-        return source.language == candidate.book.language
+        return genres_by_book
+
+    def _process_candidates(
+        self,
+        candidates: list[RecommendationCandidate],
+        source_genres: set[int],
+    ) -> list[RecommendationCandidate]:
+        """
+        Score recommendation candidates.
+        """
+        for candidate in candidates:
+            self._apply_genre_bonus(
+                source_genres,
+                candidate,
+            )
+
+        return candidates
 
     def _same_series(
         self,
-        candidate: RecommendationCandidate,
+        series_id: int | None,
         seen_series: set[int],
     ) -> bool:
         """
         Return whether the candidate belongs to a series that has
         already been recommended.
         """
-        series_id = candidate.book.series_id
-
         if series_id is None:
             return False
 
@@ -227,15 +615,13 @@ class RecommendationService:
 
     def _has_seen_author(
         self,
-        candidate: RecommendationCandidate,
+        author_id: int | None,
         seen_authors: set[int],
     ) -> bool:
         """
         Return whether the candidate was written by an author that has
         already been recommended.
         """
-        author_id = candidate.book.author_id
-
         if author_id is None:
             return False
 
@@ -246,12 +632,7 @@ class RecommendationService:
         source_genres: set[int],
         candidate: RecommendationCandidate,
     ) -> None:
-        candidate_genres = {
-            genre.id
-            for genre in candidate.book.genres.all()
-        }
-
-        shared = source_genres & candidate_genres
+        shared = source_genres & candidate.genre_ids
 
         bonus = min(
             len(shared) * 0.01,
@@ -6,13 +6,12 @@ from __future__ import annotations
 
 import logging
 
-from pgvector.django import CosineDistance
-
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .embeddings import EmbeddingService
 from library.models import Book
 from ai.models import BookEmbedding
+from ai.services.vectors.factory import get_vector_backend
 
 logger = logging.getLogger(__name__)
 
@@ -38,9 +37,12 @@ class SemanticSearchService:
             BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE
         ),
         limit: int = 10,
+        ef_search: int | None = None,
     ) -> list[Book]:
         """
         Return the books most semantically similar to the query.
+
+        `ef_search` overrides VECTOR_HNSW_EF_SEARCH for this search.
         """
 
         if embedding_type not in BookEmbedding.EmbeddingType.values:
@@ -60,25 +62,27 @@ class SemanticSearchService:
 
         logger.info("Searching for similar books.")
 
-        embeddings = list(
-            BookEmbedding.objects.filter(
-                embedding_type=embedding_type,
-            )
-            .select_related("book")
-            .annotate(
-                distance=CosineDistance(
-                    "embedding",
-                    query_embedding,
-                )
-            )
-            .order_by("distance")[:limit]
+        matches = get_vector_backend().nearest(
+            query_embedding,
+            embedding_type=embedding_type,
+            limit=limit,
+            ef_search=ef_search,
+        )
+
+        books_by_id = Book.objects.select_related("author").in_bulk(
+            [match.book_id for match in matches]
         )
 
         books = []
 
-        for item in embeddings:
-            item.book.distance = item.distance
-            books.append(item.book)
+        for match in matches:
+            book = books_by_id.get(match.book_id)
+
+            if book is None:
+                continue
+
+            book.distance = match.distance
+            books.append(book)
 
         logger.info(
             "Found %d matching books.",
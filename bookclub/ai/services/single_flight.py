@@ -0,0 +1,55 @@
+"""
+In-process request coalescing.
+
+Concurrent calls with the same key share one execution: the first caller
+runs the function and the others block until its result is ready.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, function, *, timeout: float):
+        """
+        Return `function()`, or the result of the call already running
+        for `key`. A caller that waits longer than `timeout` seconds
+        stops waiting and calls `function` itself, and so does a caller
+        whose leader failed, so one failure is not shared by every waiter.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            try:
+                return future.result(timeout=timeout)
+            except TimeoutError:
+                logger.warning("Timed out waiting for in-flight call %s.", key)
+                return function()
+            except Exception:
+                logger.warning("In-flight call %s failed; retrying.", key)
+                return function()
+
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
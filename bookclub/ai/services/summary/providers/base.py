@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from collections.abc import Generator
+
 from ..result import SummaryResult
 
 class SummaryProvider(ABC):
@@ -10,4 +12,24 @@ class SummaryProvider(ABC):
         user_prompt: str,
     ) -> SummaryResult:
         """Generate a summary from the supplied prompts."""
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def stream(
+        self,
+        *,
+        system_prompt: str,
+        user_prompt: str,
+    ) -> Generator[str, None, SummaryResult]:
+        """
+        Yield the summary in text chunks as they are generated, then
+        return the complete result; use `result = yield from ...`.
+        Providers without streaming yield the whole text at once.
+        """
+        result = self.generate(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+        )
+
+        yield result.summary
+
+        return result
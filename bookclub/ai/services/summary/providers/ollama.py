@@ -1,3 +1,7 @@
+from collections.abc import Generator
+from contextlib import closing
+
+from django.conf import settings
 from ollama import Client, ResponseError
 
 from .base import SummaryProvider
@@ -22,7 +26,10 @@ class OllamaSummaryProvider(SummaryProvider):
         client: Client | None = None,
     ):
         self.model = model
-        self.client = client or Client(host=DEFAULT_HOST)
+        self.client = client or Client(
+            host=DEFAULT_HOST,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+        )
 
     def generate(
         self,
@@ -55,3 +62,54 @@ class OllamaSummaryProvider(SummaryProvider):
 
         except ResponseError as exc:
             raise RuntimeError(f"Ollama request failed: {exc}") from exc
+
+    def stream(
+        self,
+        *,
+        system_prompt: str,
+        user_prompt: str,
+    ) -> Generator[str, None, SummaryResult]:
+        chunks = []
+        last = None
+
+        try:
+            # chat() takes no per-call timeout; the client's timeout
+            # applies to every chunk read. Closing the response drops the
+            # connection when the caller stops reading.
+            with closing(self.client.chat(
+                model=self.model,
+                think=False,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_prompt,
+                    },
+                    {
+                        "role": "user",
+                        "content": user_prompt,
+                    },
+                ],
+                stream=True,
+            )) as response:
+                for last in response:
+                    if last.message.content:
+                        chunks.append(last.message.content)
+                        yield last.message.content
+
+        except ResponseError as exc:
+            raise RuntimeError(f"Ollama request failed: {exc}") from exc
+
+        # Token counts arrive on the final chunk.
+        prompt_tokens = last.prompt_eval_count if last else None
+        completion_tokens = last.eval_count if last else None
+
+        return SummaryResult(
+            summary="".join(chunks).strip(),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=(
+                prompt_tokens + completion_tokens
+                if prompt_tokens is not None and completion_tokens is not None
+                else None
+            ),
+        )
@@ -1,3 +1,5 @@
+from collections.abc import Generator
+
 from openai import OpenAI, OpenAIError
 from django.conf import settings
 
@@ -22,6 +24,7 @@ class OpenAISummaryProvider(SummaryProvider):
         self.model = model
         self.client = client or OpenAI(
             api_key=settings.OPENAI_API_KEY,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
         )
 
     def generate(
@@ -54,3 +57,53 @@ class OpenAISummaryProvider(SummaryProvider):
 
         except OpenAIError as exc:
             raise RuntimeError(f"OpenAI request failed: {exc}") from exc
+
+    def stream(
+        self,
+        *,
+        system_prompt: str,
+        user_prompt: str,
+    ) -> Generator[str, None, SummaryResult]:
+        chunks = []
+        usage = None
+
+        try:
+            # The timeout bounds the wait for every chunk, not just the
+            # first, so a stalled stream fails instead of hanging.
+            # Closing the stream drops the connection when the caller
+            # stops reading.
+            with self.client.responses.create(
+                model=self.model,
+                input=[
+                    {
+                        "role": "system",
+                        "content": system_prompt,
+                    },
+                    {
+                        "role": "user",
+                        "content": user_prompt,
+                    },
+                ],
+                stream=True,
+                timeout=settings.LLM_REQUEST_TIMEOUT,
+            ) as events:
+                for event in events:
+                    if event.type == "response.output_text.delta":
+                        chunks.append(event.delta)
+                        yield event.delta
+
+                    elif event.type == "response.completed":
+                        usage = event.response.usage
+
+                    elif event.type in ("response.failed", "error"):
+                        raise RuntimeError(f"OpenAI stream failed: {event}")
+
+        except OpenAIError as exc:
+            raise RuntimeError(f"OpenAI request failed: {exc}") from exc
+
+        return SummaryResult(
+            summary="".join(chunks).strip(),
+            prompt_tokens=usage.input_tokens if usage else None,
+            completion_tokens=usage.output_tokens if usage else None,
+            total_tokens=usage.total_tokens if usage else None,
+        )
@@ -0,0 +1,188 @@
+"""
+Taste profiles for personalised recommendations.
+
+A profile is the weighted sum of the embeddings of the books a user has
+reviewed or listed, stored on UserTasteProfile. When a review or list
+entry changes, only that book's term is adjusted, by the difference
+between its old and new weight. Profiles are rebuilt from scratch only
+when first used or when the stored embeddings change.
+"""
+
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from ai.models import BookEmbedding, UserTasteProfile
+from ai.services.vectors.versions import get_embeddings_version
+from library.models import ListBook, Review
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_TYPE = BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE
+
+# Weight of a book in the system "Favourites" list, and in any other list.
+FAVOURITE_WEIGHT = 1.0
+LISTED_WEIGHT = 0.5
+
+
+def rating_weight(rating: int) -> float:
+    """
+    Map a 1-5 star rating to a weight: 5 stars counts fully, 3 barely,
+    and 1-2 stars push the profile away from the book.
+    """
+    return (rating - 2.5) / 2.5
+
+
+def book_weights(user_id: int, book_ids=None) -> dict[int, float]:
+    """
+    Return the weight of every book a user reviewed or listed, or of
+    `book_ids` only. A review and the best list entry add up.
+    """
+    reviews = Review.objects.filter(user_id=user_id)
+    list_books = ListBook.objects.filter(book_list__user_id=user_id)
+
+    if book_ids is not None:
+        reviews = reviews.filter(book_id__in=book_ids)
+        list_books = list_books.filter(book_id__in=book_ids)
+
+    weights: dict[int, float] = {}
+
+    for book_id, rating in reviews.values_list("book_id", "rating"):
+        weights[book_id] = rating_weight(rating)
+
+    listed: dict[int, float] = {}
+
+    for book_id, list_name, is_system in list_books.values_list(
+        "book_id",
+        "book_list__name",
+        "book_list__is_system",
+    ):
+        weight = (
+            FAVOURITE_WEIGHT
+            if is_system and list_name == "Favourites"
+            else LISTED_WEIGHT
+        )
+        listed[book_id] = max(listed.get(book_id, 0.0), weight)
+
+    for book_id, weight in listed.items():
+        weights[book_id] = weights.get(book_id, 0.0) + weight
+
+    return weights
+
+
+def not_owned_filter(user_id: int) -> Q:
+    """
+    Return the condition on BookEmbedding that leaves out every book a
+    user reviewed or listed. It runs as subqueries in SQL, so it stays
+    cheap however many books the user has.
+    """
+    return (
+        ~Q(book__reviews__user_id=user_id)
+        & ~Q(book__in_lists__book_list__user_id=user_id)
+    )
+
+
+def get_taste_profile(user_id: int) -> UserTasteProfile:
+    """
+    Return a user's taste profile, building it if it is missing or was
+    built from older embeddings.
+    """
+    profile = UserTasteProfile.objects.filter(user_id=user_id).first()
+
+    if profile is not None and profile.embeddings_version == get_embeddings_version(EMBEDDING_TYPE):
+        return profile
+
+    return rebuild_taste_profile(user_id)
+
+
+def rebuild_taste_profile(user_id: int) -> UserTasteProfile:
+    version = get_embeddings_version(EMBEDDING_TYPE)
+    weights = book_weights(user_id)
+
+    embedding = np.zeros(settings.EMBEDDING_DIMENSIONS)
+    stored: dict[str, float] = {}
+
+    for book_id, book_embedding in (
+        BookEmbedding.objects
+        .filter(embedding_type=EMBEDDING_TYPE, book_id__in=weights)
+        .values_list("book_id", "embedding")
+    ):
+        weight = weights[book_id]
+
+        if not weight:
+            continue
+
+        embedding += weight * np.asarray(book_embedding)
+        stored[str(book_id)] = weight
+
+    profile, _ = UserTasteProfile.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            "embedding": embedding.tolist(),
+            "weights": stored,
+            "embeddings_version": version,
+        },
+    )
+
+    logger.info(
+        "Built taste profile for user %d from %d books.",
+        user_id,
+        len(stored),
+    )
+
+    return profile
+
+
+def update_taste_profile(user_id: int, book_id: int) -> None:
+    """
+    Apply a change to one of a user's reviews or list entries. Users
+    without a profile are skipped; theirs is built on first use.
+    """
+    with transaction.atomic():
+        profile = (
+            UserTasteProfile.objects
+            .select_for_update()
+            .filter(user_id=user_id)
+            .first()
+        )
+
+        if profile is None:
+            return
+
+        if profile.embeddings_version != get_embeddings_version(EMBEDDING_TYPE):
+            rebuild_taste_profile(user_id)
+            return
+
+        old_weight = profile.weights.get(str(book_id), 0.0)
+        new_weight = book_weights(user_id, [book_id]).get(book_id, 0.0)
+
+        if new_weight == old_weight:
+            return
+
+        book_embedding = (
+            BookEmbedding.objects
+            .filter(embedding_type=EMBEDDING_TYPE, book_id=book_id)
+            .values_list("embedding", flat=True)
+            .first()
+        )
+
+        if book_embedding is None:
+            # The book's term can't be subtracted without its embedding.
+            if old_weight:
+                rebuild_taste_profile(user_id)
+            return
+
+        profile.embedding = (
+            np.asarray(profile.embedding)
+            + (new_weight - old_weight) * np.asarray(book_embedding)
+        ).tolist()
+
+        if new_weight:
+            profile.weights[str(book_id)] = new_weight
+        else:
+            profile.weights.pop(str(book_id), None)
+
+        profile.save(update_fields=["embedding", "weights", "updated_at"])
@@ -0,0 +1,47 @@
+"""
+Query-time tuning for the pgvector HNSW indexes.
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# pgvector rejects larger hnsw.ef_search values.
+MAX_EF_SEARCH = 1000
+
+
+@contextmanager
+def hnsw_ef_search(ef_search: int | None = None, *, limit: int = 0):
+    """
+    Set hnsw.ef_search, the size of the candidate list an HNSW scan
+    keeps, for the queries run inside the block.
+
+    An index scan returns at most ef_search rows, so the value is raised
+    to `limit` when that is larger, up to MAX_EF_SEARCH. Higher values
+    trade latency for recall.
+
+    Filters on the query run after the index scan, so a selective one can
+    leave fewer than `limit` rows. With VECTOR_HNSW_ITERATIVE_SCAN set
+    (pgvector 0.8+), the scan keeps going until enough rows pass them.
+
+    The settings are transaction-local, so querysets must be evaluated
+    before the block exits.
+    """
+    if ef_search is None:
+        ef_search = settings.VECTOR_HNSW_EF_SEARCH
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('hnsw.ef_search', %s, true)",
+                [str(min(max(ef_search, limit), MAX_EF_SEARCH))],
+            )
+
+            if settings.VECTOR_HNSW_ITERATIVE_SCAN:
+                cursor.execute(
+                    "SELECT set_config('hnsw.iterative_scan', %s, true)",
+                    [settings.VECTOR_HNSW_ITERATIVE_SCAN],
+                )
+
+        yield
@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+from collections.abc import Collection, Sequence
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+
+@dataclass(slots=True)
+class VectorMatch:
+    book_id: int
+    # Cosine distance, 1 - cosine similarity.
+    distance: float
+    # The matched embedding, when requested with `with_embeddings`.
+    embedding: Sequence[float] | None = None
+
+
+class VectorBackend(ABC):
+    name: str
+
+    @abstractmethod
+    def nearest(
+        self,
+        embedding: Sequence[float],
+        *,
+        embedding_type: str,
+        limit: int,
+        exclude_book_ids: Collection[int] = (),
+        ef_search: int | None = None,
+        book_filter: Q | None = None,
+        with_embeddings: bool = False,
+    ) -> list[VectorMatch]:
+        """
+        Return the closest book embeddings of a type, nearest first.
+        `ef_search` tunes approximate backends and is ignored by exact ones.
+        `book_filter` is a condition on BookEmbedding, such as
+        Q(book__is_collection=False), that every match must satisfy.
+        `with_embeddings` also returns each match's embedding.
+        """
+        raise NotImplementedError
+
+    def nearest_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        *,
+        embedding_type: str,
+        limit: int,
+        exclude_book_ids: Collection[int] = (),
+        ef_search: int | None = None,
+        book_filter: Q | None = None,
+        with_embeddings: bool = False,
+    ) -> list[list[VectorMatch]]:
+        """
+        Return the nearest matches of each embedding, in input order.
+        Backends that can score several queries in one operation override
+        this; the default runs one query per embedding.
+        """
+        return [
+            self.nearest(
+                embedding,
+                embedding_type=embedding_type,
+                limit=limit,
+                exclude_book_ids=exclude_book_ids,
+                ef_search=ef_search,
+                book_filter=book_filter,
+                with_embeddings=with_embeddings,
+            )
+            for embedding in embeddings
+        ]
@@ -0,0 +1,29 @@
+from functools import cache
+
+from django.conf import settings
+
+from .base import VectorBackend
+
+
+def get_vector_backend(name: str | None = None) -> VectorBackend:
+    """
+    Return the process-wide vector backend, VECTOR_BACKEND by default.
+    """
+    return _get_backend(name or settings.VECTOR_BACKEND)
+
+
+@cache
+def _get_backend(name: str) -> VectorBackend:
+    match name:
+        case "pgvector":
+            from .pgvector import PgvectorBackend
+
+            return PgvectorBackend()
+
+        case "numpy":
+            from .numpy import NumpyBackend
+
+            return NumpyBackend()
+
+        case other:
+            raise ValueError(f"Unknown vector backend: {other}")
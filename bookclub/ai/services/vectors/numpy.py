@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+from collections.abc import Collection, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from ai.models import BookEmbedding
+
+from .base import VectorBackend, VectorMatch
+from .snapshots import get_current_snapshot, get_snapshot_root, read_current_id
+from .versions import get_embeddings_version
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class EmbeddingMatrix:
+    version: int
+    # Row i of `vectors` is the L2-normalised embedding of book_ids[i].
+    # Both are read-only memory maps when loaded from a snapshot.
+    book_ids: np.ndarray
+    vectors: np.ndarray
+    checked_at: float
+    snapshot_id: str | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.book_ids.nbytes + self.vectors.nbytes
+
+
+def load_matrix(embedding_type: str, version: int) -> EmbeddingMatrix:
+    queryset = BookEmbedding.objects.filter(embedding_type=embedding_type)
+    count = queryset.count()
+
+    book_ids = np.empty(count, dtype=np.int64)
+    vectors = np.empty((count, settings.EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+    rows = 0
+
+    for book_id, embedding in (
+        queryset.order_by("book_id")
+        .values_list("book_id", "embedding")
+        .iterator(chunk_size=2000)
+    ):
+        # Rows added since the count are picked up by the next refresh.
+        if rows == count:
+            break
+
+        book_ids[rows] = book_id
+        vectors[rows] = embedding
+        rows += 1
+
+    book_ids = book_ids[:rows]
+    vectors = vectors[:rows]
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    return EmbeddingMatrix(
+        version=version,
+        book_ids=book_ids,
+        vectors=np.ascontiguousarray(vectors),
+        checked_at=time.monotonic(),
+    )
+
+
+def load_snapshot_matrix(embedding_type: str, version: int) -> EmbeddingMatrix:
+    snapshot = get_current_snapshot(embedding_type)
+
+    # Until the first export finishes, serve a copy from the database.
+    if snapshot is None:
+        return load_matrix(embedding_type, version)
+
+    return EmbeddingMatrix(
+        version=snapshot.manifest["embeddings_version"],
+        book_ids=snapshot.book_ids,
+        vectors=snapshot.vectors,
+        checked_at=time.monotonic(),
+        snapshot_id=snapshot.id,
+    )
+
+
+def top_k(
+    matrix: EmbeddingMatrix,
+    embedding: Sequence[float],
+    *,
+    limit: int,
+    exclude_book_ids: Collection[int] = (),
+) -> list[VectorMatch]:
+    """
+    Exact cosine top-k with one matrix-vector product and a partial sort
+    of the scores.
+    """
+    return top_k_many(
+        matrix,
+        [embedding],
+        limit=limit,
+        exclude_book_ids=exclude_book_ids,
+    )[0]
+
+
+def top_k_many(
+    matrix: EmbeddingMatrix,
+    embeddings: Sequence[Sequence[float]],
+    *,
+    limit: int,
+    exclude_book_ids: Collection[int] = (),
+    with_embeddings: bool = False,
+) -> list[list[VectorMatch]]:
+    """
+    Exact cosine top-k of several queries at once: one matrix product
+    scores every row against every query, then each column is partially
+    sorted. `with_embeddings` attaches each match's normalised row.
+    """
+    queries = np.asarray(embeddings, dtype=np.float32).reshape(
+        len(embeddings), matrix.vectors.shape[1]
+    )
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = np.divide(queries, norms, out=queries.copy(), where=norms > 0)
+
+    scores = np.asarray(matrix.vectors @ queries.T)
+
+    if exclude_book_ids:
+        excluded = np.isin(matrix.book_ids, list(exclude_book_ids))
+        scores[excluded] = -np.inf
+
+    k = min(limit, len(scores))
+
+    if k <= 0:
+        return [[] for _ in range(len(queries))]
+
+    rows = np.argpartition(-scores, k - 1, axis=0)[:k]
+    order = np.argsort(-np.take_along_axis(scores, rows, axis=0), axis=0, kind="stable")
+    rows = np.take_along_axis(rows, order, axis=0)
+
+    return [
+        [
+            VectorMatch(
+                book_id=int(matrix.book_ids[row]),
+                distance=float(1.0 - scores[row, column]),
+                embedding=matrix.vectors[row] if with_embeddings else None,
+            )
+            for row in rows[:, column]
+            if scores[row, column] != -np.inf
+        ]
+        for column in range(len(queries))
+    ]
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact nearest neighbours over an in-process copy of the embeddings.
+
+    Each embedding type is loaded on first use and reloaded when the
+    shared embeddings version changes; the version is checked at most
+    every VECTOR_BACKEND_REFRESH_SECONDS. With VECTOR_SNAPSHOT_DIR set,
+    the matrix is memory-mapped from the current on-disk snapshot instead
+    of copied out of the database, so workers share it.
+    """
+
+    name = "numpy"
+
+    def __init__(self):
+        self._matrices: dict[str, EmbeddingMatrix] = {}
+        self._lock = threading.Lock()
+
+    def get_matrix(self, embedding_type: str) -> EmbeddingMatrix:
+        matrix = self._matrices.get(embedding_type)
+        interval = settings.VECTOR_BACKEND_REFRESH_SECONDS
+
+        if matrix is not None and time.monotonic() - matrix.checked_at < interval:
+            return matrix
+
+        with self._lock:
+            matrix = self._matrices.get(embedding_type)
+
+            if matrix is not None and time.monotonic() - matrix.checked_at < interval:
+                return matrix
+
+            version = get_embeddings_version(embedding_type)
+            snapshot_id = read_current_id(embedding_type)
+
+            if (
+                matrix is not None
+                and matrix.version == version
+                and matrix.snapshot_id == snapshot_id
+            ):
+                matrix.checked_at = time.monotonic()
+                return matrix
+
+            start = time.perf_counter()
+
+            if get_snapshot_root(embedding_type) is not None:
+                matrix = load_snapshot_matrix(embedding_type, version)
+            else:
+                matrix = load_matrix(embedding_type, version)
+
+            logger.info(
+                "Loaded %d %s embeddings (%.1f MB, %s) in %.2fs.",
+                len(matrix.book_ids),
+                embedding_type,
+                matrix.nbytes / 1024 / 1024,
+                f"snapshot {matrix.snapshot_id}" if matrix.snapshot_id else "database",
+                time.perf_counter() - start,
+            )
+
+            self._matrices[embedding_type] = matrix
+
+            return matrix
+
+    def nearest(
+        self,
+        embedding: Sequence[float],
+        *,
+        embedding_type: str,
+        limit: int,
+        exclude_book_ids: Collection[int] = (),
+        ef_search: int | None = None,
+        book_filter: Q | None = None,
+        with_embeddings: bool = False,
+    ) -> list[VectorMatch]:
+        return self.nearest_many(
+            [embedding],
+            embedding_type=embedding_type,
+            limit=limit,
+            exclude_book_ids=exclude_book_ids,
+            book_filter=book_filter,
+            with_embeddings=with_embeddings,
+        )[0]
+
+    def nearest_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        *,
+        embedding_type: str,
+        limit: int,
+        exclude_book_ids: Collection[int] = (),
+        ef_search: int | None = None,
+        book_filter: Q | None = None,
+        with_embeddings: bool = False,
+    ) -> list[list[VectorMatch]]:
+        matrix = self.get_matrix(embedding_type)
+
+        if book_filter is None:
+            return top_k_many(
+                matrix,
+                embeddings,
+                limit=limit,
+                exclude_book_ids=exclude_book_ids,
+                with_embeddings=with_embeddings,
+            )
+
+        # The filter is evaluated in the database, so rank a window of
+        # nearest rows, keep those that pass, and widen the window until
+        # enough do for every query or the matrix is exhausted.
+        window = limit
+        checked: set[int] = set()
+        allowed: set[int] = set()
+
+        while True:
+            rankings = top_k_many(
+                matrix,
+                embeddings,
+                limit=window,
+                exclude_book_ids=exclude_book_ids,
+                with_embeddings=with_embeddings,
+            )
+
+            unchecked = {
+                match.book_id
+                for matches in rankings
+                for match in matches
+            } - checked
+
+            allowed.update(
+                BookEmbedding.objects
+                .filter(book_filter, embedding_type=embedding_type)
+                .filter(book_id__in=unchecked)
+                .values_list("book_id", flat=True)
+            )
+            checked.update(unchecked)
+
+            kept = [
+                [match for match in matches if match.book_id in allowed]
+                for matches in rankings
+            ]
+
+            if all(
+                len(matches) >= limit or len(ranking) < window
+                for matches, ranking in zip(kept, rankings, strict=True)
+            ):
+                return [matches[:limit] for matches in kept]
+
+            window *= 4
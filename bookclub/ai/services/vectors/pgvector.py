@@ -0,0 +1,141 @@
+from collections.abc import Collection, Sequence
+
+import numpy as np
+from django.db import connection
+from django.db.models import Q
+from pgvector.django import CosineDistance
+
+from ai.models import BookEmbedding
+from ai.services.vector_index import hnsw_ef_search
+
+from .base import VectorBackend, VectorMatch
+
+
+class PgvectorBackend(VectorBackend):
+    """Nearest neighbours from the HNSW indexes in Postgres."""
+
+    name = "pgvector"
+
+    def nearest(
+        self,
+        embedding: Sequence[float],
+        *,
+        embedding_type: str,
+        limit: int,
+        exclude_book_ids: Collection[int] = (),
+        ef_search: int | None = None,
+        book_filter: Q | None = None,
+        with_embeddings: bool = False,
+    ) -> list[VectorMatch]:
+        queryset = BookEmbedding.objects.filter(embedding_type=embedding_type)
+
+        if book_filter is not None:
+            queryset = queryset.filter(book_filter)
+
+        fields = ["book_id", "distance"]
+
+        if with_embeddings:
+            fields.append("embedding")
+
+        # Excluded and filtered rows still take up slots in the index
+        # scan, so the scan is widened by the exclusions, up to
+        # MAX_EF_SEARCH. Past that, an iterative scan keeps going until
+        # `limit` rows pass; without one (pgvector < 0.8) a selective
+        # filter or a long exclusion list can return fewer.
+        with hnsw_ef_search(ef_search, limit=limit + len(exclude_book_ids)):
+            rows = list(
+                queryset
+                .exclude(book_id__in=exclude_book_ids)
+                .annotate(distance=CosineDistance("embedding", embedding))
+                .order_by("distance")
+                .values_list(*fields)[:limit]
+            )
+
+        return [VectorMatch(*row) for row in rows]
+
+    def nearest_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        *,
+        embedding_type: str,
+        limit: int,
+        exclude_book_ids: Collection[int] = (),
+        ef_search: int | None = None,
+        book_filter: Q | None = None,
+        with_embeddings: bool = False,
+    ) -> list[list[VectorMatch]]:
+        """
+        Scan the index once per embedding, all in one statement through
+        a lateral join.
+        """
+        if not embeddings:
+            return []
+
+        table = BookEmbedding._meta.db_table
+
+        conditions = ["candidate.embedding_type = %s"]
+        params = [embedding_type]
+
+        if exclude_book_ids:
+            conditions.append("candidate.book_id <> ALL(%s)")
+            params.append(list(exclude_book_ids))
+
+        if book_filter is not None:
+            allowed_sql, allowed_params = (
+                BookEmbedding.objects
+                .filter(book_filter, embedding_type=embedding_type)
+                .values("id")
+                .query.sql_with_params()
+            )
+            conditions.append(f"candidate.id IN ({allowed_sql})")
+            params.extend(allowed_params)
+
+        sql = f"""
+            WITH queries AS (
+                SELECT position, embedding::vector AS embedding
+                FROM unnest(%s::text[]) WITH ORDINALITY AS query(embedding, position)
+            )
+            SELECT
+                queries.position,
+                neighbour.book_id,
+                neighbour.distance{", neighbour.embedding::text" if with_embeddings else ""}
+            FROM queries
+            CROSS JOIN LATERAL (
+                SELECT
+                    candidate.book_id,
+                    candidate.embedding,
+                    candidate.embedding <=> queries.embedding AS distance
+                FROM {table} AS candidate
+                WHERE {" AND ".join(conditions)}
+                ORDER BY candidate.embedding <=> queries.embedding
+                LIMIT %s
+            ) AS neighbour
+            ORDER BY queries.position, neighbour.distance
+        """
+
+        literals = [
+            "[" + ",".join(map(str, np.asarray(embedding, dtype=np.float32).tolist())) + "]"
+            for embedding in embeddings
+        ]
+
+        results: list[list[VectorMatch]] = [[] for _ in embeddings]
+
+        # As in `nearest`, the widening for exclusions stops at MAX_EF_SEARCH.
+        with hnsw_ef_search(ef_search, limit=limit + len(exclude_book_ids)):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [literals, *params, limit])
+
+                for position, book_id, distance, *embedding in cursor.fetchall():
+                    results[position - 1].append(
+                        VectorMatch(
+                            book_id=book_id,
+                            distance=distance,
+                            embedding=(
+                                np.array(embedding[0][1:-1].split(","), dtype=np.float32)
+                                if embedding
+                                else None
+                            ),
+                        )
+                    )
+
+        return results
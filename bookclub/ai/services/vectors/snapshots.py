@@ -0,0 +1,356 @@
+"""
+On-disk snapshots of the embedding matrix, shared by memory-mapping.
+
+Each embedding type has a directory of immutable snapshots and a
+CURRENT file naming the live one:
+
+    <VECTOR_SNAPSHOT_DIR>/<embedding_type>/
+        CURRENT
+        <snapshot_id>/vectors.f32     raw row-major float32, L2-normalised
+        <snapshot_id>/book_ids.npy    int64 book id of each row
+        <snapshot_id>/manifest.json   model name, row count, dimensions
+
+Workers map vectors.f32 read-only, so every process on the host shares
+one copy in the page cache. Exports write a new snapshot directory and
+then replace CURRENT atomically; workers notice the new id on their next
+refresh check, and already-mapped old snapshots stay readable until they
+are dropped.
+
+A worker that finds no snapshot, or one older than the shared
+embeddings version, exports a new one on a background thread under a
+file lock, and keeps serving what it has meanwhile; requests never wait
+for an export. Every file is fsynced before CURRENT names it, so a crash
+cannot leave CURRENT pointing at a partly written snapshot.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from ai.models import BookEmbedding
+
+from .versions import get_embeddings_version
+
+logger = logging.getLogger(__name__)
+
+POINTER_NAME = "CURRENT"
+LOCK_NAME = ".export.lock"
+VECTORS_NAME = "vectors.f32"
+BOOK_IDS_NAME = "book_ids.npy"
+MANIFEST_NAME = "manifest.json"
+
+
+@dataclass(slots=True)
+class Snapshot:
+    id: str
+    manifest: dict
+    book_ids: np.ndarray
+    vectors: np.ndarray
+
+
+def get_snapshot_root(embedding_type: str) -> Path | None:
+    if not settings.VECTOR_SNAPSHOT_DIR:
+        return None
+
+    return Path(settings.VECTOR_SNAPSHOT_DIR) / embedding_type
+
+
+def read_current_id(embedding_type: str) -> str | None:
+    root = get_snapshot_root(embedding_type)
+
+    if root is None:
+        return None
+
+    try:
+        return (root / POINTER_NAME).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_snapshot(embedding_type: str, snapshot_id: str) -> Snapshot:
+    path = get_snapshot_root(embedding_type) / snapshot_id
+
+    with (path / MANIFEST_NAME).open("r", encoding="utf-8") as file:
+        manifest = json.load(file)
+
+    book_ids = np.load(path / BOOK_IDS_NAME, mmap_mode="r")
+
+    if manifest["rows"]:
+        vectors = np.memmap(
+            path / VECTORS_NAME,
+            dtype=np.float32,
+            mode="r",
+            shape=(manifest["rows"], manifest["dimensions"]),
+        )
+    else:
+        # A zero-length file cannot be mapped.
+        vectors = np.empty((0, manifest["dimensions"]), dtype=np.float32)
+
+    return Snapshot(
+        id=snapshot_id,
+        manifest=manifest,
+        book_ids=book_ids,
+        vectors=vectors,
+    )
+
+
+def get_current_snapshot(embedding_type: str) -> Snapshot | None:
+    """
+    Return the current snapshot of a type, or None if there is none yet.
+    If it is missing or older than the stored embeddings, a new one is
+    exported in the background and picked up on a later refresh.
+    """
+    snapshot = _open_current(embedding_type)
+
+    if (
+        snapshot is None
+        or snapshot.manifest["embeddings_version"] != get_embeddings_version(embedding_type)
+    ):
+        schedule_export(embedding_type)
+
+    return snapshot
+
+
+_exporting: set[str] = set()
+_exporting_lock = threading.Lock()
+
+
+def _export_in_background(embedding_type: str) -> None:
+    try:
+        # Another process already exporting will publish the same data.
+        with export_lock(embedding_type, blocking=False) as acquired:
+            if not acquired:
+                return
+
+            version = get_embeddings_version(embedding_type)
+            snapshot = _open_current(embedding_type)
+
+            if snapshot is not None and snapshot.manifest["embeddings_version"] == version:
+                return
+
+            export_snapshot(embedding_type, embeddings_version=version)
+            prune_snapshots(embedding_type, keep=settings.VECTOR_SNAPSHOT_KEEP)
+    except Exception:
+        logger.exception("Failed to export %s embeddings snapshot.", embedding_type)
+    finally:
+        with _exporting_lock:
+            _exporting.discard(embedding_type)
+
+        connection.close()
+
+
+def schedule_export(embedding_type: str) -> None:
+    """
+    Start a background export of a type unless this process is already
+    running one.
+    """
+    with _exporting_lock:
+        if embedding_type in _exporting:
+            return
+
+        _exporting.add(embedding_type)
+
+    threading.Thread(
+        target=_export_in_background,
+        args=(embedding_type,),
+        name=f"export-{embedding_type}-snapshot",
+        daemon=True,
+    ).start()
+
+
+def export_snapshot(
+    embedding_type: str,
+    *,
+    embeddings_version: int | None = None,
+    chunk_size: int = 2000,
+) -> Snapshot:
+    """
+    Write the stored embeddings of a type to a new snapshot and make it
+    the current one.
+    """
+    if embeddings_version is None:
+        embeddings_version = get_embeddings_version(embedding_type)
+
+    root = get_snapshot_root(embedding_type)
+
+    if root is None:
+        raise ValueError("VECTOR_SNAPSHOT_DIR is not configured.")
+
+    root.mkdir(parents=True, exist_ok=True)
+
+    created_at = datetime.now(UTC)
+    snapshot_id = created_at.strftime("%Y%m%d_%H%M%S_%f")
+    path = root / snapshot_id
+    path.mkdir()
+
+    dimensions = settings.EMBEDDING_DIMENSIONS
+    book_ids = []
+    model_names = set()
+
+    rows = (
+        BookEmbedding.objects.filter(embedding_type=embedding_type)
+        .order_by("book_id")
+        .values_list("book_id", "model_name", "embedding")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    with (path / VECTORS_NAME).open("wb") as file:
+        chunk = []
+
+        for book_id, model_name, embedding in rows:
+            book_ids.append(book_id)
+            model_names.add(model_name)
+            chunk.append(embedding)
+
+            if len(chunk) == chunk_size:
+                _write_rows(file, chunk)
+                chunk = []
+
+        if chunk:
+            _write_rows(file, chunk)
+
+        file.flush()
+        os.fsync(file.fileno())
+
+    with (path / BOOK_IDS_NAME).open("wb") as file:
+        np.save(file, np.array(book_ids, dtype=np.int64))
+        file.flush()
+        os.fsync(file.fileno())
+
+    manifest = {
+        "embedding_type": embedding_type,
+        "model_name": ", ".join(sorted(model_names)),
+        "rows": len(book_ids),
+        "dimensions": dimensions,
+        "dtype": "float32",
+        "normalized": True,
+        "embeddings_version": embeddings_version,
+        "created_at": created_at.isoformat(),
+    }
+
+    with (path / MANIFEST_NAME).open("w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+
+    # Persist the directory entries of the new files before CURRENT can
+    # name the snapshot.
+    _fsync_directory(path)
+    _replace_pointer(root, snapshot_id)
+
+    return open_snapshot(embedding_type, snapshot_id)
+
+
+def prune_snapshots(embedding_type: str, keep: int) -> list[str]:
+    """
+    Delete all but the newest `keep` snapshots, never the current one.
+    Workers still mapping a deleted snapshot keep reading it until they
+    switch, since the files stay alive while mapped.
+
+    Directories without a manifest are left over from interrupted
+    exports; they do not count towards `keep` and are removed. Must be
+    called under export_lock() so an export in progress is not mistaken
+    for one.
+    """
+    root = get_snapshot_root(embedding_type)
+    current = read_current_id(embedding_type)
+
+    snapshot_ids = []
+    removed = []
+
+    for path in root.iterdir():
+        if not path.is_dir():
+            continue
+
+        if (path / MANIFEST_NAME).is_file():
+            snapshot_ids.append(path.name)
+        elif path.name != current:
+            shutil.rmtree(path)
+            removed.append(path.name)
+
+    snapshot_ids.sort(reverse=True)
+
+    for snapshot_id in snapshot_ids[keep:]:
+        if snapshot_id == current:
+            continue
+
+        shutil.rmtree(root / snapshot_id)
+        removed.append(snapshot_id)
+
+    return removed
+
+
+def _open_current(embedding_type: str) -> Snapshot | None:
+    snapshot_id = read_current_id(embedding_type)
+
+    if snapshot_id is None:
+        return None
+
+    return open_snapshot(embedding_type, snapshot_id)
+
+
+@contextmanager
+def export_lock(embedding_type: str, *, blocking: bool):
+    """
+    Hold an exclusive lock on a type's snapshot directory, shared across
+    processes. Yields whether the lock was acquired. Exports and prunes
+    run under it.
+    """
+    root = get_snapshot_root(embedding_type)
+    root.mkdir(parents=True, exist_ok=True)
+
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+
+    with (root / LOCK_NAME).open("a") as file:
+        try:
+            fcntl.flock(file, flags)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _write_rows(file, chunk) -> None:
+    vectors = np.asarray(chunk, dtype=np.float32)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    file.write(np.ascontiguousarray(vectors).tobytes())
+
+
+def _replace_pointer(root: Path, snapshot_id: str) -> None:
+    descriptor, temporary = tempfile.mkstemp(dir=root, prefix=".current-")
+
+    with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+        file.write(snapshot_id)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temporary, root / POINTER_NAME)
+    _fsync_directory(root)
+
+
+def _fsync_directory(path: Path) -> None:
+    descriptor = os.open(path, os.O_RDONLY)
+
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
@@ -0,0 +1,35 @@
+"""
+Shared version counters for the stored embeddings of each type.
+
+In-process vector backends compare the version they loaded with the
+current one to notice that embeddings were written elsewhere.
+"""
+
+import time
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+# Counters must be visible to every process on every host.
+cache = ConnectionProxy(caches, "shared")
+
+
+def _key(embedding_type: str) -> str:
+    return f"vectors:version:{embedding_type}"
+
+
+def get_embeddings_version(embedding_type: str) -> int:
+    version = cache.get(_key(embedding_type))
+
+    if version is None:
+        cache.add(_key(embedding_type), time.time_ns(), timeout=None)
+        version = cache.get(_key(embedding_type))
+
+    return version
+
+
+def embeddings_changed(embedding_type: str) -> None:
+    try:
+        cache.incr(_key(embedding_type))
+    except ValueError:
+        cache.set(_key(embedding_type), time.time_ns(), timeout=None)
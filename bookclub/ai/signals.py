@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from library.models import ListBook, Review
+
+from .services.taste_profiles import update_taste_profile
+
+
+def _schedule_update(user_id: int, book_id: int) -> None:
+    transaction.on_commit(lambda: update_taste_profile(user_id, book_id))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def update_taste_profile_on_review_change(sender, instance, **kwargs):
+    _schedule_update(instance.user_id, instance.book_id)
+
+
+@receiver(post_save, sender=ListBook)
+@receiver(post_delete, sender=ListBook)
+def update_taste_profile_on_list_change(sender, instance, **kwargs):
+    _schedule_update(instance.book_list.user_id, instance.book_id)
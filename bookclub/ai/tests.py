@@ -1,3 +1,1133 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ai.models import (
+    BookEmbedding,
+    BookRecommendation,
+    RecommendationExplanation,
+    UserTasteProfile,
+)
+from ai.services.diversity import maximal_marginal_relevance
+from ai.services.embeddings import EmbeddingService
+from ai.prompts.recommendation import PROMPT_VERSION
+from ai.services.explanation_batch import (
+    CUSTOM_ID_PATTERN,
+    ExplanationBatchImporter,
+    FailedRequest,
+    build_custom_id,
+)
+from ai.services.explanations import ExplanationService, explanation_input_hash
+from ai.services.recommendations import CANDIDATE_LIMIT, RecommendationService
+from ai.services.query_cache import QueryEmbeddingCache
+from ai.services.single_flight import SingleFlight
+from ai.services.vector_index import MAX_EF_SEARCH, hnsw_ef_search
+from ai.services.vectors.pgvector import PgvectorBackend
+from ai.services.summary.providers.base import SummaryProvider
+from ai.services.summary.result import SummaryResult
+from ai.services.taste_profiles import get_taste_profile, rebuild_taste_profile
+from ai.services.vectors.numpy import EmbeddingMatrix, top_k, top_k_many
+from ai.services.vectors.snapshots import (
+    MANIFEST_NAME,
+    export_snapshot,
+    get_current_snapshot,
+    prune_snapshots,
+)
+from ai.services.vectors.versions import embeddings_changed
+from library.models import Author, Book, Genre, List, ListBook, Review, User
+
+
+class NumpyTopKTests(SimpleTestCase):
+    def setUp(self):
+        vectors = np.array(
+            [[1, 0], [0.8, 0.6], [0, 1], [-1, 0]],
+            dtype=np.float32,
+        )
+
+        self.matrix = EmbeddingMatrix(
+            version=1,
+            book_ids=np.array([10, 11, 12, 13]),
+            vectors=vectors,
+            checked_at=0.0,
+        )
+
+    def test_returns_nearest_first_with_cosine_distance(self):
+        matches = top_k(self.matrix, [2, 0], limit=3)
+
+        self.assertEqual([match.book_id for match in matches], [10, 11, 12])
+        self.assertAlmostEqual(matches[0].distance, 0.0, places=6)
+        self.assertAlmostEqual(matches[1].distance, 0.2, places=6)
+
+    def test_skips_excluded_books(self):
+        matches = top_k(self.matrix, [1, 0], limit=2, exclude_book_ids={10})
+
+        self.assertEqual([match.book_id for match in matches], [11, 12])
+
+    def test_limit_larger_than_matrix(self):
+        matches = top_k(self.matrix, [1, 0], limit=10, exclude_book_ids={13})
+
+        self.assertEqual(len(matches), 3)
+
+    def test_many_queries_match_single_queries(self):
+        queries = [[2, 0], [0.1, 1]]
+
+        rankings = top_k_many(self.matrix, queries, limit=2, exclude_book_ids={11})
+
+        self.assertEqual(
+            [[match.book_id for match in matches] for matches in rankings],
+            [[10, 12], [12, 10]],
+        )
+        self.assertEqual(
+            [match.book_id for match in rankings[1]],
+            [match.book_id for match in top_k(self.matrix, [0.1, 1], limit=2, exclude_book_ids={11})],
+        )
+
+
+class MaximalMarginalRelevanceTests(SimpleTestCase):
+    # Two near-duplicates and a distinct, slightly less relevant book.
+    embeddings = [[1, 0], [0.99, 0.14], [0, 1]]
+    relevance = [0.9, 0.89, 0.8]
+
+    def test_lambda_one_keeps_relevance_order(self):
+        order = maximal_marginal_relevance(
+            self.embeddings,
+            self.relevance,
+            limit=3,
+            lambda_=1.0,
+        )
+
+        self.assertEqual(order, [0, 1, 2])
+
+    def test_prefers_distinct_candidate_over_near_duplicate(self):
+        order = maximal_marginal_relevance(
+            self.embeddings,
+            self.relevance,
+            limit=2,
+            lambda_=0.7,
+        )
+
+        self.assertEqual(order, [0, 2])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def run_concurrently(self, flight, function, *, callers, timeout):
+        results = []
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    flight.do("key", function, timeout=timeout)
+                )
+            )
+            for _ in range(callers)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        return threads, results
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def generate():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        threads, results = self.run_concurrently(flight, generate, callers=4, timeout=5)
+
+        # Give every caller time to join the in-flight call.
+        time.sleep(0.2)
+        release.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 4)
+
+    def test_waiter_falls_back_after_timeout(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def generate():
+            calls.append(1)
+
+            if len(calls) == 1:
+                release.wait(5)
+
+            return len(calls)
+
+        threads, results = self.run_concurrently(flight, generate, callers=1, timeout=5)
+
+        while not calls:
+            time.sleep(0.01)
+
+        self.assertEqual(flight.do("key", generate, timeout=0.01), 2)
+
+        release.set()
+        threads[0].join()
+
+        self.assertEqual(len(calls), 2)
+
+    def test_waiters_retry_when_the_leader_fails(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def generate():
+            calls.append(1)
+
+            if len(calls) == 1:
+                release.wait(5)
+                raise RuntimeError("provider failed")
+
+            return "result"
+
+        leader_errors = []
+
+        def lead():
+            try:
+                flight.do("key", generate, timeout=5)
+            except RuntimeError as exc:
+                leader_errors.append(exc)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+
+        while not calls:
+            time.sleep(0.01)
+
+        waiters, results = self.run_concurrently(flight, generate, callers=2, timeout=5)
+
+        # Give the waiters time to join the in-flight call.
+        time.sleep(0.2)
+        release.set()
+
+        leader.join()
+
+        for thread in waiters:
+            thread.join()
+
+        self.assertEqual(len(leader_errors), 1)
+        self.assertEqual(results, ["result"] * 2)
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = QueryEmbeddingCache(max_bytes=0)
+        entry_size = self.cache._entry_size("model:aa", np.zeros(4, np.float32))
+        self.cache.max_bytes = 2 * entry_size
+
+    def test_keys_on_normalised_query_backend_and_model(self):
+        def key(query, backend="onnx", model_name="bge"):
+            return self.cache.make_key(query, backend=backend, model_name=model_name)
+
+        self.assertEqual(key("  Dune   Messiah "), key("dune messiah"))
+        self.assertNotEqual(key("dune"), key("dune", model_name="other"))
+        self.assertNotEqual(key("dune"), key("dune", backend="onnx_int8"))
+
+    def test_evicts_least_recently_used_within_byte_bound(self):
+        for key in ("model:aa", "model:bb"):
+            self.cache.put(key, [1, 2, 3, 4])
+
+        self.cache.get("model:aa")
+        self.cache.put("model:cc", [1, 2, 3, 4])
+
+        self.assertIsNone(self.cache.get("model:bb"))
+        self.assertEqual(self.cache.get("model:aa").dtype, np.float32)
+
+        stats = self.cache.stats()
+
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertLessEqual(stats["bytes"], stats["max_bytes"])
+
+
+class EmbeddingModelLoadTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(setattr, EmbeddingService, "_model", EmbeddingService._model)
+        EmbeddingService._model = None
+
+    def test_concurrent_first_use_loads_the_model_once(self):
+        def slow_load():
+            time.sleep(0.1)
+            return object()
+
+        # Skip __init__, which would load the model up front.
+        service = object.__new__(EmbeddingService)
+
+        with mock.patch("ai.services.embeddings.load_model", side_effect=slow_load) as load:
+            threads = [
+                threading.Thread(target=service._load_model)
+                for _ in range(4)
+            ]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(load.call_count, 1)
+
+
+def create_embedded_book(index, embedding, *, author=None, **fields) -> Book:
+    """
+    Create a book with a summary_no_title embedding, by its own author
+    unless one is given.
+    """
+    fields.setdefault("title", f"Book {index}")
+
+    book = Book.objects.create(
+        source="test",
+        source_row_id=str(index),
+        author=author or Author.objects.create(name=f"Author {index}"),
+        **fields,
+    )
+
+    BookEmbedding.objects.create(
+        book=book,
+        embedding_type=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+        model_name="test",
+        embedding=np.asarray(embedding).tolist(),
+    )
+
+    return book
+
+
+@override_settings(VECTOR_BACKEND="pgvector")
+class RecommendationQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        genres = [
+            Genre.objects.create(name=name)
+            for name in ("Fantasy", "Science Fiction", "Mystery")
+        ]
+
+        rng = np.random.default_rng(0)
+        base = rng.normal(size=384)
+
+        cls.books = []
+
+        for index in range(12):
+            book = create_embedded_book(index, base + rng.normal(scale=0.1, size=384))
+            book.genres.set(genres[: index % 3 + 1])
+
+            cls.books.append(book)
+
+    def count_queries(self, limit):
+        book = Book.objects.get(pk=self.books[0].pk)
+
+        with CaptureQueriesContext(connection) as context:
+            recommendations = RecommendationService().recommend(book, limit=limit)
+
+        self.assertEqual(len(recommendations), limit)
+
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_limit(self):
+        self.assertEqual(self.count_queries(1), self.count_queries(8))
+
+    def test_genre_bonus_uses_bulk_genre_lookup(self):
+        book = Book.objects.get(pk=self.books[0].pk)
+
+        with CaptureQueriesContext(connection) as context:
+            RecommendationService().recommend(book, limit=8)
+
+        genre_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if "library_book_genres" in query["sql"]
+        ]
+
+        # One for the candidates and one for the source book.
+        self.assertEqual(len(genre_queries), 2)
+
+
+@override_settings(VECTOR_BACKEND="pgvector")
+class RecommendationFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(1)
+        base = rng.normal(size=384)
+
+        prolific = Author.objects.create(name="Prolific")
+
+        def create(index, *, scale=0.1, **fields):
+            return create_embedded_book(
+                index,
+                base + rng.normal(scale=scale, size=384),
+                **fields,
+            )
+
+        cls.source = create(0, title="Source", language="English")
+
+        # The nearest neighbours all share one author, so the first
+        # candidate window yields a single survivor.
+        for index in range(1, 121):
+            create(index, author=prolific, title=f"Prolific {index}", scale=0.01)
+
+        cls.collection = create(200, title="Short Story Collection", language="English")
+        cls.french = create(201, title="Roman", language="French")
+        cls.others = [
+            create(index, title=f"Other {index}", scale=0.5)
+            for index in range(300, 303)
+        ]
+
+    def test_widens_past_a_prolific_author_and_applies_filters(self):
+        recommendations = RecommendationService().compute(self.source, limit=4)
+
+        ids = {candidate.book.id for candidate in recommendations}
+
+        self.assertEqual(len(recommendations), 4)
+        self.assertNotIn(self.collection.id, ids)
+        self.assertNotIn(self.french.id, ids)
+        self.assertTrue({book.id for book in self.others} <= ids)
+
+    def test_widens_when_the_filter_drops_most_of_the_first_window(self):
+        rng = np.random.default_rng(6)
+        centre = rng.normal(size=384)
+
+        source = create_embedded_book(400, centre, title="Fonte", language="Italian")
+
+        # The whole first candidate window is in another language.
+        for index in range(401, 401 + CANDIDATE_LIMIT + 50):
+            create_embedded_book(
+                index,
+                centre + rng.normal(scale=0.01, size=384),
+                language="French",
+            )
+
+        italian = [
+            create_embedded_book(
+                index,
+                centre + rng.normal(scale=0.3, size=384),
+                language="Italian",
+            )
+            for index in range(600, 603)
+        ]
+
+        # Make the planner use the HNSW index, as it would on a full table.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        recommendations = RecommendationService().compute(source, limit=3)
+
+        self.assertEqual(
+            {candidate.book.id for candidate in recommendations},
+            {book.id for book in italian},
+        )
+
+
+@override_settings(VECTOR_BACKEND="pgvector")
+class PrecomputedRecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(4)
+        base = rng.normal(size=384)
+
+        def create(index, *, language="English"):
+            return create_embedded_book(
+                index,
+                base + rng.normal(scale=0.1, size=384),
+                language=language,
+            )
+
+        cls.books = [create(index) for index in range(4)]
+        # No other book shares its language, so it gets no recommendations.
+        cls.solo = create(10, language="German")
+
+    def test_command_marks_books_without_recommendations(self):
+        call_command("compute_recommendations", stdout=StringIO())
+
+        self.assertEqual(
+            BookRecommendation.objects.filter(book=self.books[0]).count(),
+            3,
+        )
+        self.assertFalse(BookRecommendation.objects.filter(book=self.solo).exists())
+        self.assertFalse(
+            BookEmbedding.objects.filter(recommendations_computed_at__isnull=True).exists()
+        )
+
+        output = StringIO()
+        call_command("compute_recommendations", incremental=True, stdout=output)
+
+        self.assertIn("Recommendations are up to date.", output.getvalue())
+
+    def test_incremental_run_picks_up_changed_embeddings(self):
+        call_command("compute_recommendations", stdout=StringIO())
+
+        embedding = BookEmbedding.objects.get(book=self.books[1])
+        embedding.save()
+
+        output = StringIO()
+        call_command("compute_recommendations", incremental=True, stdout=output)
+
+        self.assertIn("Computing recommendations for", output.getvalue())
+
+    def test_recommend_serves_stored_rows(self):
+        BookRecommendation.objects.create(
+            book=self.books[0],
+            rank=1,
+            recommended=self.books[3],
+            score=0.5,
+        )
+
+        with self.assertNumQueries(1):
+            recommendations = RecommendationService().recommend(self.books[0], limit=1)
+
+        self.assertEqual(recommendations, [self.books[3]])
+
+    @override_settings(RECOMMENDATIONS_PRECOMPUTED_LIMIT=1)
+    def test_recommend_computes_live_without_enough_stored_rows(self):
+        BookRecommendation.objects.create(
+            book=self.books[0],
+            rank=1,
+            recommended=self.books[3],
+            score=0.5,
+        )
+
+        service = RecommendationService()
+        book = Book.objects.get(pk=self.books[0].pk)
+
+        self.assertEqual(
+            service.recommend(book, limit=3),
+            [candidate.book for candidate in service.compute(book, limit=3)],
+        )
+
+    def test_recommend_computes_live_without_stored_rows(self):
+        service = RecommendationService()
+        book = Book.objects.get(pk=self.books[0].pk)
+
+        recommendations = service.recommend(book, limit=2)
+
+        self.assertEqual(len(recommendations), 2)
+        self.assertEqual(
+            recommendations,
+            [candidate.book for candidate in service.compute(book, limit=2)],
+        )
+
+
+@override_settings(VECTOR_BACKEND="pgvector")
+class RecommendManyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(2)
+        base = rng.normal(size=384)
+
+        cls.books = [
+            create_embedded_book(index, base + rng.normal(scale=0.1, size=384))
+            for index in range(10)
+        ]
+
+    def test_excludes_sources_and_listed_books(self):
+        sources = self.books[:2]
+        listed = self.books[2]
+
+        with CaptureQueriesContext(connection) as context:
+            recommendations = RecommendationService().recommend_many(
+                sources,
+                limit=3,
+                exclude_book_ids=[listed.id],
+            )
+
+        excluded = {book.id for book in (*sources, listed)}
+
+        self.assertEqual(set(recommendations.by_source), {book.id for book in sources})
+
+        for candidates in recommendations.by_source.values():
+            self.assertEqual(len(candidates), 3)
+            self.assertFalse({candidate.book.id for candidate in candidates} & excluded)
+
+        self.assertEqual(len(recommendations.combined), 3)
+        self.assertFalse(
+            {candidate.book.id for candidate in recommendations.combined} & excluded
+        )
+
+        vector_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if "<=>" in query["sql"]
+        ]
+
+        self.assertEqual(len(vector_queries), 1)
+
+    def test_language_filter_runs_in_the_vector_query(self):
+        rng = np.random.default_rng(5)
+        source = create_embedded_book(1000, rng.normal(size=384), language="English")
+        source_embedding = np.asarray(BookEmbedding.objects.get(book=source).embedding)
+
+        # More French neighbours than one candidate window holds, all
+        # nearer than any book the source may be recommended.
+        for index in range(1001, 1001 + CANDIDATE_LIMIT + 5):
+            create_embedded_book(
+                index,
+                source_embedding + rng.normal(scale=0.01, size=384),
+                language="French",
+            )
+
+        recommendations = RecommendationService().recommend_many([source], limit=3)
+        candidates = recommendations.by_source[source.id]
+
+        self.assertEqual(len(candidates), 3)
+        self.assertTrue(all(candidate.book.language != "French" for candidate in candidates))
+
+
+@override_settings(VECTOR_BACKEND="pgvector")
+class TasteProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(3)
+
+        cls.user = User.objects.create_user(username="reader", password="secret")
+        cls.favourites = List.objects.create(
+            user=cls.user,
+            name="Favourites",
+            is_system=True,
+        )
+
+        cls.books = [
+            create_embedded_book(index, rng.normal(size=384))
+            for index in range(6)
+        ]
+
+    def test_incremental_updates_match_a_rebuild(self):
+        get_taste_profile(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                book=self.books[0],
+                user=self.user,
+                rating=5,
+                text="Loved every page of it.",
+            )
+            ListBook.objects.create(book_list=self.favourites, book=self.books[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(book=self.books[0]).get().delete()
+
+        updated = UserTasteProfile.objects.get(user=self.user)
+        rebuilt = rebuild_taste_profile(self.user.id)
+
+        self.assertEqual(updated.weights, rebuilt.weights)
+        np.testing.assert_allclose(updated.embedding, rebuilt.embedding, atol=1e-4)
+
+    def test_recommendations_leave_out_the_users_books(self):
+        ListBook.objects.create(book_list=self.favourites, book=self.books[0])
+
+        recommendations = RecommendationService().recommend_for_user(self.user.id, limit=3)
+
+        self.assertEqual(len(recommendations), 3)
+        self.assertNotIn(
+            self.books[0].id,
+            {candidate.book.id for candidate in recommendations},
+        )
+
+
+class FakeProvider(SummaryProvider):
+    model = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, *, system_prompt, user_prompt):
+        self.calls += 1
+
+        return SummaryResult(
+            summary=f"Explanation {self.calls}",
+            prompt_tokens=100,
+            completion_tokens=20,
+            total_tokens=120,
+        )
+
+
+class StreamingFakeProvider(FakeProvider):
+    def stream(self, *, system_prompt, user_prompt):
+        self.calls += 1
+
+        yield "Streamed "
+        yield "explanation"
+
+        return SummaryResult(summary="Streamed explanation", total_tokens=50)
+
+
+class ExplanationStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name="Author")
+
+        cls.source = Book.objects.create(
+            source="test",
+            source_row_id="1",
+            title="Source",
+            description="A quiet story.",
+            author=author,
+        )
+        cls.recommended = Book.objects.create(
+            source="test",
+            source_row_id="2",
+            title="Recommended",
+            description="Another quiet story.",
+            author=author,
+        )
+
+    def explain(self, provider):
+        return ExplanationService(provider=provider).explain_book_recommendation(
+            Book.objects.get(pk=self.source.pk),
+            Book.objects.get(pk=self.recommended.pk),
+        )
+
+    def test_reuses_stored_explanation(self):
+        provider = FakeProvider()
+
+        self.assertEqual(self.explain(provider), "Explanation 1")
+        self.assertEqual(self.explain(provider), "Explanation 1")
+        self.assertEqual(provider.calls, 1)
+
+        stored = RecommendationExplanation.objects.get()
+
+        self.assertEqual(stored.hit_count, 1)
+        self.assertEqual(stored.generation_count, 1)
+        self.assertEqual(stored.total_tokens, 120)
+
+    def test_regenerates_after_genres_or_description_change(self):
+        provider = FakeProvider()
+        self.explain(provider)
+
+        self.recommended.genres.add(Genre.objects.create(name="Mystery"))
+        self.assertEqual(self.explain(provider), "Explanation 2")
+
+        Book.objects.filter(pk=self.source.pk).update(description="A loud story.")
+        self.assertEqual(self.explain(provider), "Explanation 3")
+
+        self.assertEqual(RecommendationExplanation.objects.get().generation_count, 3)
+
+    def test_streams_then_serves_stored_explanation(self):
+        provider = StreamingFakeProvider()
+
+        chunks = list(
+            ExplanationService(provider=provider).stream_book_recommendation(
+                Book.objects.get(pk=self.source.pk),
+                Book.objects.get(pk=self.recommended.pk),
+            )
+        )
+
+        self.assertEqual(chunks, ["Streamed ", "explanation"])
+        self.assertEqual(self.explain(provider), "Streamed explanation")
+        self.assertEqual(provider.calls, 1)
+
+    @override_settings(LLM_REQUEST_TIMEOUT=-1)
+    def test_stream_stops_at_the_provider_timeout(self):
+        provider = StreamingFakeProvider()
+        service = ExplanationService(provider=provider)
+
+        with self.assertRaises(TimeoutError):
+            list(
+                service.stream_book_recommendation(
+                    Book.objects.get(pk=self.source.pk),
+                    Book.objects.get(pk=self.recommended.pk),
+                )
+            )
+
+        self.assertFalse(RecommendationExplanation.objects.exists())
+        # The lock is released, so the next request generates at once.
+        self.assertEqual(self.explain(provider), "Explanation 2")
+
+
+class ExplanationInputHashTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name="Fantasy")
+
+        cls.source, cls.recommended = [
+            Book.objects.create(
+                source="test",
+                source_row_id=str(index),
+                title=f"Book {index}",
+                description=f"Description {index}.",
+                author=Author.objects.create(name=f"Author {index}"),
+            )
+            for index in range(2)
+        ]
+
+        cls.source.genres.add(cls.genre)
+
+    def input_hash(self, model="model"):
+        return explanation_input_hash(
+            Book.objects.select_related("author").get(pk=self.source.pk),
+            Book.objects.select_related("author").get(pk=self.recommended.pk),
+            model=model,
+        )
+
+    def test_every_prompt_input_changes_the_hash(self):
+        changes = [
+            lambda: Book.objects.filter(pk=self.source.pk).update(title="Renamed"),
+            lambda: Book.objects.filter(pk=self.recommended.pk).update(description="New."),
+            lambda: Author.objects.filter(pk=self.recommended.author_id).update(name="Corrected"),
+            lambda: Genre.objects.filter(pk=self.genre.pk).update(name="High Fantasy"),
+            lambda: self.recommended.genres.add(Genre.objects.create(name="Mystery")),
+        ]
+
+        hashes = [self.input_hash()]
+
+        for change in changes:
+            change()
+            hashes.append(self.input_hash())
+
+        with mock.patch("ai.services.explanations.PROMPT_VERSION", "v-next"):
+            hashes.append(self.input_hash())
+
+        hashes.append(self.input_hash(model="other-model"))
+
+        self.assertEqual(len(set(hashes)), len(hashes))
+
+    def test_hash_is_stable(self):
+        self.assertEqual(self.input_hash(), self.input_hash())
+
+
+class HnswEfSearchTests(TestCase):
+    def current_ef_search(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT current_setting('hnsw.ef_search')")
+            return int(cursor.fetchone()[0])
+
+    def test_clamps_to_pgvector_maximum(self):
+        with hnsw_ef_search(100, limit=5000):
+            self.assertEqual(self.current_ef_search(), MAX_EF_SEARCH)
+
+    @override_settings(VECTOR_HNSW_ITERATIVE_SCAN="strict_order")
+    def test_enables_iterative_scan(self):
+        with hnsw_ef_search():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT current_setting('hnsw.iterative_scan')")
+
+                self.assertEqual(cursor.fetchone()[0], "strict_order")
+
+    def test_long_exclusion_list_does_not_fail(self):
+        book = create_embedded_book(1, [1.0] * 384)
+
+        backend = PgvectorBackend()
+        excluded = range(10_000_000, 10_001_200)
+
+        matches = backend.nearest(
+            [1.0] * 384,
+            embedding_type=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+            limit=800,
+            exclude_book_ids=excluded,
+        )
+        rankings = backend.nearest_many(
+            [[1.0] * 384],
+            embedding_type=BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE,
+            limit=800,
+            exclude_book_ids=excluded,
+        )
+
+        self.assertEqual([match.book_id for match in matches], [book.id])
+        self.assertEqual([match.book_id for match in rankings[0]], [book.id])
+
+
+class VectorSnapshotTests(TestCase):
+    embedding_type = BookEmbedding.EmbeddingType.SUMMARY_NO_TITLE
+
+    @classmethod
+    def setUpTestData(cls):
+        for index, value in enumerate((3.0, 1.0, 2.0)):
+            create_embedded_book(index, [value] * 384)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        settings_override = override_settings(VECTOR_SNAPSHOT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.root = Path(directory.name) / self.embedding_type
+
+    def snapshot_dirs(self):
+        return sorted(path.name for path in self.root.iterdir() if path.is_dir())
+
+    def test_export_and_load_round_trip(self):
+        exported = export_snapshot(self.embedding_type)
+        snapshot = get_current_snapshot(self.embedding_type)
+
+        self.assertEqual(snapshot.id, exported.id)
+        self.assertEqual(snapshot.manifest["rows"], 3)
+        self.assertEqual(
+            snapshot.book_ids.tolist(),
+            sorted(BookEmbedding.objects.values_list("book_id", flat=True)),
+        )
+        np.testing.assert_allclose(np.linalg.norm(snapshot.vectors, axis=1), 1.0, rtol=1e-5)
+
+    @mock.patch("ai.services.vectors.snapshots.schedule_export")
+    def test_missing_snapshot_is_exported_in_the_background(self, schedule_export):
+        self.assertIsNone(get_current_snapshot(self.embedding_type))
+        schedule_export.assert_called_once_with(self.embedding_type)
+
+    @mock.patch("ai.services.vectors.snapshots.schedule_export")
+    def test_stale_snapshot_is_served_while_exporting(self, schedule_export):
+        exported = export_snapshot(self.embedding_type)
+        embeddings_changed(self.embedding_type)
+
+        self.assertEqual(get_current_snapshot(self.embedding_type).id, exported.id)
+        schedule_export.assert_called_once_with(self.embedding_type)
+
+    def test_prune_keeps_newest_and_removes_incomplete_exports(self):
+        exported = [export_snapshot(self.embedding_type).id for _ in range(3)]
+
+        # An interrupted export: a directory that never got its manifest.
+        incomplete = self.root / "99999999_000000_000000"
+        incomplete.mkdir()
+
+        removed = prune_snapshots(self.embedding_type, keep=2)
+
+        self.assertEqual(sorted(removed), sorted([exported[0], incomplete.name]))
+        self.assertEqual(self.snapshot_dirs(), exported[1:])
+        self.assertEqual(get_current_snapshot(self.embedding_type).id, exported[2])
+
+    def test_command_exports_and_prunes(self):
+        export_snapshot(self.embedding_type)
+
+        call_command("export_embeddings", keep=1, stdout=StringIO())
+
+        snapshot_ids = self.snapshot_dirs()
+
+        self.assertEqual(len(snapshot_ids), 1)
+        self.assertTrue((self.root / snapshot_ids[0] / MANIFEST_NAME).is_file())
+        self.assertEqual(get_current_snapshot(self.embedding_type).id, snapshot_ids[0])
+
+
+def batch_output_line(custom_id, text):
+    return json.dumps({
+        "custom_id": custom_id,
+        "response": {
+            "status_code": 200,
+            "body": {
+                "output": [
+                    {"type": "reasoning", "summary": []},
+                    {
+                        "type": "message",
+                        "content": [{"type": "output_text", "text": f" {text} "}],
+                    },
+                ],
+                "usage": {"input_tokens": 90, "output_tokens": 30, "total_tokens": 120},
+            },
+        },
+        "error": None,
+    })
+
+
+class ExplanationBatchImporterTests(SimpleTestCase):
+    def test_custom_id_round_trips(self):
+        custom_id = build_custom_id(3, 7, "a" * 64)
+
+        self.assertEqual(
+            CUSTOM_ID_PATTERN.fullmatch(custom_id).groups(),
+            ("3", "7", "a" * 64),
+        )
+
+    def test_parses_output_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            (Path(directory) / "part001.output.jsonl").write_text(
+                batch_output_line(build_custom_id(3, 7, "b" * 64), "Both are quiet.") + "\n",
+                encoding="utf-8",
+            )
+            # Request files are not results.
+            (Path(directory) / "part001.jsonl").write_text("not json\n", encoding="utf-8")
+
+            [explanation] = ExplanationBatchImporter().import_directory(Path(directory))
+
+        self.assertEqual(
+            (explanation.source_id, explanation.recommended_id, explanation.input_hash),
+            (3, 7, "b" * 64),
+        )
+        self.assertEqual(explanation.content, "Both are quiet.")
+        self.assertEqual(explanation.total_tokens, 120)
+
+    def test_skips_and_counts_failed_requests(self):
+        rejected = build_custom_id(3, 8, "c" * 64)
+        expired = build_custom_id(3, 9, "d" * 64)
+
+        lines = [
+            batch_output_line(build_custom_id(3, 7, "b" * 64), "Both are quiet."),
+            json.dumps({
+                "custom_id": rejected,
+                "response": {
+                    "status_code": 400,
+                    "body": {"error": {"message": "Invalid model."}},
+                },
+                "error": None,
+            }),
+            json.dumps({
+                "custom_id": expired,
+                "response": None,
+                "error": {"code": "batch_expired", "message": "Batch expired."},
+            }),
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            (Path(directory) / "part001.output.jsonl").write_text(
+                "\n".join(lines) + "\n",
+                encoding="utf-8",
+            )
+
+            importer = ExplanationBatchImporter()
+            [explanation] = importer.import_directory(Path(directory))
+
+        self.assertEqual(explanation.recommended_id, 7)
+        self.assertEqual(
+            importer.failures,
+            [
+                FailedRequest(custom_id=rejected, reason="HTTP 400: Invalid model."),
+                FailedRequest(custom_id=expired, reason="Batch expired."),
+            ],
+        )
+
+    def test_rejects_unknown_custom_ids(self):
+        with self.assertRaises(ValueError):
+            ExplanationBatchImporter()._parse_response(
+                json.loads(batch_output_line("summary-3", "Text"))
+            )
+
+
+class ExplanationBatchCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(
+                source="test",
+                source_row_id=str(index),
+                title=f"Book {index}",
+                description=f"Description {index}.",
+                author=Author.objects.create(name=f"Author {index}"),
+            )
+            for index in range(4)
+        ]
+
+        for rank, recommended in enumerate(cls.books[1:], start=1):
+            BookRecommendation.objects.create(
+                book=cls.books[0],
+                rank=rank,
+                recommended=recommended,
+                score=1 / rank,
+            )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def store(self, recommended, input_hash):
+        RecommendationExplanation.objects.create(
+            source=self.books[0],
+            recommended=recommended,
+            model_name="gpt-4.1-mini",
+            prompt_version=PROMPT_VERSION,
+            input_hash=input_hash,
+            content="Stored.",
+        )
+
+    def export(self):
+        with mock.patch(
+            "ai.management.commands.export_explanation_batch.Command._build_output_directory",
+            return_value=self.directory,
+        ):
+            call_command(
+                "export_explanation_batch",
+                book_ids=[self.books[0].id],
+                stdout=StringIO(),
+            )
+
+        with (self.directory / "part001.jsonl").open(encoding="utf-8") as file:
+            return [json.loads(line)["custom_id"] for line in file]
+
+    def test_export_skips_current_stored_explanations(self):
+        source = Book.objects.get(pk=self.books[0].pk)
+        fresh, stale, missing = Book.objects.filter(pk__in=[book.pk for book in self.books[1:]]).order_by("id")
+
+        self.store(fresh, explanation_input_hash(source, fresh, model="gpt-4.1-mini"))
+        self.store(stale, "0" * 64)
+
+        self.assertEqual(
+            self.export(),
+            [
+                build_custom_id(
+                    source.id,
+                    book.id,
+                    explanation_input_hash(source, book, model="gpt-4.1-mini"),
+                )
+                for book in (stale, missing)
+            ],
+        )
+
+        manifest = json.loads((self.directory / "manifest.json").read_text(encoding="utf-8"))
+
+        self.assertEqual(manifest["prompt_version"], PROMPT_VERSION)
+        self.assertEqual(manifest["requests"], 2)
+
+    def test_import_stores_results_and_skips_deleted_books(self):
+        custom_ids = self.export()
+
+        (self.directory / "part001.output.jsonl").write_text(
+            "".join(
+                batch_output_line(custom_id, f"Explanation {index}") + "\n"
+                for index, custom_id in enumerate(custom_ids)
+            ),
+            encoding="utf-8",
+        )
+
+        self.books[3].delete()
+
+        call_command("import_explanation_batch", self.directory, stdout=StringIO())
+
+        stored = list(RecommendationExplanation.objects.order_by("recommended_id"))
+
+        self.assertEqual(
+            [explanation.recommended_id for explanation in stored],
+            [self.books[1].id, self.books[2].id],
+        )
+        self.assertEqual(stored[0].content, "Explanation 0")
+        self.assertEqual(stored[0].input_hash, CUSTOM_ID_PATTERN.fullmatch(custom_ids[0]).group(3))
+
+    def test_import_reports_failed_requests(self):
+        succeeded, failed, _ = self.export()
+
+        (self.directory / "part001.output.jsonl").write_text(
+            batch_output_line(succeeded, "Explanation") + "\n"
+            + json.dumps({
+                "custom_id": failed,
+                "response": {"status_code": 500, "body": {"error": {"message": "Server error."}}},
+                "error": None,
+            }) + "\n",
+            encoding="utf-8",
+        )
+
+        stdout = StringIO()
+        call_command("import_explanation_batch", self.directory, stdout=stdout)
+
+        self.assertEqual(RecommendationExplanation.objects.count(), 1)
+        self.assertIn("Skipped 1 failed requests", stdout.getvalue())
+        self.assertIn(f"{failed}: HTTP 500: Server error.", stdout.getvalue())
+
+    def test_import_requires_directory_and_manifest(self):
+        with self.assertRaisesMessage(CommandError, "Directory not found"):
+            call_command("import_explanation_batch", self.directory / "missing")
+
+        with self.assertRaisesMessage(CommandError, "Manifest not found"):
+            call_command("import_explanation_batch", self.directory)
@@ -0,0 +1,81 @@
+"""
+Gunicorn configuration, read from the working directory on start.
+
+Threaded workers let one process serve concurrent requests, which the
+embedding micro-batcher needs to form batches, while the embedding model
+is loaded once per process rather than once per request slot. They also
+keep long responses, such as streamed recommendation explanations, to
+one thread instead of a whole worker.
+
+Workers default to one per CPU, as a process count should, and
+WEB_CONCURRENCY is still honoured where the platform sets it. Threads do
+not add encoding load: each worker's micro-batcher runs one encode at a
+time, on the encoder's own intra-op thread pool, while request threads
+mostly wait on the database, the cache or an LLM provider. The pool's
+size is EMBEDDING_INTRA_OP_THREADS, which defaults here to
+cpu_count / workers so concurrent batches in different workers do not
+oversubscribe the CPU.
+
+With EMBEDDING_WARM_UP=gunicorn the model is loaded before the first
+request: in the master when the app is preloaded (GUNICORN_PRELOAD or
+--preload), and in each worker after it initialises otherwise.
+"""
+
+import os
+import time
+
+workers = int(
+    os.getenv("GUNICORN_WORKERS")
+    or os.getenv("WEB_CONCURRENCY")
+    or os.cpu_count()
+    or 1
+)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+# Read by the Django settings, which are imported after this file.
+os.environ.setdefault(
+    "EMBEDDING_INTRA_OP_THREADS",
+    str(max(1, (os.cpu_count() or 1) // workers)),
+)
+
+
+def _warm_up_enabled():
+    return os.getenv("EMBEDDING_WARM_UP", "off") == "gunicorn"
+
+
+def on_starting(server):
+    server.start_time = time.monotonic()
+
+
+def when_ready(server):
+    server.log.info(
+        "Master ready in %.2fs.",
+        time.monotonic() - server.start_time,
+    )
+
+    # With --preload the application is already imported here, before any
+    # worker is forked, so model weights loaded now are shared
+    # copy-on-write. Encoding is left to the workers: inference thread
+    # pools started in the master do not survive fork.
+    if server.cfg.preload_app and _warm_up_enabled():
+        from ai.services.embeddings import warm_up
+
+        warm_up(encode=False)
+
+
+def post_worker_init(worker):
+    if not _warm_up_enabled():
+        return
+
+    from ai.services.embeddings import warm_up
+
+    start = time.monotonic()
+    warm_up()
+
+    worker.log.info(
+        "Worker %s warmed up in %.2fs.",
+        worker.pid,
+        time.monotonic() - start,
+    )
@@ -9,3 +9,4 @@ class LibraryConfig(AppConfig):
     def ready(self):
         logger.info("LibraryConfig.ready() called")
         import library.cors
+        import library.signals
@@ -0,0 +1,642 @@
+"""
+In-memory prefix index for dropdown (autocomplete) search.
+
+Each worker keeps one index over normalised book titles, author names
+and genre names. Everything lives in a few flat arrays and UTF-8 blobs
+so the footprint stays small and predictable: for each kind of document
+there is a sorted array of keys pointing at document slots, and
+documents are ranked by popularity (num_ratings).
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Sum
+
+from .models import Author, Book, Genre
+
+logger = logging.getLogger(__name__)
+
+# Keys are truncated to this many UTF-8 bytes; longer prefixes still
+# match on the first MAX_KEY_BYTES.
+MAX_KEY_BYTES = 64
+
+# Prefix ranges larger than this are answered from a precomputed top-k
+# table instead of being scanned.
+SCAN_LIMIT = 512
+
+# How many documents are stored per precomputed prefix. The slack over
+# the dropdown size absorbs documents replaced since the last build.
+TOP_K = 20
+
+# Replaced or new documents are kept in a small delta index. Once it
+# grows past this size the whole index is rebuilt.
+MAX_DELTA_DOCUMENTS = 2_000
+
+# Leading words that do not start a key of their own.
+STOP_WORDS = frozenset({"a", "an", "and", "of", "the"})
+
+# Approximate per-object overhead used for the memory budget.
+_ENTRY_OVERHEAD = 8
+
+
+def normalize(text: str | None) -> str:
+    """
+    Fold case and accents and collapse punctuation to single spaces.
+    """
+    if not text:
+        return ""
+
+    decomposed = unicodedata.normalize("NFKD", text)
+
+    characters = [
+        character if character.isalnum() else " "
+        for character in decomposed
+        if not unicodedata.combining(character)
+    ]
+
+    return " ".join("".join(characters).casefold().split())
+
+
+def build_keys(*names: str | None) -> list[bytes]:
+    """
+    Return the index keys for a document: every name, plus the name
+    starting at each later word, so "potter" finds "Harry Potter".
+    """
+    keys: set[bytes] = set()
+
+    for name in names:
+        words = normalize(name).split()
+
+        for position, word in enumerate(words):
+            if position and word in STOP_WORDS:
+                continue
+
+            key = " ".join(words[position:]).encode("utf-8")[:MAX_KEY_BYTES]
+            keys.add(key)
+
+    return sorted(keys)
+
+
+class StringTable:
+    """
+    Immutable sequence of byte strings stored in a single blob.
+    """
+
+    __slots__ = ("_blob", "_offsets")
+
+    def __init__(self, values: list[bytes]):
+        offsets = array("L", [0])
+        position = 0
+
+        for value in values:
+            position += len(value)
+            offsets.append(position)
+
+        self._blob = b"".join(values)
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._blob[self._offsets[index]:self._offsets[index + 1]]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+
+class PrefixIndex:
+    """
+    Sorted keys mapped to document slots, answering "most popular
+    documents whose key starts with a prefix".
+    """
+
+    def __init__(
+        self,
+        entries: list[tuple[bytes, int]],
+        popularity: array,
+    ):
+        entries.sort()
+
+        self._keys = StringTable([key for key, _ in entries])
+        self._slots = array("L", [slot for _, slot in entries])
+        self._entry_popularity = array(
+            "q",
+            [popularity[slot] for _, slot in entries],
+        )
+        self._top: dict[bytes, array] = {}
+
+        self._precompute_large_ranges()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def nbytes(self) -> int:
+        top_bytes = sum(
+            len(prefix) + slots.itemsize * len(slots) + _ENTRY_OVERHEAD * 2
+            for prefix, slots in self._top.items()
+        )
+
+        return (
+            self._keys.nbytes
+            + self._slots.itemsize * len(self._slots)
+            + self._entry_popularity.itemsize * len(self._entry_popularity)
+            + top_bytes
+        )
+
+    def _range(self, prefix: bytes) -> tuple[int, int]:
+        low = bisect_left(self._keys, prefix)
+        # 0xff never occurs in UTF-8, so it sorts after every continuation.
+        high = bisect_left(self._keys, prefix + b"\xff", low)
+
+        return low, high
+
+    def _top_slots(self, low: int, high: int, limit: int) -> list[int]:
+        """
+        Return up to `limit` distinct slots from an entry range,
+        most popular first.
+        """
+        count = limit * 2
+
+        while True:
+            positions = heapq.nlargest(
+                count,
+                range(low, high),
+                key=self._entry_popularity.__getitem__,
+            )
+
+            slots: list[int] = []
+
+            for position in positions:
+                slot = self._slots[position]
+
+                if slot not in slots:
+                    slots.append(slot)
+
+                if len(slots) == limit:
+                    return slots
+
+            if len(positions) == high - low:
+                return slots
+
+            # Several keys of one document crowded the window; widen it.
+            count *= 4
+
+    def _precompute_large_ranges(self) -> None:
+        """
+        Store the top slots of every prefix whose range exceeds
+        SCAN_LIMIT. Such ranges are disjoint at each depth, so there are
+        at most len(self) / SCAN_LIMIT of them per byte of prefix.
+        """
+        pending = [(b"", 0, len(self))]
+
+        while pending:
+            prefix, low, high = pending.pop()
+            depth = len(prefix) + 1
+            position = low
+
+            while position < high:
+                key = self._keys[position]
+
+                if len(key) < depth:
+                    position += 1
+                    continue
+
+                child = key[:depth]
+                child_high = bisect_left(
+                    self._keys,
+                    child + b"\xff",
+                    position,
+                    high,
+                )
+
+                if child_high - position > SCAN_LIMIT:
+                    self._top[child] = array(
+                        "L",
+                        self._top_slots(position, child_high, TOP_K),
+                    )
+                    pending.append((child, position, child_high))
+
+                position = child_high
+
+    def search(self, prefix: bytes, limit: int) -> list[int]:
+        top = self._top.get(prefix)
+
+        if top is not None:
+            return list(top)
+
+        low, high = self._range(prefix)
+
+        return self._top_slots(low, high, limit)
+
+
+@dataclass(slots=True)
+class Document:
+    id: int
+    popularity: int
+    keys: list[bytes]
+    payload: list
+
+
+class Section:
+    """
+    One kind of document (books, authors or genres) with its index.
+    Payloads are stored as compact JSON arrays in the order of `fields`.
+    """
+
+    def __init__(
+        self,
+        fields: tuple[str, ...],
+        documents: list[Document],
+    ):
+        self.fields = fields
+        self._ids = array("q", [document.id for document in documents])
+        self._popularity = array(
+            "q",
+            [document.popularity for document in documents],
+        )
+        self._payloads = StringTable([
+            json.dumps(document.payload, separators=(",", ":")).encode("utf-8")
+            for document in documents
+        ])
+
+        entries = [
+            (key, slot)
+            for slot, document in enumerate(documents)
+            for key in document.keys
+        ]
+
+        self._index = PrefixIndex(entries, self._popularity)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self._ids.itemsize * len(self._ids)
+            + self._popularity.itemsize * len(self._popularity)
+            + self._payloads.nbytes
+            + self._index.nbytes
+        )
+
+    def search(
+        self,
+        prefix: bytes,
+        limit: int,
+        exclude_ids: set[int] | frozenset[int] = frozenset(),
+    ) -> list[tuple[int, dict]]:
+        """
+        Return (popularity, payload) pairs for the best matches.
+        """
+        results = []
+
+        candidates = self._index.search(
+            prefix,
+            limit + min(len(exclude_ids), TOP_K),
+        )
+
+        for slot in candidates:
+            if self._ids[slot] in exclude_ids:
+                continue
+
+            values = json.loads(self._payloads[slot])
+            results.append(
+                (self._popularity[slot], dict(zip(self.fields, values)))
+            )
+
+            if len(results) == limit:
+                break
+
+        return results
+
+
+BOOK_FIELDS = ("id", "title", "cover", "author", "author_name")
+NAME_FIELDS = ("id", "name")
+
+
+def book_document(
+    *,
+    id: int,
+    title: str,
+    cover: str | None,
+    author_id: int,
+    author_name: str,
+    num_ratings: int,
+) -> Document:
+    return Document(
+        id=id,
+        popularity=num_ratings or 0,
+        keys=build_keys(title, author_name),
+        payload=[id, title, cover, author_id, author_name],
+    )
+
+
+def name_document(*, id: int, name: str, popularity: int | None) -> Document:
+    return Document(
+        id=id,
+        popularity=popularity or 0,
+        keys=build_keys(name),
+        payload=[id, name],
+    )
+
+
+def document_bytes(document: Document) -> int:
+    """
+    Rough size of a document once indexed, for the memory budget.
+    """
+    payload = len(json.dumps(document.payload)) + _ENTRY_OVERHEAD * 3
+    keys = sum(
+        len(key) + _ENTRY_OVERHEAD * 3
+        for key in document.keys
+    )
+
+    return payload + keys
+
+
+class AutocompleteIndex:
+    """
+    Immutable snapshot of the three sections, plus a small delta for
+    books saved or deleted in this worker since the snapshot was built.
+    """
+
+    def __init__(
+        self,
+        books: list[Document],
+        authors: list[Document],
+        genres: list[Document],
+    ):
+        self.books = Section(BOOK_FIELDS, books)
+        self.authors = Section(NAME_FIELDS, authors)
+        self.genres = Section(NAME_FIELDS, genres)
+        self.built_at = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._delta_documents: dict[int, Document] = {}
+        self._delta = Section(BOOK_FIELDS, [])
+        self._replaced_ids: frozenset[int] = frozenset()
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.books.nbytes
+            + self.authors.nbytes
+            + self.genres.nbytes
+            + self._delta.nbytes
+        )
+
+    @property
+    def delta_size(self) -> int:
+        return len(self._delta_documents)
+
+    def stats(self) -> dict:
+        return {
+            "books": len(self.books),
+            "authors": len(self.authors),
+            "genres": len(self.genres),
+            "delta_books": self.delta_size,
+            "bytes": self.nbytes,
+        }
+
+    def search(self, query: str, limit: int = 5) -> dict:
+        prefix = normalize(query).encode("utf-8")[:MAX_KEY_BYTES]
+
+        if not prefix:
+            return {"books": [], "authors": [], "genres": []}
+
+        replaced_ids = self._replaced_ids
+        delta = self._delta
+
+        books = self.books.search(prefix, limit, replaced_ids)
+        books.extend(delta.search(prefix, limit))
+        books.sort(key=lambda item: item[0], reverse=True)
+
+        return {
+            "books": [payload for _, payload in books[:limit]],
+            "authors": [
+                payload for _, payload in self.authors.search(prefix, limit)
+            ],
+            "genres": [
+                payload for _, payload in self.genres.search(prefix, limit)
+            ],
+        }
+
+    def upsert_book(self, document: Document) -> None:
+        with self._lock:
+            self._delta_documents[document.id] = document
+            self._refresh_delta()
+
+    def remove_book(self, book_id: int) -> None:
+        with self._lock:
+            self._delta_documents.pop(book_id, None)
+            self._replaced_ids = self._replaced_ids | {book_id}
+            self._refresh_delta()
+
+    def _refresh_delta(self) -> None:
+        self._delta = Section(
+            BOOK_FIELDS,
+            list(self._delta_documents.values()),
+        )
+        self._replaced_ids = self._replaced_ids | frozenset(self._delta_documents)
+
+
+def load_documents(max_bytes: int) -> tuple[list, list, list]:
+    """
+    Read all documents, most popular first, stopping once the
+    estimated index size reaches `max_bytes`.
+    """
+    budget = max_bytes
+
+    def within_budget(documents):
+        nonlocal budget
+
+        kept = []
+
+        for document in documents:
+            budget -= document_bytes(document)
+
+            if budget < 0:
+                logger.warning(
+                    "Autocomplete memory budget reached; "
+                    "skipping less popular documents."
+                )
+                break
+
+            kept.append(document)
+
+        return kept
+
+    genres = within_budget(
+        name_document(id=id, name=name, popularity=popularity)
+        for id, name, popularity in (
+            Genre.objects
+            .annotate(popularity=Sum("books__num_ratings"))
+            .order_by("-popularity", "id")
+            .values_list("id", "name", "popularity")
+            .iterator()
+        )
+    )
+
+    authors = within_budget(
+        name_document(id=id, name=name, popularity=popularity)
+        for id, name, popularity in (
+            Author.objects
+            .annotate(popularity=Sum("books__num_ratings"))
+            .order_by("-popularity", "id")
+            .values_list("id", "name", "popularity")
+            .iterator()
+        )
+    )
+
+    books = within_budget(
+        book_document(
+            id=id,
+            title=title,
+            cover=cover,
+            author_id=author_id,
+            author_name=author_name,
+            num_ratings=num_ratings,
+        )
+        for id, title, cover, author_id, author_name, num_ratings in (
+            Book.objects
+            .order_by("-num_ratings", "id")
+            .values_list(
+                "id",
+                "title",
+                "cover",
+                "author_id",
+                "author__name",
+                "num_ratings",
+            )
+            .iterator(chunk_size=5_000)
+        )
+    )
+
+    return books, authors, genres
+
+
+def build_index() -> AutocompleteIndex:
+    start = time.perf_counter()
+
+    books, authors, genres = load_documents(
+        settings.AUTOCOMPLETE_MAX_MEMORY_MB * 1024 * 1024,
+    )
+
+    index = AutocompleteIndex(books, authors, genres)
+
+    logger.info(
+        "Built autocomplete index | books=%d | authors=%d | genres=%d "
+        "| size=%.1f MiB | time=%.2fs",
+        len(index.books),
+        len(index.authors),
+        len(index.genres),
+        index.nbytes / (1024 * 1024),
+        time.perf_counter() - start,
+    )
+
+    return index
+
+
+_index: AutocompleteIndex | None = None
+_build_lock = threading.Lock()
+_building = False
+
+
+def _build_in_background() -> None:
+    global _index, _building
+
+    try:
+        _index = build_index()
+    except Exception:
+        logger.exception("Failed to build autocomplete index.")
+    finally:
+        _building = False
+        connection.close()
+
+
+def schedule_rebuild() -> None:
+    """
+    Start a background build unless one is already running.
+    """
+    global _building
+
+    with _build_lock:
+        if _building:
+            return
+
+        _building = True
+
+    threading.Thread(
+        target=_build_in_background,
+        name="autocomplete-index",
+        daemon=True,
+    ).start()
+
+
+def get_index() -> AutocompleteIndex | None:
+    """
+    Return this worker's index, or None while the first build runs.
+
+    The index is built lazily on first use and rebuilt in the background
+    once it is older than AUTOCOMPLETE_REBUILD_SECONDS (which also picks
+    up changes made by other workers) or its delta grows too large.
+    """
+    if not settings.AUTOCOMPLETE_ENABLED:
+        return None
+
+    index = _index
+
+    if index is None:
+        schedule_rebuild()
+        return None
+
+    age = time.monotonic() - index.built_at
+
+    if (
+        age > settings.AUTOCOMPLETE_REBUILD_SECONDS
+        or index.delta_size > MAX_DELTA_DOCUMENTS
+    ):
+        schedule_rebuild()
+
+    return index
+
+
+def book_saved(book: Book) -> None:
+    index = _index
+
+    if index is None:
+        return
+
+    index.upsert_book(
+        book_document(
+            id=book.id,
+            title=book.title,
+            cover=book.cover,
+            author_id=book.author_id,
+            author_name=book.author.name,
+            num_ratings=book.num_ratings,
+        )
+    )
+
+
+def book_deleted(book_id: int) -> None:
+    index = _index
+
+    if index is None:
+        return
+
+    index.remove_book(book_id)
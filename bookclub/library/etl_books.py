@@ -8,6 +8,8 @@ import pandas as pd
 import psycopg
 from ftfy import fix_text
 
+from library.models import is_collection_title
+
 SOURCE = "best_books_ever_csv_v1"
 CSV_ID_COLUMN = "bookId"
 MAX_ERROR_PRINTS = 50
@@ -219,6 +221,7 @@ def run_import(csv_path: str, db_dsn: str, rejects_csv: str = "etl_reject.csv"):
                     num_ratings = row.num_ratings_num or 0
                     rating = row.rating_dec or Decimal("0.0")
 
+                    # search_document is filled in by the library_book trigger.
                     cur.execute(
                         """
                         INSERT INTO library_book (
@@ -226,9 +229,9 @@ def run_import(csv_path: str, db_dsn: str, rejects_csv: str = "etl_reject.csv"):
                             title, description, pub_date, language,
                             author_id, pages, series_id, series_num,
                             publisher_id, cover,
-                            num_ratings, rating
+                            num_ratings, rating, is_collection
                         )
-                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, %s)
+                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, %s, %s)
                         ON CONFLICT (source, source_row_id)
                         DO UPDATE SET
                             title = EXCLUDED.title,
@@ -242,7 +245,8 @@ def run_import(csv_path: str, db_dsn: str, rejects_csv: str = "etl_reject.csv"):
                             publisher_id = EXCLUDED.publisher_id,
                             cover = EXCLUDED.cover,
                             num_ratings = EXCLUDED.num_ratings,
-                            rating = EXCLUDED.rating
+                            rating = EXCLUDED.rating,
+                            is_collection = EXCLUDED.is_collection
                         RETURNING id, (xmax = 0) AS inserted
                         """,
                         (
@@ -259,6 +263,7 @@ def run_import(csv_path: str, db_dsn: str, rejects_csv: str = "etl_reject.csv"):
                             cover,
                             num_ratings,
                             rating,
+                            is_collection_title(title),
                         ),
                     )
                     book_id, was_inserted = cur.fetchone()
@@ -0,0 +1,204 @@
+"""
+Hybrid search: lexical and semantic retrieval fused by reciprocal rank.
+
+Both retrievals run concurrently on a shared thread pool and are bounded
+to their top HYBRID_SEARCH_CANDIDATES results. A retrieval that misses
+the HYBRID_SEARCH_TIMEOUT_MS budget is left out of the fusion rather
+than holding up the response.
+
+A timed-out retrieval is cancelled if it has not started; one already
+running keeps its pool thread until it finishes. While such abandoned
+retrievals of a source hold half the pool, that source is skipped
+outright so later requests do not queue behind them. The semantic
+retrieval is also skipped until the embedding model is loaded, which
+starts in the background on the first hybrid search.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+
+from .search import get_trigram_threshold, rank_books, trigram_similarity_threshold
+
+logger = logging.getLogger(__name__)
+
+# Offset added to every rank; 60 is the value from the original RRF paper
+# and dampens the weight of the very top positions.
+RRF_K = 60
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.HYBRID_SEARCH_WORKERS,
+    thread_name_prefix="hybrid-search",
+)
+
+# Retrievals still running after their request stopped waiting, by source.
+_abandoned: dict[str, set[Future]] = {"lexical": set(), "semantic": set()}
+_abandoned_lock = threading.Lock()
+
+_warm_up_started = threading.Event()
+
+
+@dataclass(slots=True)
+class HybridSearchResult:
+    ids: list[int]
+    scores: list[float]
+    # Milliseconds spent per source, plus the total.
+    timings: dict[str, float]
+    # Sources dropped for missing the latency budget or failing.
+    skipped: list[str] = field(default_factory=list)
+
+
+def reciprocal_rank_fusion(
+    *rankings: list[int],
+    k: int = RRF_K,
+) -> list[tuple[int, float]]:
+    """
+    Fuse ranked id lists into one, scoring each id by the sum of
+    1 / (k + rank) over the lists it appears in. Ties keep the order in
+    which ids were first seen.
+    """
+    scores: dict[int, float] = {}
+
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _timed(retrieve, *args):
+    start = time.perf_counter()
+
+    try:
+        return retrieve(*args), (time.perf_counter() - start) * 1000
+    finally:
+        # Each pool thread has its own connection; don't leave it open
+        # between requests.
+        connection.close()
+
+
+def _lexical_ids(query: str, limit: int) -> list[int]:
+    with trigram_similarity_threshold(get_trigram_threshold(False)):
+        return rank_books(query, is_dropdown=False, limit=limit).ids
+
+
+def _semantic_ids(query: str, limit: int) -> list[int]:
+    from ai.services.semantic_search import SemanticSearchService
+
+    books = SemanticSearchService().search(query=query, limit=limit)
+
+    return [book.id for book in books]
+
+
+def _warm_up() -> None:
+    from ai.services.embeddings import warm_up
+
+    try:
+        warm_up()
+    except Exception:
+        logger.exception("Embedding model warm-up failed.")
+        _warm_up_started.clear()
+
+
+def _semantic_ready() -> bool:
+    """
+    Return whether the encoder is loaded, starting its warm-up in the
+    background the first time it is not.
+    """
+    from ai.services.embeddings import EmbeddingService
+
+    if EmbeddingService.is_ready():
+        return True
+
+    with _abandoned_lock:
+        if not _warm_up_started.is_set():
+            _warm_up_started.set()
+            _executor.submit(_warm_up)
+
+    return False
+
+
+def _is_saturated(source: str) -> bool:
+    with _abandoned_lock:
+        return len(_abandoned[source]) * 2 >= settings.HYBRID_SEARCH_WORKERS
+
+
+def _abandon(source: str, future: Future) -> None:
+    if future.cancel():
+        return
+
+    with _abandoned_lock:
+        _abandoned[source].add(future)
+
+    future.add_done_callback(lambda done: _release(source, done))
+
+
+def _release(source: str, future: Future) -> None:
+    with _abandoned_lock:
+        _abandoned[source].discard(future)
+
+
+def hybrid_search(query: str) -> HybridSearchResult:
+    limit = settings.HYBRID_SEARCH_CANDIDATES
+    budget = settings.HYBRID_SEARCH_TIMEOUT_MS / 1000
+
+    start = time.perf_counter()
+
+    skipped = []
+    retrievals = {}
+
+    for source, retrieve in (
+        ("lexical", _lexical_ids),
+        ("semantic", _semantic_ids),
+    ):
+        if source == "semantic" and not _semantic_ready():
+            logger.warning("Hybrid search skipped semantic retrieval: model not loaded.")
+            skipped.append(source)
+        elif _is_saturated(source):
+            logger.warning("Hybrid search skipped %s retrieval: pool saturated.", source)
+            skipped.append(source)
+        else:
+            retrievals[source] = retrieve
+
+    futures = {
+        source: _executor.submit(_timed, retrieve, query, limit)
+        for source, retrieve in retrievals.items()
+    }
+
+    wait(futures.values(), timeout=budget)
+
+    rankings = []
+    timings = {}
+
+    for source, future in futures.items():
+        if not future.done():
+            logger.warning("Hybrid search %s retrieval timed out.", source)
+            _abandon(source, future)
+            skipped.append(source)
+            continue
+
+        try:
+            ids, elapsed = future.result()
+        except Exception:
+            logger.exception("Hybrid search %s retrieval failed.", source)
+            skipped.append(source)
+            continue
+
+        rankings.append(ids)
+        timings[f"{source}_ms"] = round(elapsed, 1)
+
+    fused = reciprocal_rank_fusion(*rankings)
+
+    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return HybridSearchResult(
+        ids=[id for id, _ in fused],
+        scores=[score for _, score in fused],
+        timings=timings,
+        skipped=skipped,
+    )
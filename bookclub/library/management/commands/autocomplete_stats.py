@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.autocomplete import build_index
+
+
+class Command(BaseCommand):
+    help = "Build the autocomplete index and report its size and query latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "queries",
+            nargs="*",
+            default=["h", "ha", "har", "harry", "harry pot", "tolk", "fant"],
+            help="Prefixes to time.",
+        )
+
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1000,
+            help="Number of times each prefix is queried.",
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+
+        start = time.perf_counter()
+        index = build_index()
+        elapsed = time.perf_counter() - start
+
+        stats = index.stats()
+
+        self.stdout.write("")
+        self.stdout.write(f"Books:   {stats['books']:,}")
+        self.stdout.write(f"Authors: {stats['authors']:,}")
+        self.stdout.write(f"Genres:  {stats['genres']:,}")
+        self.stdout.write(f"Size:    {stats['bytes'] / (1024 * 1024):.1f} MiB")
+        self.stdout.write(f"Build:   {elapsed:.2f}s")
+        self.stdout.write("")
+
+        self.stdout.write(f"{'Prefix':20}{'Books':>8}{'µs/query':>12}")
+        self.stdout.write("-" * 40)
+
+        for query in options["queries"]:
+            start = time.perf_counter()
+
+            for _ in range(repeat):
+                results = index.search(query)
+
+            per_query = (time.perf_counter() - start) / repeat * 1_000_000
+
+            self.stdout.write(
+                f"{query[:20]:20}"
+                f"{len(results['books']):>8}"
+                f"{per_query:>12.1f}"
+            )
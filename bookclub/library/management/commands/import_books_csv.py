@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from library import search_cache
 from library.etl_books import run_import
 
 
@@ -27,4 +28,7 @@ class Command(BaseCommand):
 
         run_import(csv_path=csv_path, db_dsn=dsn, rejects_csv=rejects_csv)
 
+        # The ETL writes raw SQL, so no model signals fire for it.
+        search_cache.bump_version()
+
         self.stdout.write(self.style.SUCCESS("ETL finished"))
\ No newline at end of file
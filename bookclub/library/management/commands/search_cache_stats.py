@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from library import search_cache
+
+
+class Command(BaseCommand):
+    help = "Report the search cache hit rate, or invalidate every entry."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--invalidate",
+            action="store_true",
+            help="Bump the cache version so all cached searches are recomputed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["invalidate"]:
+            search_cache.bump_version()
+            self.stdout.write(self.style.SUCCESS("Search cache invalidated."))
+
+        stats = search_cache.get_stats()
+
+        self.stdout.write(f"Hits: {stats['hits']}")
+        self.stdout.write(f"Misses: {stats['misses']}")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1%}")
+        self.stdout.write(f"Version: {stats['version']}")
@@ -0,0 +1,83 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The document mirrors the old per-request expression
+# SearchVector("title", weight="A") + SearchVector("author__name", weight="B"),
+# using the database default text search configuration like SearchQuery does.
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION library_book_search_document(title text, author_name text)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector(coalesce(title, '')), 'A')
+        || setweight(to_tsvector(coalesce(author_name, '')), 'B')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION library_book_search_document_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_document := library_book_search_document(
+        NEW.title,
+        (SELECT name FROM library_author WHERE id = NEW.author_id)
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER library_book_search_document_update
+BEFORE INSERT OR UPDATE OF title, author_id ON library_book
+FOR EACH ROW EXECUTE FUNCTION library_book_search_document_trigger();
+
+CREATE OR REPLACE FUNCTION library_author_search_document_trigger()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE library_book
+    SET search_document = library_book_search_document(title, NEW.name)
+    WHERE author_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER library_author_search_document_update
+AFTER UPDATE OF name ON library_author
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION library_author_search_document_trigger();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS library_author_search_document_update ON library_author;
+DROP FUNCTION IF EXISTS library_author_search_document_trigger();
+DROP TRIGGER IF EXISTS library_book_search_document_update ON library_book;
+DROP FUNCTION IF EXISTS library_book_search_document_trigger();
+DROP FUNCTION IF EXISTS library_book_search_document(text, text);
+"""
+
+BACKFILL = """
+UPDATE library_book AS book
+SET search_document = library_book_search_document(book.title, author.name)
+FROM library_author AS author
+WHERE author.id = book.author_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_remove_book_text_embedding_book_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='book_search_document_gin'),
+        ),
+    ]
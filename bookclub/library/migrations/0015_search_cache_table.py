@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:05
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Deployments only run `migrate`, so the DatabaseCache table is
+    # created here. The command skips tables that already exist.
+    call_command(
+        "createcachetable",
+        database=schema_editor.connection.alias,
+        verbosity=0,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_search_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='is_collection',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        # Backfill with the same keywords as library.models.COLLECTION_KEYWORDS.
+        migrations.RunSQL(
+            sql="""
+                UPDATE library_book
+                SET is_collection = lower(title) LIKE ANY (ARRAY[
+                    '%collection%', '%boxed set%', '%box set%', '%omnibus%'
+                ]);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
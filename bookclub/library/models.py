@@ -1,10 +1,42 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator, MaxLengthValidator, MinLengthValidator
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 # Create your models here.
 
+# Title words marking a collection, omnibus or boxed set rather than a
+# single book. Such books are left out of recommendations.
+COLLECTION_KEYWORDS = (
+    "collection",
+    "boxed set",
+    "box set",
+    "omnibus",
+)
+
+
+def is_collection_title(title: str) -> bool:
+    title = title.lower()
+
+    return any(keyword in title for keyword in COLLECTION_KEYWORDS)
+
+
+def trigram_index(field_name, *, name):
+    """
+    GIN trigram index on UPPER(field). Django compiles icontains and
+    istartswith to UPPER(field) LIKE UPPER(...), so indexing the upper-cased
+    value lets the same index serve ILIKE-style lookups and the `%`
+    similarity operator (trigram matching is case-insensitive).
+    """
+    return GinIndex(
+        OpClass(Upper(field_name), name="gin_trgm_ops"),
+        name=name,
+    )
+
+
 class User(AbstractUser):
     MALE = "M"
     FEMALE = "F"
@@ -26,23 +58,43 @@ class Author(models.Model):
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            trigram_index("name", name="author_name_trgm"),
+        ]
+
 class Genre(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            trigram_index("name", name="genre_name_trgm"),
+        ]
+
 class Series(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
     def __str__(self):
         return self.name
+
+    class Meta:
+        indexes = [
+            trigram_index("name", name="series_name_trgm"),
+        ]
     
 class Publisher(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
     def __str__(self):
         return self.name
+
+    class Meta:
+        indexes = [
+            trigram_index("name", name="publisher_name_trgm"),
+        ]
     
 
 class Book(models.Model):
@@ -73,14 +125,34 @@ class Book(models.Model):
             MaxValueValidator(Decimal("5.0")),
     ])
 
+    # Weighted tsvector of title (A) and author name (B), maintained by
+    # database triggers (see migration 0012) so raw-SQL imports stay in sync.
+    search_document = SearchVectorField(null=True, editable=False)
+
+    # Derived from the title on save and by the ETL.
+    is_collection = models.BooleanField(default=False, editable=False)
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.is_collection = is_collection_title(self.title)
+
+        update_fields = kwargs.get("update_fields")
+
+        if update_fields is not None and "title" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "is_collection"}
+
+        super().save(*args, **kwargs)
+
     class Meta:
         indexes = [
-            models.Index(fields=["title"]),
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
             models.Index(fields=["author"]),
-            models.Index(fields=["-rating"]),
+            models.Index(fields=["-rating", "id"], name="book_rating_id_idx"),
+            models.Index(fields=["num_ratings", "id"], name="book_num_ratings_id_idx"),
+            GinIndex(fields=["search_document"], name="book_search_document_gin"),
+            trigram_index("title", name="book_title_trgm"),
         ]
 
         constraints = [
@@ -1,4 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
 
 class BookPagination(PageNumberPagination):
     page_size = 20
@@ -9,4 +20,153 @@ class ReviewPagination(PageNumberPagination):
     page_size = 5
 
 class SearchPagination(PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    page_size = 10
+
+
+def keyset_filter(ordering: list[str], values: list) -> Q:
+    """
+    Return the filter selecting rows that sort after `values`.
+
+    For ordering (a, -b, c) this is
+        a > va OR (a = va AND b < vb) OR (a = va AND b = vb AND c > vc)
+    plus a plain bound on the first field (a >= va), which the planner can
+    use as an index condition to start the scan at the cursor.
+    """
+    condition = Q()
+    equal = Q()
+
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+
+    first = ordering[0]
+    bound = "lte" if first.startswith("-") else "gte"
+
+    return Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & condition
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that encodes the last row's sort key.
+
+    Each page is a range query on the ordering columns instead of an
+    OFFSET, and no COUNT is run. The queryset ordering is used as the
+    sort key, with `id` appended as a tie-breaker when missing. Only
+    forward cursors are issued.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset) -> list[str]:
+        ordering = [
+            field
+            for field in queryset.query.order_by
+            if isinstance(field, str)
+        ]
+
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering.append("id")
+
+        return ordering
+
+    def encode_cursor(self, values: list) -> str:
+        data = json.dumps(values, cls=DjangoJSONEncoder).encode("utf-8")
+
+        return urlsafe_b64encode(data).decode("ascii")
+
+    def decode_cursor(self, request, ordering: list[str]) -> list | None:
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        if not cursor:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+        return values
+
+    def get_sort_key(self, row, ordering: list[str]) -> list:
+        fields = [field.lstrip("-") for field in ordering]
+
+        if isinstance(row, dict):
+            return [row[field] for field in fields]
+
+        return [getattr(row, field) for field in fields]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        ordering = self.get_ordering(queryset)
+        position = self.decode_cursor(request, ordering)
+
+        if position is not None:
+            try:
+                queryset = queryset.filter(keyset_filter(ordering, position))
+            except (DjangoValidationError, TypeError, ValueError):
+                # A value the sort field cannot hold, from a tampered cursor.
+                raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        self.next_position = None
+
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_position = self.get_sort_key(rows[-1], ordering)
+
+        return rows
+
+    def get_next_cursor(self) -> str | None:
+        if self.next_position is None:
+            return None
+
+        return self.encode_cursor(self.next_position)
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+
+        if cursor is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": None,
+            "results": data,
+        })
+
+
+class BookKeysetPagination(KeysetPagination):
+    page_size = BookPagination.page_size
+    max_page_size = BookPagination.max_page_size
+
+
+class SearchKeysetPagination(KeysetPagination):
+    page_size = SearchPagination.page_size
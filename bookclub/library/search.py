@@ -0,0 +1,205 @@
+"""
+Ranked book search over the Postgres full-text and trigram indexes.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db import connection, transaction
+from django.db.models import F, Q, Value, Case, When, FloatField, Count, Window
+from django.db.models.functions import Ln, Upper
+
+from .models import Book, Author, Genre
+
+DROPDOWN_SIMILARITY_THRESHOLD = 0.25
+FULL_SIMILARITY_THRESHOLD = 0.35
+
+# Upper bound on the author ids fed back into the book filter. Books by
+# authors past the cap still match whole words of the author's name
+# through search_document, but not a name prefix or a misspelling.
+MAX_MATCHED_AUTHORS = 50
+
+# Full-mode searches page over at most this many ranked ids.
+MAX_SEARCH_RESULTS = 1000
+
+
+@dataclass(slots=True)
+class BookSearchResult:
+    ids: list[int]
+    scores: list[float]
+    # Total number of matches; may exceed len(ids).
+    count: int
+
+
+@contextmanager
+def trigram_similarity_threshold(threshold: float):
+    """
+    Set pg_trgm.similarity_threshold, the cut-off used by the `%`
+    operator, for the queries run inside the block.
+
+    The setting is transaction-local, so the block runs in its own
+    transaction and querysets must be evaluated before it exits.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                [str(threshold)],
+            )
+
+        yield
+
+
+def get_similarity_threshold(is_dropdown: bool) -> float:
+    if is_dropdown:
+        return DROPDOWN_SIMILARITY_THRESHOLD
+
+    return FULL_SIMILARITY_THRESHOLD
+
+
+def get_trigram_threshold(is_dropdown: bool) -> float:
+    """
+    Return the `%` cut-off for a search mode.
+
+    Title similarity is weighted by 2 in the score, so a title alone
+    clears the score threshold once its similarity exceeds half of it.
+    """
+    return get_similarity_threshold(is_dropdown) / 2
+
+
+def match_author_ids(query: str) -> list[int]:
+    """
+    Return ids of authors whose name starts with or is similar to the
+    query. Both predicates are served by the author_name_trgm index.
+    Prefix matches come first, then the closest names, so the cap keeps
+    the best matches rather than an arbitrary subset.
+    """
+    return list(
+        Author.objects.alias(
+            name_upper=Upper("name"),
+            is_prefix=Case(
+                When(name__istartswith=query, then=Value(1)),
+                default=Value(0),
+            ),
+            similarity=TrigramSimilarity("name", query),
+        )
+        .filter(
+            Q(name__istartswith=query)
+            | Q(name_upper__trigram_similar=query)
+        )
+        .order_by("-is_prefix", "-similarity", "id")
+        .values_list("id", flat=True)[:MAX_MATCHED_AUTHORS]
+    )
+
+
+def search_books(query: str, *, is_dropdown: bool):
+    """
+    Return the ranked book queryset for a search query.
+
+    Every branch of the filter carries a predicate on library_book that
+    one of its indexes can answer (trigram `%` and ILIKE on book_title_trgm,
+    `@@` on book_search_document_gin, author_id on the author index), so
+    the planner can combine them with a BitmapOr instead of scanning the
+    table. Must be evaluated inside trigram_similarity_threshold().
+    """
+    similarity_threshold = get_similarity_threshold(is_dropdown)
+    search_query = SearchQuery(query, search_type="websearch")
+    author_ids = match_author_ids(query)
+
+    return (
+        Book.objects.select_related("author")
+        .alias(title_upper=Upper("title"))
+        .annotate(
+            rank=SearchRank(
+                F("search_document"),
+                search_query,
+            ),
+            similarity=(
+                TrigramSimilarity("title", query) * 2.0
+                + TrigramSimilarity("author__name", query) * 0.5
+            ),
+            prefix_score=Case(
+                When(
+                    title__istartswith=query,
+                    then=Value(2.0),
+                ),
+                When(
+                    author__name__istartswith=query,
+                    then=Value(1.0),
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+            popularity_score=Ln(F("num_ratings") + 1),
+        )
+        .annotate(
+            score=(
+                F("prefix_score") * 0.5
+                + F("rank") * 0.3
+                + F("similarity") * 0.15
+                + F("popularity_score") * 0.05
+            )
+        )
+        .filter(
+            Q(title__istartswith=query)
+            | Q(search_document=search_query, rank__gte=0.05)
+            | Q(
+                title_upper__trigram_similar=query,
+                similarity__gt=similarity_threshold,
+            )
+            | (
+                Q(author_id__in=author_ids)
+                & (
+                    Q(author__name__istartswith=query)
+                    | Q(similarity__gt=similarity_threshold)
+                )
+            )
+        )
+        .order_by("-score", "id")
+    )
+
+
+def rank_books(
+    query: str,
+    *,
+    is_dropdown: bool,
+    limit: int = MAX_SEARCH_RESULTS,
+) -> BookSearchResult:
+    """
+    Run the ranked search once, returning the top ids with their scores
+    and the total match count from a window aggregate over the same scan.
+    Must be called inside trigram_similarity_threshold().
+    """
+    rows = list(
+        search_books(query, is_dropdown=is_dropdown)
+        .annotate(total=Window(Count("id")))
+        .values_list("id", "score", "total")[:limit]
+    )
+
+    return BookSearchResult(
+        ids=[id for id, _, _ in rows],
+        scores=[score for _, score, _ in rows],
+        count=rows[0][2] if rows else 0,
+    )
+
+
+def get_books_in_order(ids: list[int]) -> list[Book]:
+    """
+    Load books by id with one query, preserving the order of `ids`.
+    """
+    books = Book.objects.select_related("author").in_bulk(ids)
+
+    return [books[id] for id in ids if id in books]
+
+
+def search_authors(query: str, limit: int = 5):
+    return Author.objects.filter(name__icontains=query).order_by("name")[:limit]
+
+
+def search_genres(query: str, limit: int = 5):
+    return Genre.objects.filter(name__icontains=query).order_by("name")[:limit]
@@ -0,0 +1,170 @@
+"""
+Shared cache for search responses.
+
+Entries are keyed on the normalised query and paging parameters and
+carry the current catalogue version in their key. Any change to books,
+authors or genres bumps the version, which orphans every cached entry
+at once; orphans then expire with their TTL.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+logger = logging.getLogger(__name__)
+
+# Entries and their locks must be seen by every worker.
+cache = ConnectionProxy(caches, "shared")
+
+VERSION_KEY = "search:version"
+HITS_KEY = "search:stats:hits"
+MISSES_KEY = "search:stats:misses"
+
+# Part of every key; raised when the shape of cached payloads changes so
+# entries in the old shape are never read.
+PAYLOAD_FORMAT = 2
+
+# How often waiting requests poll for a result another worker is computing.
+POLL_INTERVAL = 0.05
+
+# Local counters are added to the shared ones every this many lookups.
+STATS_FLUSH_EVERY = 100
+
+_stats_lock = threading.Lock()
+_local_stats = {"hits": 0, "misses": 0}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def get_version() -> int:
+    version = cache.get(VERSION_KEY)
+
+    if version is None:
+        # Start from the clock rather than 1 so a lost version key can
+        # never resurrect entries written under an older version.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+
+    return version
+
+
+def bump_version() -> None:
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def make_key(
+    query: str,
+    *,
+    mode: str,
+    page: str | None,
+    page_size: str | None,
+    cursor: str | None,
+) -> str:
+    params = json.dumps(
+        [normalize_query(query), mode, page, page_size, cursor],
+    )
+    digest = hashlib.sha1(params.encode("utf-8")).hexdigest()
+
+    return f"search:{PAYLOAD_FORMAT}:{get_version()}:{digest}"
+
+
+def _record(outcome: str) -> None:
+    with _stats_lock:
+        _local_stats[outcome] += 1
+
+        if _local_stats["hits"] + _local_stats["misses"] < STATS_FLUSH_EVERY:
+            return
+
+        hits = _local_stats["hits"]
+        misses = _local_stats["misses"]
+        _local_stats["hits"] = 0
+        _local_stats["misses"] = 0
+
+    for key, delta in ((HITS_KEY, hits), (MISSES_KEY, misses)):
+        if not delta:
+            continue
+
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, timeout=None)
+
+
+def get_stats() -> dict:
+    """
+    Return the shared hit and miss counters, including this process's
+    unflushed counts.
+    """
+    with _stats_lock:
+        hits = (cache.get(HITS_KEY) or 0) + _local_stats["hits"]
+        misses = (cache.get(MISSES_KEY) or 0) + _local_stats["misses"]
+
+    total = hits + misses
+
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "version": cache.get(VERSION_KEY),
+    }
+
+
+def get_or_compute(key: str, compute, *, should_cache=None):
+    """
+    Return the cached payload for `key`, computing and storing it on a
+    miss. Payloads rejected by `should_cache` are returned but not stored.
+
+    Only one worker computes a missing key: the others wait for its
+    result for up to SEARCH_CACHE_LOCK_TIMEOUT seconds before computing
+    it themselves.
+    """
+    payload = cache.get(key)
+
+    if payload is not None:
+        _record("hits")
+        return payload
+
+    _record("misses")
+
+    lock_key = f"{key}:lock"
+    lock_timeout = settings.SEARCH_CACHE_LOCK_TIMEOUT
+
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            payload = compute()
+
+            if should_cache is None or should_cache(payload):
+                cache.set(key, payload, timeout=settings.SEARCH_CACHE_TTL)
+        finally:
+            cache.delete(lock_key)
+
+        return payload
+
+    deadline = time.monotonic() + lock_timeout
+
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+
+        payload = cache.get(key)
+
+        if payload is not None:
+            return payload
+
+        if cache.get(lock_key) is None:
+            # The computing worker failed without storing a result.
+            break
+    else:
+        logger.warning("Timed out waiting for search cache key %s.", key)
+
+    return compute()
@@ -1,19 +1,20 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-from django.contrib.postgres.search import (
-    SearchQuery,
-    SearchRank,
-    SearchVector,
-    TrigramSimilarity,
+from . import autocomplete, search_cache
+from .hybrid_search import hybrid_search
+from .search import (
+    get_books_in_order,
+    get_trigram_threshold,
+    rank_books,
+    search_authors,
+    search_books,
+    search_genres,
+    trigram_similarity_threshold,
 )
 
-from django.db.models import F, Q, Value, Case, When, FloatField
-from django.db.models.functions import Ln
-
-from .models import Book, Author, Genre
-
 from .serializers import (
     SearchBookSerializer,
     SearchAuthorSerializer,
@@ -21,9 +22,65 @@ from .serializers import (
     SemanticSearchBookSerializer
 )
 
-from .pagination import SearchPagination
+from .pagination import SearchPagination, SearchKeysetPagination
 import logging
 
+
+# Cached search payloads are shared by every request with the same query,
+# so they store the query parameters of the next and previous pages and
+# each response builds its links from its own URL.
+
+def next_page_position(paginator) -> dict | None:
+    if not paginator.page.has_next():
+        return None
+
+    return {paginator.page_query_param: paginator.page.next_page_number()}
+
+
+def previous_page_position(paginator) -> dict | None:
+    if not paginator.page.has_previous():
+        return None
+
+    page_number = paginator.page.previous_page_number()
+
+    # The first page is linked without a page parameter, as DRF does.
+    return {paginator.page_query_param: page_number if page_number > 1 else None}
+
+
+def cursor_position(paginator) -> dict | None:
+    cursor = paginator.get_next_cursor()
+
+    if cursor is None:
+        return None
+
+    return {paginator.cursor_query_param: cursor}
+
+
+def build_page_link(request, position: dict | None) -> str | None:
+    if position is None:
+        return None
+
+    url = request.build_absolute_uri()
+
+    for name, value in position.items():
+        if value is None:
+            url = remove_query_param(url, name)
+        else:
+            url = replace_query_param(url, name, value)
+
+    return url
+
+
+def with_page_links(request, payload: dict) -> dict:
+    if "next" not in payload:
+        return payload
+
+    return {
+        **payload,
+        "next": build_page_link(request, payload["next"]),
+        "previous": build_page_link(request, payload["previous"]),
+    }
+
  
 class SearchBooksAPIView(APIView):
     permission_classes = [AllowAny]
@@ -52,89 +109,121 @@ class SearchBooksAPIView(APIView):
                 }
             )
 
-        similarity_threshold = 0.25 if is_dropdown else 0.35
+        if is_dropdown:
+            index = autocomplete.get_index()
 
-        # BOOKS
-        books = (
-            Book.objects.annotate(
-                search=(
-                    SearchVector("title", weight="A")
-                    + SearchVector("author__name", weight="B")
-                )
-            )
-            .annotate(
-                rank=SearchRank(
-                    F("search"),
-                    SearchQuery(query, search_type="websearch"),
-                ),
-                similarity=(
-                    TrigramSimilarity("title", query) * 2.0
-                    + TrigramSimilarity("author__name", query) * 0.5
-                ),
-                prefix_score=Case(
-                    When(
-                        title__istartswith=query,
-                        then=Value(2.0),
-                    ),
-                    When(
-                        author__name__istartswith=query,
-                        then=Value(1.0),
-                    ),
-                    default=Value(0.0),
-                    output_field=FloatField(),
-                ),
-                popularity_score=Ln(F("num_ratings") + 1),
-            )
-            .annotate(
-                score=(
-                    F("prefix_score") * 0.5
-                    + F("rank") * 0.3
-                    + F("similarity") * 0.15
-                    + F("popularity_score") * 0.05
-                )
-            )
-            .filter(
-                Q(title__istartswith=query)
-                | Q(author__name__istartswith=query)
-                | Q(rank__gte=0.05)
-                | Q(similarity__gt=similarity_threshold)
-            )
-            .order_by("-score")
+            # Fall through to the fuzzy database search for typos the
+            # prefix index cannot match.
+            if index is not None:
+                results = index.search(query, limit=5)
+
+                if results["books"]:
+                    return Response(results)
+
+        cache_key = search_cache.make_key(
+            query,
+            mode=mode,
+            page=request.query_params.get("page"),
+            page_size=request.query_params.get("page_size"),
+            cursor=request.query_params.get("cursor"),
         )
 
-        # AUTHORS
-        authors = Author.objects.filter(name__icontains=query).order_by("name")[:5]
+        payload = search_cache.get_or_compute(
+            cache_key,
+            lambda: self._search(request, query, is_dropdown),
+            # Degraded hybrid results are not kept for the whole TTL.
+            should_cache=lambda payload: not payload.get("skipped"),
+        )
 
-        # GENRES
-        genres = Genre.objects.filter(name__icontains=query).order_by("name")[:5]
+        return Response(with_page_links(request, payload))
 
-        # DROPDOWN MODE
-        if is_dropdown:
-            books = books[:5]
+    def _search(self, request, query, is_dropdown) -> dict:
+        if request.query_params.get("mode") == "hybrid":
+            return self._hybrid_search(request, query)
 
-            return Response(
-                {
+        with trigram_similarity_threshold(get_trigram_threshold(is_dropdown)):
+            authors = SearchAuthorSerializer(search_authors(query), many=True).data
+
+            genres = SearchGenreSerializer(search_genres(query), many=True).data
+
+            # DROPDOWN MODE
+            if is_dropdown:
+                books = search_books(query, is_dropdown=True)[:5]
+
+                return {
                     "books": SearchBookSerializer(books, many=True).data,
-                    "authors": SearchAuthorSerializer(authors, many=True).data,
-                    "genres": SearchGenreSerializer(genres, many=True).data,
+                    "authors": authors,
+                    "genres": genres,
                 }
-            )
 
-        # FULL SEARCH MODE
+            # FULL SEARCH MODE, keyset pages (opted into with ?cursor=)
+            if "cursor" in request.query_params:
+                paginator = SearchKeysetPagination()
+
+                rows = paginator.paginate_queryset(
+                    search_books(query, is_dropdown=False).values("id", "score"),
+                    request,
+                )
+
+                return {
+                    "books": SearchBookSerializer(
+                        get_books_in_order([row["id"] for row in rows]),
+                        many=True,
+                    ).data,
+                    "next": cursor_position(paginator),
+                    "previous": None,
+                    "authors": authors,
+                    "genres": genres,
+                }
+
+            # FULL SEARCH MODE
+            result = rank_books(query, is_dropdown=False)
+
+        # Page over the ranked ids so the scoring query is not re-run
+        # for the page and the count.
         paginator = SearchPagination()
 
-        paginated_books = paginator.paginate_queryset(books, request)
-
-        return Response(
-            {
-                "books": SearchBookSerializer(paginated_books, many=True).data,
-                "books_count": books.count(),
-                "next": paginator.get_next_link(),
-                "previous": paginator.get_previous_link(),
-                "authors": SearchAuthorSerializer(authors, many=True).data,
-                "genres": SearchGenreSerializer(genres, many=True).data,
-            }
-        )
+        page_ids = paginator.paginate_queryset(result.ids, request)
+
+        return {
+            "books": SearchBookSerializer(
+                get_books_in_order(page_ids),
+                many=True,
+            ).data,
+            "books_count": result.count,
+            "next": next_page_position(paginator),
+            "previous": previous_page_position(paginator),
+            "authors": authors,
+            "genres": genres,
+        }
+
+
+    def _hybrid_search(self, request, query) -> dict:
+        result = hybrid_search(query)
+
+        paginator = SearchPagination()
+
+        page_ids = paginator.paginate_queryset(result.ids, request)
+
+        return {
+            "books": SearchBookSerializer(
+                get_books_in_order(page_ids),
+                many=True,
+            ).data,
+            "books_count": len(result.ids),
+            "next": next_page_position(paginator),
+            "previous": previous_page_position(paginator),
+            "authors": SearchAuthorSerializer(
+                search_authors(query),
+                many=True,
+            ).data,
+            "genres": SearchGenreSerializer(
+                search_genres(query),
+                many=True,
+            ).data,
+            "timings": result.timings,
+            "skipped": result.skipped,
+        }
 
 
 class SemanticSearchAPIView(APIView):
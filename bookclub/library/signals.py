@@ -0,0 +1,31 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, search_cache
+from .models import Author, Book, Genre
+
+
+@receiver(post_save, sender=Book)
+def update_autocomplete_on_book_save(sender, instance, **kwargs):
+    autocomplete.book_saved(instance)
+
+
+@receiver(post_delete, sender=Book)
+def update_autocomplete_on_book_delete(sender, instance, **kwargs):
+    autocomplete.book_deleted(instance.id)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_search_cache(sender, **kwargs):
+    search_cache.bump_version()
+
+
+@receiver(m2m_changed, sender=Book.genres.through)
+def invalidate_search_cache_on_genres_change(sender, action, **kwargs):
+    if action.startswith("post_"):
+        search_cache.bump_version()
@@ -1,3 +1,530 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import search_cache
+from .autocomplete import AutocompleteIndex, book_document, name_document
+from . import hybrid_search as hybrid_search_module
+from .hybrid_search import hybrid_search, reciprocal_rank_fusion
+from .models import Author, Book, Genre, User, is_collection_title
+from .search import (
+    MAX_MATCHED_AUTHORS,
+    get_trigram_threshold,
+    match_author_ids,
+    rank_books,
+    search_authors,
+    search_books,
+    search_genres,
+    trigram_similarity_threshold,
+)
+
+
+class SearchIndexTests(TestCase):
+    """
+    The test tables are tiny, so sequential scans are disabled to make
+    the planner show whether an index can serve each predicate at all.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name="Ursula K. Le Guin")
+        Genre.objects.create(name="Fantasy")
+
+        Book.objects.bulk_create([
+            Book(
+                source="test",
+                source_row_id=str(index),
+                title=title,
+                author=author,
+            )
+            for index, title in enumerate([
+                "A Wizard of Earthsea",
+                "The Left Hand of Darkness",
+                "The Dispossessed",
+            ])
+        ])
+
+    def explain(self, queryset) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        return queryset.explain()
+
+    def test_search_document_is_populated_by_trigger(self):
+        book = Book.objects.get(title="The Dispossessed")
+
+        self.assertIn("dispossess", book.search_document)
+        self.assertIn("guin", book.search_document)
+
+    def test_search_document_follows_author_rename(self):
+        Author.objects.update(name="Ursula Le Guin Renamed")
+
+        book = Book.objects.get(title="The Dispossessed")
+
+        self.assertIn("renam", book.search_document)
+
+    def test_book_search_uses_indexes(self):
+        with trigram_similarity_threshold(get_trigram_threshold(False)):
+            plan = self.explain(search_books("wizard", is_dropdown=False))
+
+        self.assertIn("BitmapOr", plan)
+        self.assertIn("book_title_trgm", plan)
+        self.assertIn("book_search_document_gin", plan)
+        self.assertNotIn("Seq Scan on library_book", plan)
+
+    def test_dropdown_search_uses_indexes(self):
+        with trigram_similarity_threshold(get_trigram_threshold(True)):
+            plan = self.explain(search_books("ursula", is_dropdown=True))
+
+        self.assertIn("book_title_trgm", plan)
+        self.assertNotIn("Seq Scan on library_book", plan)
+
+    def test_author_lookup_uses_trigram_index(self):
+        plan = self.explain(search_authors("guin"))
+
+        self.assertIn("author_name_trgm", plan)
+
+    def test_genre_lookup_uses_trigram_index(self):
+        plan = self.explain(search_genres("fanta"))
+
+        self.assertIn("genre_name_trgm", plan)
+
+    def test_book_search_matches(self):
+        with trigram_similarity_threshold(get_trigram_threshold(False)):
+            titles = [
+                book.title
+                for book in search_books("earthsea", is_dropdown=False)
+            ]
+
+        self.assertEqual(titles, ["A Wizard of Earthsea"])
+
+    def test_rank_books_returns_ids_and_total_in_one_ranking_query(self):
+        # One query matches author ids, the other ranks and counts books.
+        with trigram_similarity_threshold(get_trigram_threshold(False)):
+            with self.assertNumQueries(2):
+                result = rank_books("le guin", is_dropdown=False, limit=2)
+
+        self.assertEqual(len(result.ids), 2)
+        self.assertEqual(result.count, 3)
+        self.assertEqual(result.scores, sorted(result.scores, reverse=True))
+
+
+class MatchAuthorIdsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.similar = Author.objects.create(name="K. Le Guin Ursula")
+        Author.objects.bulk_create([
+            Author(name=f"Ursula K. Le Guin Reading Circle {index}")
+            for index in range(MAX_MATCHED_AUTHORS + 10)
+        ])
+        cls.exact = Author.objects.create(name="Ursula K. Le Guin")
+
+        for author in Author.objects.all():
+            Book.objects.create(
+                source="test",
+                source_row_id=str(author.id),
+                title=f"Book {author.id}",
+                author=author,
+            )
+
+    def test_cap_keeps_the_best_matches(self):
+        author_ids = match_author_ids("ursula k. le guin")
+
+        self.assertEqual(len(author_ids), MAX_MATCHED_AUTHORS)
+        self.assertEqual(author_ids[0], self.exact.id)
+        self.assertNotIn(self.similar.id, author_ids)
+
+    def test_books_by_authors_past_the_cap_need_a_full_word_match(self):
+        with trigram_similarity_threshold(get_trigram_threshold(False)):
+            partial = rank_books("ursula k. le gu", is_dropdown=False)
+            full = rank_books("ursula k. le guin", is_dropdown=False)
+
+        # A partial name reaches books only through the capped author ids.
+        self.assertEqual(partial.count, MAX_MATCHED_AUTHORS)
+        # Whole words also match the author name in the search document.
+        self.assertEqual(full.count, Author.objects.count())
+
+
+class AutocompleteIndexTests(SimpleTestCase):
+    def setUp(self):
+        books = [
+            book_document(
+                id=index,
+                title=title,
+                cover=None,
+                author_id=1,
+                author_name="J. R. R. Tolkien",
+                num_ratings=num_ratings,
+            )
+            for index, (title, num_ratings) in enumerate([
+                ("The Hobbit", 300),
+                ("The Lord of the Rings", 500),
+                ("Hobbit Tales", 10),
+            ])
+        ]
+
+        self.index = AutocompleteIndex(
+            books,
+            [name_document(id=1, name="J. R. R. Tolkien", popularity=810)],
+            [name_document(id=1, name="Fantasy", popularity=810)],
+        )
+
+    def titles(self, query):
+        return [book["title"] for book in self.index.search(query)["books"]]
+
+    def test_orders_prefix_matches_by_popularity(self):
+        self.assertEqual(self.titles("hob"), ["The Hobbit", "Hobbit Tales"])
+
+    def test_matches_author_and_later_words(self):
+        self.assertEqual(self.titles("rings"), ["The Lord of the Rings"])
+        self.assertEqual(len(self.titles("tolk")), 3)
+
+    def test_normalises_case_and_accents(self):
+        self.assertEqual(self.titles("HÓBBIT t"), ["Hobbit Tales"])
+
+    def test_applies_saved_and_deleted_books(self):
+        self.index.upsert_book(
+            book_document(
+                id=0,
+                title="The Hobbit, Illustrated",
+                cover=None,
+                author_id=1,
+                author_name="J. R. R. Tolkien",
+                num_ratings=5,
+            )
+        )
+        self.index.remove_book(2)
+
+        self.assertEqual(self.titles("hob"), ["The Hobbit, Illustrated"])
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_ids_in_both_rankings_rank_first(self):
+        fused = reciprocal_rank_fusion([1, 2, 3], [4, 3, 5], k=60)
+
+        self.assertEqual([id for id, _ in fused][:2], [3, 1])
+        self.assertAlmostEqual(fused[0][1], 1 / 63 + 1 / 62)
+
+    def test_deduplicates_ids(self):
+        fused = reciprocal_rank_fusion([1, 2], [2, 1])
+
+        self.assertEqual(sorted(id for id, _ in fused), [1, 2])
+
+
+class CollectionTitleTests(SimpleTestCase):
+    def test_matches_collection_keywords_case_insensitively(self):
+        self.assertTrue(is_collection_title("The Complete Sherlock Holmes Collection"))
+        self.assertTrue(is_collection_title("Harry Potter Boxed Set"))
+        self.assertTrue(is_collection_title("The Hitchhiker's Guide OMNIBUS"))
+
+    def test_ignores_single_books(self):
+        self.assertFalse(is_collection_title("The Collector"))
+        self.assertFalse(is_collection_title("Dune"))
+
+
+class UserRecommendationsAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="secret")
+        cls.other = User.objects.create_user(username="other", password="secret")
+
+    def url(self, user):
+        return f"/api/users/{user.id}/recommendations/"
+
+    def test_requires_authentication(self):
+        response = self.client.get(self.url(self.owner))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_other_users_recommendations_are_forbidden(self):
+        self.client.force_login(self.other)
+
+        response = self.client.get(self.url(self.owner))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_own_recommendations(self):
+        self.client.force_login(self.owner)
+
+        response = self.client.get(self.url(self.owner))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+
+@mock.patch("library.views.get_summary_provider")
+@mock.patch("library.views.ExplanationService")
+class ExplanationStreamLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", password="secret")
+        author = Author.objects.create(name="Author")
+
+        cls.source, cls.recommended = Book.objects.bulk_create([
+            Book(source="test", source_row_id="1", title="Source", author=author),
+            Book(source="test", source_row_id="2", title="Recommended", author=author),
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+        slots = threading.BoundedSemaphore(1)
+        patcher = mock.patch("library.views._explanation_streams", slots)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.slots = slots
+
+    def stream(self):
+        return self.client.get(
+            f"/api/books/{self.source.id}/recommendations/{self.recommended.id}/explanation/",
+            {"stream": "true"},
+        )
+
+    def test_streams_past_the_cap_are_refused(self, service, provider):
+        self.slots.acquire()
+
+        response = self.stream()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+
+    def test_closing_the_response_frees_the_slot(self, service, provider):
+        deltas = (delta for delta in ["An ", "explanation"])
+        service.return_value.stream_book_recommendation.return_value = deltas
+
+        response = self.stream()
+        first = next(iter(response.streaming_content))
+
+        self.assertIn(b"An ", first)
+        self.assertFalse(self.slots.acquire(blocking=False))
+
+        # What the server does when the client disconnects mid-stream.
+        response.close()
+
+        self.assertTrue(self.slots.acquire(blocking=False))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name="Author")
+
+        Book.objects.bulk_create([
+            Book(
+                source="test",
+                source_row_id=str(index),
+                title=f"Book {index}",
+                author=author,
+                rating=rating,
+            )
+            for index, rating in enumerate([
+                Decimal("4.5"),
+                Decimal("3.0"),
+                Decimal("4.5"),
+                Decimal("4.5"),
+                Decimal("5.0"),
+                Decimal("3.0"),
+                Decimal("4.5"),
+            ])
+        ])
+
+    def encode(self, values):
+        return urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+    def test_cursor_walks_every_row_once_across_rating_ties(self):
+        expected = list(
+            Book.objects.order_by("-rating", "id").values_list("id", flat=True)
+        )
+
+        ids = []
+        url = "/api/books/?cursor=&page_size=2"
+
+        while url:
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+
+            data = response.json()
+            ids.extend(book["id"] for book in data["results"])
+            url = data["next"]
+
+        self.assertEqual(ids, expected)
+
+    def test_cursor_round_trips_decimal_sort_key(self):
+        response = self.client.get("/api/books/?cursor=&page_size=3")
+        next_url = response.json()["next"]
+
+        # The third row is a 4.5 tie, so the next page must continue
+        # within the same rating.
+        third = response.json()["results"][-1]
+        following = self.client.get(next_url).json()["results"][0]
+
+        self.assertEqual(third["rating"], following["rating"])
+        self.assertGreater(following["id"], third["id"])
+
+    def test_invalid_cursors_are_rejected(self):
+        for cursor in [
+            "not base64!",
+            self.encode({"rating": "4.5"}),
+            self.encode(["4.5"]),
+            self.encode(["high", 1]),
+            self.encode(["4.5", "one"]),
+            self.encode(["4.5", None]),
+            self.encode([["4.5"], {"id": 1}]),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/books/", {"cursor": cursor})
+
+                self.assertEqual(response.status_code, 400)
+
+
+class SearchCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name="Ursula K. Le Guin")
+
+        Book.objects.bulk_create([
+            Book(
+                source="test",
+                source_row_id=str(index),
+                title=f"Earthsea {index}",
+                author=cls.author,
+            )
+            for index in range(12)
+        ])
+
+    def make_key(self, query="earthsea", **params):
+        return search_cache.make_key(
+            query,
+            mode=params.get("mode", "full"),
+            page=params.get("page"),
+            page_size=params.get("page_size"),
+            cursor=params.get("cursor"),
+        )
+
+    def assertBumps(self, change):
+        version = search_cache.get_version()
+
+        change()
+
+        self.assertNotEqual(search_cache.get_version(), version)
+
+    def test_key_normalises_the_query(self):
+        self.assertEqual(self.make_key("  Earthsea   WIZARD "), self.make_key("earthsea wizard"))
+
+    def test_key_varies_with_mode_and_paging(self):
+        keys = {
+            self.make_key(),
+            self.make_key(mode="hybrid"),
+            self.make_key(page="2"),
+            self.make_key(page_size="5"),
+            self.make_key(cursor=""),
+        }
+
+        self.assertEqual(len(keys), 5)
+
+    def test_catalogue_changes_bump_the_version(self):
+        book = Book.objects.first()
+
+        self.assertBumps(lambda: book.save())
+        self.assertBumps(lambda: Author.objects.create(name="Octavia E. Butler"))
+        self.assertBumps(lambda: self.author.save())
+        self.assertBumps(lambda: Genre.objects.create(name="Fantasy"))
+        self.assertBumps(lambda: book.genres.add(Genre.objects.create(name="Classics")))
+        self.assertBumps(lambda: book.delete())
+
+    def test_version_bump_changes_the_key(self):
+        key = self.make_key()
+
+        search_cache.bump_version()
+
+        self.assertNotEqual(self.make_key(), key)
+
+    def test_csv_import_bumps_the_version(self):
+        with mock.patch("library.management.commands.import_books_csv.run_import"):
+            self.assertBumps(
+                lambda: call_command("import_books_csv", csv="books.csv", stdout=StringIO())
+            )
+
+    @override_settings(ALLOWED_HOSTS=["*"])
+    def test_cached_page_links_follow_the_request_host(self):
+        first = self.client.get("/api/search/", {"q": "earthsea"}, HTTP_HOST="a.example")
+        second = self.client.get("/api/search/", {"q": "earthsea"}, HTTP_HOST="b.example")
+
+        self.assertTrue(first.json()["next"].startswith("http://a.example/api/search/"))
+        self.assertTrue(second.json()["next"].startswith("http://b.example/api/search/"))
+        self.assertIn("page=2", second.json()["next"])
+        self.assertIsNone(second.json()["previous"])
+
+        with mock.patch.object(search_cache, "_record") as record:
+            self.client.get("/api/search/", {"q": "earthsea"})
+
+        record.assert_called_once_with("hits")
+
+    def test_previous_link_to_the_first_page_drops_the_page_parameter(self):
+        response = self.client.get("/api/search/", {"q": "earthsea", "page": "2"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("page=", response.json()["previous"])
+        self.assertIsNone(response.json()["next"])
+
+
+@override_settings(HYBRID_SEARCH_TIMEOUT_MS=50, HYBRID_SEARCH_WORKERS=2)
+class HybridSearchPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(hybrid_search_module._warm_up_started.clear)
+
+        lexical = mock.patch.object(hybrid_search_module, "_lexical_ids", return_value=[1, 2])
+        lexical.start()
+        self.addCleanup(lexical.stop)
+
+        warm_up = mock.patch.object(hybrid_search_module, "_warm_up")
+        self.warm_up = warm_up.start()
+        self.addCleanup(warm_up.stop)
+
+    def test_semantic_waits_for_the_model_to_load(self):
+        with mock.patch("ai.services.embeddings.EmbeddingService.is_ready", return_value=False):
+            first = hybrid_search("earthsea")
+            second = hybrid_search("earthsea")
+
+        self.assertEqual(first.skipped, ["semantic"])
+        self.assertEqual(second.ids, [1, 2])
+
+        # Let the background warm-up run.
+        time.sleep(0.1)
+        self.warm_up.assert_called_once()
+
+    def test_abandoned_retrievals_do_not_queue_later_requests(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_semantic(query, limit):
+            release.wait(5)
+            return [3]
+
+        with (
+            mock.patch("ai.services.embeddings.EmbeddingService.is_ready", return_value=True),
+            mock.patch.object(hybrid_search_module, "_semantic_ids", side_effect=slow_semantic) as semantic,
+        ):
+            self.assertEqual(hybrid_search("earthsea").skipped, ["semantic"])
+
+            # The timed-out call still holds its thread, so the next
+            # request skips the source without submitting it.
+            self.assertEqual(hybrid_search("earthsea").skipped, ["semantic"])
+            self.assertEqual(semantic.call_count, 1)
+
+            release.set()
+
+            while hybrid_search_module._abandoned["semantic"]:
+                time.sleep(0.01)
+
+            self.assertEqual(hybrid_search("earthsea").skipped, [])
+            self.assertEqual(semantic.call_count, 2)
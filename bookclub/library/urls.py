@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, RandomAuthorAPIView, RandomGenreAPIView, AuthorViewSet, GenreViewSet, ReviewViewSet, LoginAPIView, LogoutAPIView, MeAPIView, SignupAPIView, CSRFAPIView, UserProfileAPIView, AddToListAPIView,DeleteListAPIView, RemoveFromListAPIView, UserListAPIView, health_check, BookRecommendationsAPIVieW, BookRecommendationExplanationAPIView, SeriesDetailAPIView
+from .views import BookViewSet, RandomAuthorAPIView, RandomGenreAPIView, AuthorViewSet, GenreViewSet, ReviewViewSet, LoginAPIView, LogoutAPIView, MeAPIView, SignupAPIView, CSRFAPIView, UserProfileAPIView, AddToListAPIView,DeleteListAPIView, RemoveFromListAPIView, UserListAPIView, health_check, BookRecommendationsAPIVieW, BulkBookRecommendationsAPIView, UserRecommendationsAPIView, BookRecommendationExplanationAPIView, SeriesDetailAPIView
 from .search_views import SearchBooksAPIView, SemanticSearchAPIView
 from . import views
 
@@ -35,5 +35,7 @@ urlpatterns = [
 
     # recommandations
     path("api/books/<int:book_id>/recommendations/", BookRecommendationsAPIVieW.as_view()),
+    path("api/recommendations/", BulkBookRecommendationsAPIView.as_view()),
+    path("api/users/<int:user_id>/recommendations/", UserRecommendationsAPIView.as_view()),
     path("api/books/<int:source_id>/recommendations/<int:recommended_id>/explanation/", BookRecommendationExplanationAPIView.as_view()),
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db.models import Count
 from django.db import connection
 from django.contrib import messages
@@ -11,7 +12,7 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.filters import SearchFilter, OrderingFilter
-from .pagination import BookPagination, ReviewPagination
+from .pagination import BookPagination, BookKeysetPagination, ReviewPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
@@ -20,6 +21,8 @@ from .models import Book, Author, User, Genre, Review, List, ListBook, Series
 # from .documents import BookDocument, AuthorDocument, GenreDocument
 # from elasticsearch_dsl.query import Match
 import json
+import logging
+import threading
 from .serializers import BookSerializer, AuthorSerializer, BookListSerializer, GenreSerializer, ReviewSerializer, ListSerializer
 from rest_framework import  status
 from rest_framework.response import Response
@@ -34,6 +37,8 @@ from ai.services.recommendations import RecommendationService
 from ai.services.explanations import ExplanationService
 from ai.services.summary.factory import get_summary_provider
 
+logger = logging.getLogger(__name__)
+
 # ====== API Views ======
 
 # Helper Functions
@@ -165,6 +170,15 @@ class BookViewSet(ReadOnlyModelViewSet):
 
     ordering_fields = ["rating", "title", "num_ratings", "id"]
     ordering = ["-rating"]
+
+    @property
+    def paginator(self):
+        # Clients opt into keyset pagination by sending ?cursor=
+        # (empty for the first page); page numbers keep working otherwise.
+        if not hasattr(self, "_paginator") and "cursor" in self.request.query_params:
+            self._paginator = BookKeysetPagination()
+
+        return super().paginator
         
     def get_queryset(self):
         return (
@@ -196,29 +210,208 @@ class BookRecommendationsAPIVieW(APIView):
 
         return Response(serializer.data)
 
+class BulkBookRecommendationsAPIView(APIView):
+    """
+    Recommendations for many books in one call, e.g. "more like these"
+    on a list page. Sources come from ?books=1,2,3 or from ?list=<id>;
+    a list's books are never recommended back. ?exclude= drops more ids.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        source_ids = self._parse_ids(request, "books")
+        exclude_ids = self._parse_ids(request, "exclude")
+
+        list_id = request.query_params.get("list")
+
+        if list_id is not None:
+            book_list = get_object_or_404(List, pk=list_id)
+            listed_ids = list(
+                book_list.list_books
+                .order_by("id")
+                .values_list("book_id", flat=True)
+            )
+
+            source_ids = source_ids or listed_ids
+            exclude_ids.extend(listed_ids)
+
+        if not source_ids:
+            raise ValidationError({"books": "Provide book ids or a list."})
+
+        max_sources = settings.RECOMMENDATIONS_BULK_MAX_SOURCES
+
+        if len(source_ids) > max_sources:
+            raise ValidationError(
+                {"books": f"At most {max_sources} books per request."}
+            )
+
+        try:
+            limit = int(request.query_params.get("limit", 8))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+
+        if not 1 <= limit <= 50:
+            raise ValidationError({"limit": "Must be between 1 and 50."})
+
+        books_by_id = Book.objects.in_bulk(source_ids)
+        books = [
+            books_by_id[book_id]
+            for book_id in dict.fromkeys(source_ids)
+            if book_id in books_by_id
+        ]
+
+        recommendations = RecommendationService().recommend_many(
+            books,
+            limit=limit,
+            exclude_book_ids=exclude_ids,
+        )
+
+        return Response({
+            "results": [
+                {
+                    "book_id": book_id,
+                    "recommendations": BookListSerializer(
+                        [candidate.book for candidate in candidates],
+                        many=True,
+                    ).data,
+                }
+                for book_id, candidates in recommendations.by_source.items()
+            ],
+            "combined": BookListSerializer(
+                [candidate.book for candidate in recommendations.combined],
+                many=True,
+            ).data,
+        })
+
+    def _parse_ids(self, request, name):
+        value = request.query_params.get(name, "")
+
+        try:
+            return [int(id) for id in value.split(",") if id.strip()]
+        except ValueError:
+            raise ValidationError({name: "Must be comma-separated ids."})
+
+class UserRecommendationsAPIView(APIView):
+    # Built from the user's own reviews and lists, so only they see it.
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, user_id):
+        if user_id != request.user.id:
+            raise PermissionDenied("You can only view your own recommendations.")
+
+        recommendations = RecommendationService().recommend_for_user(request.user.id)
+
+        serializer = BookListSerializer(
+            [candidate.book for candidate in recommendations],
+            many=True,
+        )
+
+        return Response(serializer.data)
+
+# Free slots for explanation streams in this process.
+_explanation_streams = threading.BoundedSemaphore(settings.EXPLANATION_MAX_STREAMS)
+
+
+class ExplanationEvents:
+    """
+    Server-sent events for one explanation stream. The server closes the
+    response when it finishes or the client disconnects, which closes the
+    explanation stream (and with it the provider connection) and frees the
+    stream slot, even if the events were never read.
+    """
+
+    def __init__(self, events, stream):
+        self._events = events
+        self._stream = stream
+        self._closed = False
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        if self._closed:
+            return
+
+        self._closed = True
+
+        try:
+            self._events.close()
+            self._stream.close()
+        finally:
+            _explanation_streams.release()
+
+
 class BookRecommendationExplanationAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, source_id, recommended_id):
+        # The prompt and the stored explanation's hash read both.
+        books = Book.objects.select_related("author").prefetch_related("genres")
+
         source_book = get_object_or_404(
-            Book,
+            books,
             pk=source_id
         )
 
         recommended_book = get_object_or_404(
-            Book,
+            books,
             pk=recommended_id
         )
 
         provider = get_summary_provider()
         service = ExplanationService(provider=provider)
 
+        if request.query_params.get("stream") == "true":
+            return self._stream(service, source_book, recommended_book)
+
         explanation = service.explain_book_recommendation(source_book, recommended_book)
 
         return Response({
             "explanation": explanation
         })
 
+    def _stream(self, service, source_book, recommended_book):
+        """
+        Stream the explanation as server-sent events: "delta" events with
+        text chunks, then "done", or "error" if generation fails.
+
+        The stream occupies one gunicorn thread until generation finishes,
+        so each process serves at most EXPLANATION_MAX_STREAMS at once and
+        answers the rest with a 503.
+        """
+        if not _explanation_streams.acquire(blocking=False):
+            return Response(
+                {"detail": "Too many explanations are being generated. Try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+
+        stream = service.stream_book_recommendation(
+            source_book,
+            recommended_book,
+        )
+
+        def events():
+            try:
+                for delta in stream:
+                    yield f"event: delta\ndata: {json.dumps({'delta': delta})}\n\n"
+            except Exception:
+                logger.exception("Explanation stream failed.")
+                yield f"event: error\ndata: {json.dumps({'error': 'Explanation failed.'})}\n\n"
+                return
+
+            yield "event: done\ndata: {}\n\n"
+
+        response = StreamingHttpResponse(
+            ExplanationEvents(events(), stream),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Stop nginx and the load balancer from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+
+        return response
+
 class AuthorViewSet(ReadOnlyModelViewSet):
     queryset = Author.objects.all()
 
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'corsheaders',
@@ -192,12 +193,160 @@ LOGGING = {
     },
 }
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# "default" stays Django's per-process memory cache, so framework users
+# such as DRF throttling never touch the database. "shared" is
+# database-backed so search results, locks and version counters are seen
+# by every worker and task.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 50_000,
+        },
+    },
+}
+
+# -------------------------------------------------------------------
+# Search
+# -------------------------------------------------------------------
+
+# In-memory prefix index answering mode=dropdown searches (per worker).
+AUTOCOMPLETE_ENABLED = os.getenv("AUTOCOMPLETE_ENABLED", "true").lower() == "true"
+AUTOCOMPLETE_REBUILD_SECONDS = int(os.getenv("AUTOCOMPLETE_REBUILD_SECONDS", "900"))
+AUTOCOMPLETE_MAX_MEMORY_MB = int(os.getenv("AUTOCOMPLETE_MAX_MEMORY_MB", "64"))
+
+# Shared cache of search responses, invalidated on catalogue changes.
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_LOCK_TIMEOUT = int(os.getenv("SEARCH_CACHE_LOCK_TIMEOUT", "10"))
+
+# mode=hybrid: candidates taken from each retrieval, and the time both
+# may take before a slow one is left out.
+HYBRID_SEARCH_CANDIDATES = int(os.getenv("HYBRID_SEARCH_CANDIDATES", "100"))
+HYBRID_SEARCH_TIMEOUT_MS = int(os.getenv("HYBRID_SEARCH_TIMEOUT_MS", "800"))
+
+# Threads running hybrid retrievals in each process. Every request thread
+# submits two, so the default covers all GUNICORN_THREADS at once.
+HYBRID_SEARCH_WORKERS = int(
+    os.getenv(
+        "HYBRID_SEARCH_WORKERS",
+        str(2 * int(os.getenv("GUNICORN_THREADS", "4"))),
+    )
+)
+
 # -------------------------------------------------------------------
 # AI
 # -------------------------------------------------------------------
 
 EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
 EMBEDDING_DEVICE = "cpu"
+EMBEDDING_DIMENSIONS = 384
+
+# "sentence_transformers" (PyTorch), or "onnx" / "onnx_int8" to run the
+# graph exported by `manage.py export_onnx_embedding_model` on ONNX Runtime.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence_transformers")
+EMBEDDING_ONNX_DIR = os.getenv(
+    "EMBEDDING_ONNX_DIR",
+    str(BASE_DIR / "ai" / "onnx" / "bge-small-en-v1.5"),
+)
+
+# Intra-op threads the encoder spreads one batch over; 0 uses every core.
+# Under gunicorn the default is cpu_count / GUNICORN_WORKERS (set in
+# gunicorn.conf.py): each worker encodes one batch at a time however many
+# GUNICORN_THREADS it has, so this keeps all workers' batches together
+# within the cores instead of each claiming them all.
+EMBEDDING_INTRA_OP_THREADS = int(os.getenv("EMBEDDING_INTRA_OP_THREADS", "0"))
+
+# Load the embedding model at startup instead of on the first semantic
+# request: "off", "ready" (in AppConfig.ready, i.e. in every process), or
+# "gunicorn" (from the hooks in gunicorn.conf.py).
+EMBEDDING_WARM_UP = os.getenv("EMBEDDING_WARM_UP", "off")
+
+# Unix socket of `manage.py embedding_server`. When set, workers encode
+# through the server and only load the model themselves if it is down.
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "5"))
+
+# Concurrent query embeddings are encoded together: the first waits up to
+# EMBEDDING_BATCH_MAX_WAIT_MS for others. A max size of 1 disables it.
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+# Query embeddings are cached per worker up to this many bytes, and in
+# the shared cache as well when QUERY_EMBEDDING_CACHE_SHARED is set.
+QUERY_EMBEDDING_CACHE_MAX_BYTES = int(
+    os.getenv("QUERY_EMBEDDING_CACHE_MAX_BYTES", str(8 * 1024 * 1024))
+)
+QUERY_EMBEDDING_CACHE_SHARED = (
+    os.getenv("QUERY_EMBEDDING_CACHE_SHARED", "false").lower() == "true"
+)
+QUERY_EMBEDDING_CACHE_TIMEOUT = int(
+    os.getenv("QUERY_EMBEDDING_CACHE_TIMEOUT", str(24 * 60 * 60))
+)
+
+# Where nearest-neighbour queries run: "pgvector" (Postgres HNSW indexes)
+# or "numpy" (exact search over an in-process copy of the embeddings,
+# re-checked for new rows every VECTOR_BACKEND_REFRESH_SECONDS).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector")
+VECTOR_BACKEND_REFRESH_SECONDS = int(
+    os.getenv("VECTOR_BACKEND_REFRESH_SECONDS", "60")
+)
+
+# When set, the numpy backend memory-maps embedding snapshots from this
+# directory so all gunicorn workers share one copy. See export_embeddings.
+VECTOR_SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR")
+VECTOR_SNAPSHOT_KEEP = int(os.getenv("VECTOR_SNAPSHOT_KEEP", "2"))
+
+# Candidate list size for HNSW vector index scans; raise for recall,
+# lower for latency. See `manage.py benchmark_vector_index`.
+VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "100"))
+
+# hnsw.iterative_scan mode ("strict_order" or "relaxed_order") so filtered
+# vector queries keep scanning until enough rows pass the filter. Needs
+# pgvector 0.8+; set to "" on older servers.
+VECTOR_HNSW_ITERATIVE_SCAN = os.getenv("VECTOR_HNSW_ITERATIVE_SCAN", "strict_order")
+
+# Recommendations stored per book by `manage.py compute_recommendations`.
+RECOMMENDATIONS_PRECOMPUTED_LIMIT = int(
+    os.getenv("RECOMMENDATIONS_PRECOMPUTED_LIMIT", "12")
+)
+
+# Relevance/diversity trade-off of the MMR re-ranking of recommendations:
+# 1 keeps the similarity order, lower values favour variety.
+RECOMMENDATIONS_MMR_LAMBDA = float(
+    os.getenv("RECOMMENDATIONS_MMR_LAMBDA", "0.7")
+)
+
+# Seconds an LLM provider request may take. Streamed explanations are
+# cut off once they run this long.
+LLM_REQUEST_TIMEOUT = int(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+# Seconds the lock on an explanation being generated lives, which is also
+# how long other requests wait for it. It outlives the provider timeout
+# so it cannot expire while its holder is still generating.
+EXPLANATION_LOCK_TIMEOUT = LLM_REQUEST_TIMEOUT + 5
+
+# Explanation streams each process serves at once. A stream holds a
+# gunicorn thread for up to LLM_REQUEST_TIMEOUT seconds, so the default
+# keeps half of GUNICORN_THREADS free for other requests; streams past
+# the cap get a 503.
+EXPLANATION_MAX_STREAMS = int(
+    os.getenv(
+        "EXPLANATION_MAX_STREAMS",
+        str(max(1, int(os.getenv("GUNICORN_THREADS", "4")) // 2)),
+    )
+)
+
+# Most source books accepted by the bulk recommendations endpoint.
+RECOMMENDATIONS_BULK_MAX_SOURCES = int(
+    os.getenv("RECOMMENDATIONS_BULK_MAX_SOURCES", "50")
+)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
\ No newline at end of file